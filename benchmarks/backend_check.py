@@ -0,0 +1,247 @@
+"""Backend conformance check: the same booking scenario on SQLite or PostgreSQL.
+
+Runs the tool functions end to end (guest lookup, availability, quote,
+holds, booking, double-booking conflict and race, back-to-back stays,
+cancellation, reactivating a cancelled booking whose room was rebooked,
+heatmap, bulk guest import) and reports each check as pass/fail in JSON.
+The exit status is non-zero if any check fails, so the same script gates
+both backends.
+
+SQLite runs on a scratch copy of hotel.db, split into per-building
+shard files with --shards N (buildings dealt round-robin to N shards).
+PostgreSQL runs against the
+database in --url, which is initialised from hotel.db if empty; the
+scenario books dates far in the future that are picked at random, so it
+can be repeated against the same database.
+
+Usage:
+    python -m benchmarks.backend_check
+    python -m benchmarks.backend_check --shards 2
+    python -m benchmarks.backend_check --url postgresql://localhost/hotel_test
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(os.path.dirname(SCRIPT_DIR), 'homestayagent', 'hotel.db')
+
+
+class Checks:
+    """Collects named pass/fail results."""
+
+    def __init__(self):
+        self.results: List[Dict[str, Any]] = []
+
+    def check(self, name: str, ok: bool, detail: Any = None) -> bool:
+        self.results.append({"name": name, "ok": bool(ok), "detail": detail})
+        return bool(ok)
+
+    def report(self, backend: str) -> Dict[str, Any]:
+        failed = [result for result in self.results if not result["ok"]]
+        return {"backend": backend, "passed": len(self.results) - len(failed),
+                "failed": len(failed), "checks": self.results}
+
+
+def run_scenario(seed: int, race_threads: int) -> Checks:
+    # Imported here so the backend chosen by main() is honoured
+    from homestayagent import db
+    from homestayagent.availability_fetcher_tool import availability_fetcher
+    from homestayagent.booking_tool import booking, update_booking_status
+    from homestayagent.get_user import add_or_get_guest, import_guests
+    from homestayagent.holds import hold_room, release_hold
+    from homestayagent.occupancy_calendar import occupancy_heatmap, stay_days
+    from homestayagent.pricing import get_quote
+    from homestayagent.reports import period_report
+    from homestayagent.shards import booking_location
+
+    rng = random.Random(seed)
+    checks = Checks()
+    tag = f"{seed:08d}"
+    arrival = datetime(2040, 1, 1) + timedelta(days=rng.randrange(0, 3650) * 3)
+
+    def stay(offset: int, nights: int = 2):
+        start = arrival + timedelta(days=offset)
+        return (start.strftime("%Y-%m-%d 14:00:00"),
+                (start + timedelta(days=nights)).strftime("%Y-%m-%d 11:00:00"))
+
+    def free_rooms(check_in: str, check_out: str) -> List[int]:
+        result = availability_fetcher(2, check_in, check_out)
+        rooms = result.get("available_rooms")
+        return [room["Room ID"] for room in rooms] if isinstance(rooms, list) else []
+
+    # Guests
+    first = add_or_get_guest("Check Guest A", f"+9100{tag}1", "Pune")
+    again = add_or_get_guest("Check Guest A", f"+9100{tag}1", "Pune")
+    other = add_or_get_guest("Check Guest B", f"+9100{tag}2", "Goa")
+    checks.check("guest_created", first.get("new_user") == 1, first)
+    guest_a = first.get("guest_details", {}).get("guest_id")
+    guest_b = other.get("guest_details", {}).get("guest_id")
+    checks.check("guest_found_again", again.get("new_user") == 0
+                 and again["guest_details"]["guest_id"] == guest_a, again)
+
+    # Availability, quote and holds
+    check_in, check_out = stay(0)
+    rooms = free_rooms(check_in, check_out)
+    if not checks.check("rooms_available", rooms, len(rooms)):
+        return checks
+    room_id = rooms[0]
+    quote = get_quote(room_id, check_in, check_out)
+    checks.check("quote", quote.get("days_charged") == 2 and quote.get("total_price", 0) > 0, quote)
+
+    hold = hold_room(guest_a, room_id, check_in, check_out)
+    checks.check("hold_taken", "hold_id" in hold, hold)
+    blocked = booking(guest_b, room_id, 2, check_in, check_out)
+    checks.check("hold_blocks_other_guest", "held_until" in blocked.get("conflict", {}), blocked)
+    stolen = release_hold(guest_b, hold.get("hold_id", -1))
+    checks.check("hold_kept_from_other_guest", "error" in stolen, stolen)
+    released = release_hold(guest_a, hold.get("hold_id", -1))
+    checks.check("hold_released", released.get("released") is True, released)
+
+    def nights_sold() -> Optional[int]:
+        return period_report(check_in[:7]).get("total", {}).get("nights_sold")
+
+    # Booking and conflicts
+    sold_before = nights_sold()
+    booked = booking(guest_a, room_id, 2, check_in, check_out)
+    booking_id = booked.get("system_booking_id")
+    checks.check("booking_created", isinstance(booking_id, int), booked)
+    sold_after = nights_sold()
+    expected = sum(day.startswith(check_in[:7]) for day in stay_days(check_in, check_out))
+    checks.check("report_counts_booking", sold_before is not None and sold_after is not None
+                 and sold_after - sold_before == expected,
+                 {"before": sold_before, "after": sold_after, "expected": expected})
+    checks.check("booked_room_unavailable", room_id not in free_rooms(check_in, check_out))
+    clash = booking(guest_b, room_id, 2, *stay(1))
+    checks.check("overlap_rejected", "conflict" in clash, clash)
+    follow_on = booking(guest_b, room_id, 2, stay(2)[0], stay(2)[1])
+    checks.check("back_to_back_allowed", "system_booking_id" in follow_on, follow_on)
+
+    month = occupancy_heatmap(check_in[:7])
+    row = next((r for r in month.get("rooms", []) if r["room_id"] == room_id), None)
+    day = int(check_in[8:10]) - 1
+    checks.check("heatmap_shows_booking", row is not None and row["occupancy"][day] == "1",
+                 row and row["occupancy"])
+
+    # Many sessions racing for the same room and dates: exactly one wins
+    race_in, race_out = stay(10, 3)
+    race_room = free_rooms(race_in, race_out)[0]
+    results: List[dict] = []
+    lock = threading.Lock()
+    gate = threading.Barrier(race_threads)
+
+    def contender() -> None:
+        gate.wait()
+        result = booking(guest_b, race_room, 2, race_in, race_out)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=contender) for _ in range(race_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [r for r in results if "system_booking_id" in r]
+    checks.check("race_single_winner", len(winners) == 1 and all(
+        "conflict" in r for r in results if r not in winners
+    ), {"winners": len(winners), "errors": sorted({r.get("error", "")[:60] for r in results})})
+
+    # Cancelling frees the room again
+    cancelled = update_booking_status(booking_id, "CANCELLED", "backend check")
+    checks.check("cancelled", cancelled.get("previous_status") == "REQUESTED", cancelled)
+    checks.check("cancelled_room_available", room_id in free_rooms(check_in, check_out))
+    rebooked = booking(guest_b, room_id, 2, check_in, check_out)
+    checks.check("rebooked_after_cancel", "system_booking_id" in rebooked, rebooked)
+    revived = update_booking_status(booking_id, "CONFIRMED")
+    checks.check("reactivation_conflict", "conflict" in revived, revived)
+
+    imported = import_guests([(f"Imported {i}", f"+9200{tag}{i:03d}", "Delhi") for i in range(50)])
+    checks.check("bulk_import", imported.get("inserted") == 50, imported)
+
+    # The storage layer itself refuses overlapping active bookings where
+    # the backend supports it (PostgreSQL's exclusion constraint)
+    with db.connection(booking_location(rebooked.get("system_booking_id", -1))) as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO booking (guest_id, building_id, room_id, num_persons,"
+                " check_in_datetime, check_out_datetime, days_charged, extra_bed_price,"
+                " subtotal_amount, total_price, advance_due_amount, status_id)"
+                " SELECT guest_id, building_id, room_id, 1, check_in_datetime,"
+                " check_out_datetime, 1, 0, 0, 0, 0, status_id FROM booking WHERE booking_id = ?",
+                (rebooked.get("system_booking_id"),),
+            )
+            enforced = False
+        except sqlite3.IntegrityError:
+            enforced = True
+        finally:
+            conn.rollback()
+    checks.check("storage_overlap_guard", enforced or not db.is_url(db.resolve()),
+                 {"enforced": enforced})
+    return checks
+
+
+def _shard_spec(source: str, count: int, directory: str) -> str:
+    """HOTEL_SHARDS value dealing the buildings of ``source`` round-robin to ``count`` files."""
+    conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        building_ids = [row[0] for row in conn.execute("SELECT building_id FROM building ORDER BY 1")]
+    finally:
+        conn.close()
+    groups: Dict[int, List[str]] = {}
+    for index, building_id in enumerate(building_ids):
+        groups.setdefault(index % count, []).append(str(building_id))
+    return ";".join(f"{','.join(ids)}={os.path.join(directory, f'shard{n + 1}.db')}"
+                    for n, ids in sorted(groups.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="PostgreSQL URL; omit to check SQLite")
+    parser.add_argument("--db", default=SOURCE_DB, help="SQLite database to copy (and seed PostgreSQL from)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--race-threads", type=int, default=8)
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the SQLite copy into this many per-building shards")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="hotel-backend-check-")
+    if args.url:
+        os.environ["HOTEL_DB_BACKEND"] = "postgres"
+        os.environ["HOTEL_DATABASE_URL"] = args.url
+        from homestayagent import db, pg_backend
+        with db.connection() as conn:
+            pg_backend.copy_from_sqlite(conn, args.db)
+        backend = "postgres"
+    else:
+        db_path = os.path.join(scratch, "hotel.db")
+        shutil.copyfile(args.db, db_path)
+        os.environ["HOTEL_DB_PATH"] = db_path
+        backend = "sqlite"
+        if args.shards:
+            spec = _shard_spec(args.db, args.shards, scratch)
+            os.environ["HOTEL_SHARDS"] = spec
+            from homestayagent import shards
+            shards.split(args.db, shards.ShardMap.parse(spec))
+            backend = f"sqlite ({args.shards} shards)"
+
+    seed = args.seed if args.seed is not None else random.SystemRandom().randrange(10 ** 8)
+    try:
+        report = run_scenario(seed, args.race_threads).report(backend)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    report["seed"] = seed
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Stress test of the double-booking guard: thousands of bookings of one room.
+
+Each round starts --contenders threads, holds them at a barrier, then
+has every one of them book the same room for the same stay. Exactly one
+booking may succeed; every other result must be the structured
+``conflict`` error (not a lock timeout or any other failure). Rounds use
+different stays far in the future, and afterwards the database must hold
+exactly one active booking per round.
+
+The run works on a scratch copy of --db (default: the shipped hotel.db).
+With HOTEL_WRITE_QUEUE=0 every contender opens its own transaction
+instead of going through the write queue.
+
+Usage:
+    python -m benchmarks.booking_race --contenders 2000 --rounds 3
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(os.path.dirname(SCRIPT_DIR), 'homestayagent', 'hotel.db')
+# Stays of round n start n weeks after this date
+BASE_DATE = datetime(2075, 1, 1)
+
+
+def race(room_id: int, check_in: str, check_out: str, contenders: int) -> Dict[str, Any]:
+    """Books ``room_id`` from ``contenders`` threads released at once."""
+    from homestayagent.booking_tool import booking
+
+    results: List[dict] = []
+    lock = threading.Lock()
+    gate = threading.Barrier(contenders)
+
+    def contender() -> None:
+        gate.wait()
+        result = booking(1, room_id, 1, check_in, check_out)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=contender) for _ in range(contenders)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    winners = [result for result in results if "system_booking_id" in result]
+    others = Counter(
+        "conflict" if "conflict" in result else result.get("error", "no result")[:80]
+        for result in results if "system_booking_id" not in result
+    )
+    return {
+        "room_id": room_id,
+        "check_in": check_in,
+        "check_out": check_out,
+        "contenders": contenders,
+        "results": len(results),
+        "winners": len(winners),
+        "outcomes": dict(others),
+        "elapsed_s": round(elapsed, 3),
+        "ok": len(results) == contenders and len(winners) == 1
+              and set(others) == {"conflict"},
+    }
+
+
+def active_bookings(room_id: int, check_in: str, check_out: str) -> int:
+    """Active bookings of ``room_id`` overlapping the stay, read from the database."""
+    from homestayagent import db, occupancy
+
+    with db.connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM booking b JOIN booking_status s ON s.booking_status_id = b.status_id"
+            " WHERE b.room_id = ? AND b.check_in_datetime < ? AND b.check_out_datetime > ?"
+            f" AND s.code NOT IN ({', '.join('?' * len(occupancy.INACTIVE_STATUS_CODES))})",
+            (room_id, check_out, check_in, *occupancy.INACTIVE_STATUS_CODES),
+        ).fetchone()[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contenders", type=int, default=2000,
+                        help="Threads booking the same room at once")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--room-id", type=int, default=1)
+    parser.add_argument("--db", help="Database to copy for the run (default: shipped hotel.db)")
+    args = parser.parse_args()
+
+    if os.getenv("HOTEL_DB_BACKEND", "sqlite") == "sqlite":
+        db_path = os.path.join(tempfile.mkdtemp(prefix="hotel-race-"), "hotel.db")
+        shutil.copyfile(os.path.abspath(args.db or SOURCE_DB), db_path)
+        os.environ["HOTEL_DB_PATH"] = db_path
+    # Thousands of threads need little stack each
+    threading.stack_size(256 * 1024)
+
+    rounds = []
+    for index in range(args.rounds):
+        start = BASE_DATE + timedelta(weeks=index)
+        check_in = start.strftime("%Y-%m-%d 14:00:00")
+        check_out = (start + timedelta(days=2)).strftime("%Y-%m-%d 11:00:00")
+        result = race(args.room_id, check_in, check_out, args.contenders)
+        result["active_bookings"] = active_bookings(args.room_id, check_in, check_out)
+        result["ok"] = result["ok"] and result["active_bookings"] == 1
+        rounds.append(result)
+
+    ok = all(result["ok"] for result in rounds)
+    print(json.dumps({"ok": ok, "rounds": rounds}, indent=2))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
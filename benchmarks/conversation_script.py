@@ -0,0 +1,198 @@
+"""Scripted booking conversations for load tests, and the model side of them.
+
+A conversation is four user turns, rendered from fixed templates:
+
+    register   "Hi, I'm Replay Guest 17, phone +91-replay-0000017, from Pune."
+    search     "Do you have a room for 2 people from 2028-03-04 14:00:00 to ..."
+    re-search  "Anything under 3500 a night?"
+    book       "Please book the first one."
+
+``next_step`` plays the model: given the chat history so far (OpenAI
+style message dicts, tool results included) it returns either the next
+tool call or the closing text of the turn. It only reads the history,
+so it is deterministic and stateless, and the same function drives the
+stub model server (``stub_llm_server``, which turns the step into an
+Ollama or OpenAI tool call) and the MCP driver (``replay_load``, which
+calls the MCP tool itself).
+
+Each turn makes one tool call: add_or_get_guest, availability_fetcher,
+availability_fetcher with a budget, booking. If the booking loses the
+room to another conversation the model searches again and books the
+first room it gets, up to ``MAX_BOOKING_ATTEMPTS`` bookings per turn.
+Messages that do not match a template get plain text, so ordinary
+prompts sent to the stub are answered as before.
+"""
+import json
+import random
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Stays start within --days of this date, far enough ahead to be free
+BASE_DATE = date(2029, 1, 1)
+CITIES = ("Pune", "Chennai", "Tirupati", "Hyderabad", "Bengaluru", "Mysuru")
+# Rooms listed per search; the model books the first
+SEARCH_TOP_K = 5
+MAX_BOOKING_ATTEMPTS = 3
+
+# (abstract step, arguments); see TOOL_NAMES for the tool each step calls
+ToolCall = Tuple[str, Dict[str, Any]]
+
+# Step -> (agent tool, MCP tool)
+TOOL_NAMES = {
+    "guest": ("add_or_get_guest", "get_guest_or_register"),
+    "search": ("availability_fetcher", "fetch_room_availability"),
+    "book": ("booking", "create_hotel_booking"),
+}
+
+_REGISTER = "Hi, I'm {name}, phone {phone}, from {city}."
+_SEARCH = "Do you have a room for {people} people from {check_in} to {check_out}?"
+_RESEARCH = "Anything under {max_price:g} a night?"
+_BOOK = "Please book the first one."
+
+_REGISTER_RE = re.compile(r"^Hi, I'm (.+), phone (\S+), from (.+)\.$")
+_SEARCH_RE = re.compile(r"^Do you have a room for (\d+) people from (.+) to (.+)\?$")
+_RESEARCH_RE = re.compile(r"^Anything under ([\d.]+) a night\?$")
+
+
+def conversation(index: int, seed: int = 7, days: int = 365) -> List[str]:
+    """The user turns of conversation ``index``; the same for the same seed."""
+    rng = random.Random(seed * 1_000_003 + index)
+    arrival = BASE_DATE + timedelta(days=rng.randrange(days))
+    nights = rng.randint(1, 4)
+    return [
+        _REGISTER.format(name=f"Replay Guest {index}", phone=f"+91-replay-{index:07d}",
+                         city=rng.choice(CITIES)),
+        _SEARCH.format(people=rng.randint(1, 3), check_in=f"{arrival:%Y-%m-%d} 14:00:00",
+                       check_out=f"{arrival + timedelta(days=nights):%Y-%m-%d} 11:00:00"),
+        _RESEARCH.format(max_price=rng.choice((2000, 3500, 5000, 8000))),
+        _BOOK,
+    ]
+
+
+def tool_name(step: str, offered: Optional[List[str]] = None, mcp: bool = False) -> Optional[str]:
+    """Name of the tool for ``step``: the one of ``offered`` when given
+    (None if the request offers neither), else the agent or MCP name."""
+    names = TOOL_NAMES[step]
+    if offered is None:
+        return names[1] if mcp else names[0]
+    return next((name for name in names if name in offered), None)
+
+
+def _text(message: Dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _result(message: Dict) -> Dict[str, Any]:
+    try:
+        result = json.loads(_text(message))
+    except ValueError:
+        return {}
+    if isinstance(result, dict) and isinstance(result.get("result"), dict):
+        # ADK wraps some function responses as {"result": ...}
+        return result["result"]
+    return result if isinstance(result, dict) else {}
+
+
+def _rooms(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rooms = result.get("available_rooms")
+    return rooms if isinstance(rooms, list) else []
+
+
+def _history(messages: List[Dict]) -> Tuple[List[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """User turns, all tool results, and the tool results since the last user turn."""
+    users, results, current = [], [], []
+    for message in messages:
+        role = message.get("role")
+        if role == "user":
+            users.append(_text(message).strip())
+            current = []
+        elif role == "tool":
+            result = _result(message)
+            results.append(result)
+            current.append(result)
+    return users, results, current
+
+
+def _stay(users: List[str]) -> Optional[Tuple[int, str, str]]:
+    for text in reversed(users):
+        match = _SEARCH_RE.match(text)
+        if match:
+            return int(match.group(1)), match.group(2), match.group(3)
+    return None
+
+
+def _guest_id(results: List[Dict[str, Any]]) -> Optional[int]:
+    for result in reversed(results):
+        details = result.get("guest_details")
+        if isinstance(details, dict):
+            return details.get("guest_id")
+    return None
+
+
+def _search(stay: Tuple[int, str, str], guest_id: Optional[int],
+            max_price: Optional[float] = None) -> ToolCall:
+    people, check_in, check_out = stay
+    args: Dict[str, Any] = {"num_people": people, "check_in_datetime": check_in,
+                            "check_out_datetime": check_out, "top_k": SEARCH_TOP_K}
+    if guest_id is not None:
+        args["guest_id"] = guest_id
+    if max_price is not None:
+        args["max_price"] = max_price
+    return "search", args
+
+
+def next_step(messages: List[Dict]) -> Union[str, ToolCall]:
+    """The model's next move: a (step, arguments) tool call, or the reply text."""
+    users, results, current = _history(messages)
+    last = users[-1] if users else ""
+    done = current[-1] if current else None
+
+    match = _REGISTER_RE.match(last)
+    if match:
+        if done is None:
+            name, phone, city = match.groups()
+            return "guest", {"name": name, "phone": phone, "city": city}
+        return f"Welcome, {match.group(1)}. When would you like to stay?"
+
+    stay = _stay(users)
+    guest_id = _guest_id(results)
+    match = _RESEARCH_RE.match(last)
+    if _SEARCH_RE.match(last) or match:
+        if stay is None:
+            return "Which dates would you like?"
+        if done is None:
+            return _search(stay, guest_id, float(match.group(1)) if match else None)
+        rooms = _rooms(done)
+        if not rooms:
+            return "Sorry, nothing is free for that stay."
+        return (f"I found {len(rooms)} rooms; the first is room {rooms[0].get('Room No')}"
+                f" at {rooms[0].get('Price/Night')} a night.")
+
+    if last == _BOOK:
+        if stay is None or guest_id is None:
+            return "Please tell me your details and dates first."
+        if done is not None and "system_booking_id" in done:
+            return f"Booked. Your reference is {done.get('reference_code')}."
+        bookings = sum(1 for result in current if "system_booking_id" in result or "conflict" in result)
+        if done is not None and "error" in done and "conflict" not in done:
+            return f"Sorry, the booking failed: {done['error']}"
+        if done is not None and "conflict" in done:
+            if bookings >= MAX_BOOKING_ATTEMPTS:
+                return "Sorry, the rooms keep getting taken. Please try other dates."
+            return _search(stay, guest_id)
+        if done is not None and not _rooms(done):
+            return "Sorry, there is no room left to book for that stay."
+        # The rooms of the latest search, this turn's re-search included
+        rooms = next((_rooms(result) for result in reversed(results) if _rooms(result)), [])
+        if not rooms:
+            return "Sorry, there is no room left to book for that stay."
+        people, check_in, check_out = stay
+        return "book", {"guest_id": guest_id, "room_id": rooms[0]["Room ID"],
+                        "num_persons": people, "check_in_datetime": check_in,
+                        "check_out_datetime": check_out}
+
+    return f"Thank you for contacting the Homestay. You said: {last[:200]}"
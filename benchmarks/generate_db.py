@@ -0,0 +1,217 @@
+"""Deterministic synthetic hotel.db generator for benchmarks.
+
+Builds a database with the same schema as the shipped
+homestayagent/hotel.db (the DDL is copied from it) and fills it with
+buildings, room types, rooms, guests and bookings. The same arguments
+and seed always produce the same data.
+
+Bookings are laid out per room as back-to-back stays with random gaps,
+so active bookings never overlap; a configurable share of them is
+CANCELLED (and those may overlap, like in production).
+
+Usage:
+    python -m benchmarks.generate_db /tmp/bench.db --rooms 2000 --bookings 1000000 --guests 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(os.path.dirname(SCRIPT_DIR), 'homestayagent', 'hotel.db')
+
+BASE_TABLES = ('guest', 'building', 'room_type', 'room', 'booking_status', 'rate_rule', 'booking')
+BOOKING_STATUSES = [
+    (1, 'REQUESTED', 'Initial booking'),
+    (2, 'ADVANCE_PAID', 'Advance paid'),
+    (3, 'CONFIRMED', 'Confirmed'),
+    (4, 'CANCELLED', 'Cancelled'),
+]
+ROOM_TYPE_TEMPLATES = [
+    # name, capacity, price, extra_bed_included, extra_bed_price, features
+    ('1 BHK Small', 2, 1200.0, 0, 0.0, 'Shared bath;24h service'),
+    ('1 BHK Standard', 3, 1500.0, 1, 300.0, 'Shared bath;24h service'),
+    ('2 BHK Suite A', 4, 3000.0, 1, 300.0, 'Wi-Fi;2 bottles;24h service'),
+    ('2 BHK Suite B', 6, 3500.0, 0, 0.0, 'Wi-Fi;2 bottles;24h service'),
+    ('Independent House 2 BHK', 7, 4000.0, 1, 300.0, 'Private Wi-Fi;Parking;24h service'),
+    ('3 BHK Premier', 10, 6500.0, 1, 300.0, 'En-suite;1 extra bed;24h service'),
+    ('3 BHK Suite', 12, 7000.0, 1, 300.0, 'Kitchenette;2 extra beds;24h service'),
+    ('Duplex House 4 BHK', 12, 8000.0, 0, 0.0, '4 beds;Driver rest;24h service'),
+]
+CITIES = ['Tirupati', 'Chennai', 'Bengaluru', 'Hyderabad', 'Vijayawada', 'Nellore', 'Pune', 'Mumbai']
+TIMESTAMP = '2025-01-01 00:00:00'
+_BATCH = 50_000
+
+
+def copy_schema(target: sqlite3.Connection, source_path: str = SOURCE_DB) -> None:
+    """Creates the base tables in ``target`` using the DDL of ``source_path``."""
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    try:
+        for name in BASE_TABLES:
+            (ddl,) = source.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).fetchone()
+            target.execute(ddl)
+    finally:
+        source.close()
+
+
+def _guests(count: int, rng: random.Random) -> Iterator[Tuple]:
+    for guest_id in range(1, count + 1):
+        yield (guest_id, f"Guest {guest_id}", f"9{guest_id:09d}", rng.choice(CITIES), TIMESTAMP)
+
+
+def _bookings(room_rows, count: int, guests: int, start: datetime,
+              cancelled_share: float, rng: random.Random) -> Iterator[Tuple]:
+    """Yields booking rows spread evenly over the rooms, in time order per room."""
+    per_room, extra = divmod(count, len(room_rows))
+    booking_id = 0
+    for index, (room_id, building_id, capacity, price, bed_included, bed_price) in enumerate(room_rows):
+        cursor = start + timedelta(days=rng.randrange(0, 7))
+        for _ in range(per_room + (1 if index < extra else 0)):
+            booking_id += 1
+            nights = rng.choice((1, 1, 2, 2, 2, 3, 4, 7))
+            check_in = cursor.replace(hour=14, minute=0)
+            check_out = (check_in + timedelta(days=nights)).replace(hour=11)
+            cancelled = rng.random() < cancelled_share
+            if not cancelled:
+                # Next stay starts after this one; cancelled stays leave the
+                # room free, so the next stay may overlap them
+                cursor = check_out + timedelta(days=rng.choice((0, 0, 1, 2, 5)))
+            extra_beds = rng.choice((0, 0, 0, 1, 2)) if bed_included else 0
+            subtotal = nights * price + extra_beds * bed_price
+            yield (
+                booking_id, rng.randint(1, guests), building_id, room_id,
+                rng.randint(1, capacity),
+                check_in.strftime("%Y-%m-%d %H:%M:%S"), check_out.strftime("%Y-%m-%d %H:%M:%S"),
+                nights, extra_beds, bed_price, subtotal, 0.0, subtotal,
+                round(subtotal * 0.1, 2), 4 if cancelled else rng.choice((1, 2, 3, 3)),
+                TIMESTAMP, TIMESTAMP, TIMESTAMP,
+            )
+
+
+def _insert_batched(conn: sqlite3.Connection, sql: str, rows: Iterator[Tuple]) -> int:
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _BATCH:
+            conn.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def generate(path: str, buildings: int = 4, room_types_per_building: int = 2,
+             rooms: int = 23, guests: int = 1000, bookings: int = 10000,
+             cancelled_share: float = 0.1, start_date: str = '2025-01-01',
+             seed: int = 42) -> dict:
+    """Writes a fresh synthetic database to ``path`` and returns its summary.
+
+    Raises:
+        FileExistsError: If ``path`` already exists.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        # Bulk-load settings; the result is a normal rollback-journal db
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        copy_schema(conn)
+
+        conn.executemany(
+            "INSERT INTO booking_status (booking_status_id, code, description, created_at) VALUES (?, ?, ?, ?)",
+            [(*status, TIMESTAMP) for status in BOOKING_STATUSES],
+        )
+        conn.execute("INSERT INTO rate_rule (threshold_time, extra_day_charge) VALUES ('21:00', 1)")
+
+        building_rows = [
+            (building_id, f"Block {building_id}", building_id % 2, 0, TIMESTAMP)
+            for building_id in range(1, buildings + 1)
+        ]
+        conn.executemany("INSERT INTO building VALUES (?, ?, ?, ?, ?)", building_rows)
+
+        type_rows = []
+        for building_id in range(1, buildings + 1):
+            for _ in range(room_types_per_building):
+                name, capacity, price, bed_included, bed_price, features = rng.choice(ROOM_TYPE_TEMPLATES)
+                price = round(price * rng.uniform(0.8, 1.3), -1)
+                type_rows.append((len(type_rows) + 1, building_id, name, capacity, price,
+                                  bed_included, bed_price, features, TIMESTAMP))
+        conn.executemany("INSERT INTO room_type VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", type_rows)
+
+        room_rows = []
+        pricing_rows = []
+        for room_id in range(1, rooms + 1):
+            room_type = type_rows[(room_id - 1) % len(type_rows)]
+            floor = rng.randint(0, 6)
+            room_rows.append((room_id, room_type[0], room_type[1], f"{floor}{room_id:03d}",
+                              floor, 1, TIMESTAMP))
+            pricing_rows.append((room_id, room_type[1], room_type[3], room_type[4],
+                                 room_type[5], room_type[6]))
+        conn.executemany("INSERT INTO room VALUES (?, ?, ?, ?, ?, ?, ?)", room_rows)
+        conn.execute(
+            "UPDATE building SET total_flats = (SELECT COUNT(*) FROM room WHERE room.building_id = building.building_id)"
+        )
+
+        guest_count = _insert_batched(
+            conn, "INSERT INTO guest VALUES (?, ?, ?, ?, ?)", _guests(guests, rng)
+        )
+        booking_count = _insert_batched(
+            conn,
+            """INSERT INTO booking (
+                   booking_id, guest_id, building_id, room_id, num_persons,
+                   check_in_datetime, check_out_datetime, days_charged, extra_beds,
+                   extra_bed_price, subtotal_amount, taxes_and_fees, total_price,
+                   advance_due_amount, status_id, status_updated_at, created_at, updated_at
+               ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            _bookings(pricing_rows, bookings, max(1, guests),
+                      datetime.fromisoformat(start_date), cancelled_share, rng),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "path": path,
+        "seed": seed,
+        "buildings": buildings,
+        "room_types": len(type_rows),
+        "rooms": rooms,
+        "guests": guest_count,
+        "bookings": booking_count,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Database file to create")
+    parser.add_argument("--buildings", type=int, default=4)
+    parser.add_argument("--room-types-per-building", type=int, default=2)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--guests", type=int, default=50_000)
+    parser.add_argument("--bookings", type=int, default=200_000)
+    parser.add_argument("--cancelled-share", type=float, default=0.1)
+    parser.add_argument("--start-date", default="2025-01-01")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    summary = generate(
+        args.path, args.buildings, args.room_types_per_building, args.rooms,
+        args.guests, args.bookings, args.cancelled_share, args.start_date, args.seed,
+    )
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
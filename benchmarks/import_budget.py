@@ -0,0 +1,127 @@
+"""Import-time budget check for the agent and MCP server entry points.
+
+Imports each entry point in a fresh interpreter with ``python -X
+importtime`` and fails if its cumulative import time is over budget or if
+it pulled in a module it should only load lazily (LiteLLM before the
+agent's first turn, ADK in the MCP server, PrettyTable anywhere on the
+tool path). Importing must also not touch the database.
+
+Timings are the median of --runs interpreters, since a single cold import
+is noisy. Budgets are in milliseconds and can be raised per machine with
+--scale.
+
+Usage:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --scale 2 --json import_times.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+
+# module -> (budget_ms, modules that must not be imported)
+ENTRY_POINTS: Dict[str, Tuple[float, Tuple[str, ...]]] = {
+    "homestayagent.availability_fetcher_tool": (150.0, ("google.adk", "litellm", "prettytable")),
+    "homestayagent.booking_tool": (150.0, ("google.adk", "litellm", "prettytable")),
+    "homestayagent.reports": (150.0, ("google.adk", "litellm", "prettytable")),
+    "mcp_logic.mcp_server": (1500.0, ("google.adk", "litellm", "prettytable")),
+    "homestayagent.agent": (4000.0, ("litellm", "prettytable")),
+}
+
+# Runs in the child: import the module, then report what got loaded
+_PROBE = """
+import json, sys
+import {module}
+print(json.dumps({{
+    "modules": sorted(sys.modules),
+    "db_opened": any(
+        getattr(sys.modules.get(name), "_pools", None)
+        for name in ("homestayagent.db",)
+    ),
+}}))
+"""
+
+
+def _import_once(module: str) -> Tuple[float, List[str], bool]:
+    """Imports ``module`` in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative import time in ms, loaded module names,
+        whether a database pool was opened).
+    """
+    env = dict(os.environ)
+    # An unreadable path makes any import-time query fail loudly
+    env["HOTEL_DB_PATH"] = os.path.join(SCRIPT_DIR, "does-not-exist", "hotel.db")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name == module:
+            cumulative_us = int(cumulative)
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative_us / 1000, probe["modules"], probe["db_opened"]
+
+
+def check(runs: int, scale: float) -> Tuple[Dict[str, Dict], bool]:
+    """Measures every entry point; returns (report, all within budget)."""
+    report = {}
+    ok = True
+    for module, (budget_ms, forbidden) in ENTRY_POINTS.items():
+        timings = []
+        loaded: List[str] = []
+        db_opened = False
+        for _ in range(runs):
+            elapsed_ms, loaded, opened = _import_once(module)
+            timings.append(elapsed_ms)
+            db_opened = db_opened or opened
+        leaked = sorted({
+            name for name in loaded for prefix in forbidden
+            if name == prefix or name.startswith(prefix + ".")
+        })
+        median_ms = statistics.median(timings)
+        passed = median_ms <= budget_ms * scale and not leaked and not db_opened
+        ok = ok and passed
+        report[module] = {
+            "median_ms": round(median_ms, 1),
+            "budget_ms": budget_ms * scale,
+            "forbidden_imports": sorted({name.split(".")[0] for name in leaked}),
+            "db_opened": db_opened,
+            "passed": passed,
+        }
+    return report, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget by this factor (slow machines)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report, ok = check(args.runs, args.scale)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as fh:
+            fh.write(text)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
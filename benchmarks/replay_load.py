@@ -0,0 +1,560 @@
+"""Replays scripted booking conversations against the agent or the MCP server.
+
+Each simulated guest runs the four-turn conversation of
+``conversation_script`` (register, search, re-search under a budget,
+book the first room), many at a time:
+
+- ``--target agent`` runs the real coordinator agent (prompt, tools,
+  CachingLiteLlm, LiteLLM) on in-memory ADK runners, its model pointed at
+  ``stub_llm_server``, which answers with the scripted tool calls after
+  --llm-latency-ms. With --workers N the conversations are split over N
+  agent processes sharing the database, as N deployed workers would.
+- ``--target mcp`` connects one MCP client per conversation over SSE to
+  ``mcp_logic/mcp_server.py`` and calls the tools the script picks, with
+  no model in between. --workers N starts N server processes on the same
+  database and deals the conversations out to them; --mcp-url drives
+  servers already running instead.
+
+The report gives conversation and booking throughput, latency
+percentiles per turn, tool calls per successful booking, and how many
+tool results were lock errors ("database is locked", lock timeouts,
+deadlocks), connection pool timeouts, booking conflicts or other errors.
+Run it with --json and --compare like run_benchmarks to catch scaling
+regressions, or sweep --workers/--concurrency to size a deployment.
+
+The run works on a scratch copy of --db (default: the shipped hotel.db)
+unless --in-place is given. With HOTEL_DB_BACKEND=postgres or
+HOTEL_SHARDS set, it writes to those databases instead.
+
+Usage:
+    python -m benchmarks.replay_load --target agent --conversations 2000 --concurrency 200
+    python -m benchmarks.replay_load --target mcp --conversations 2000 --workers 2
+    python -m benchmarks.replay_load --target mcp --mcp-url http://10.0.0.5:8000/sse
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.conversation_script import conversation, next_step, tool_name
+from mcp_logic.latency_report import percentile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+SOURCE_DB = os.path.join(REPO_DIR, 'homestayagent', 'hotel.db')
+TURN_NAMES = ("register", "search", "re-search", "book")
+# Error texts of a write that waited too long for the database lock
+# (SQLite busy timeout, PostgreSQL lock_timeout or deadlock)
+LOCK_MARKERS = ("database is locked", "database table is locked", "lock timeout", "deadlock")
+POOL_MARKER = "connection pool exhausted"
+SERVER_START_TIMEOUT_S = 60.0
+
+
+def classify(result: Any) -> str:
+    """Outcome of one tool result: booked, conflict, lock, pool, error or ok."""
+    if not isinstance(result, dict):
+        return "ok"
+    if "system_booking_id" in result:
+        return "booked"
+    if "conflict" in result:
+        return "conflict"
+    if "error" not in result:
+        return "ok"
+    error = str(result["error"]).lower()
+    if any(marker in error for marker in LOCK_MARKERS):
+        return "lock"
+    return "pool" if POOL_MARKER in error else "error"
+
+
+class Recorder:
+    """Turn latencies, tool calls and outcomes of the replayed conversations.
+
+    ``raw`` and ``merge`` carry a worker process's samples to the parent;
+    ``window`` is the wall-clock span of the conversations, which for
+    several workers runs from the first start to the last finish.
+    """
+
+    def __init__(self):
+        self.turns: Dict[str, List[float]] = defaultdict(list)
+        self.conversations: List[float] = []
+        self.tool_calls: Counter = Counter()
+        self.outcomes: Counter = Counter()
+        self.calls_per_booking: List[int] = []
+        self.failures: Counter = Counter()
+        self.window: List[float] = []
+
+    def start(self) -> None:
+        self.window = [time.time(), time.time()]
+
+    def stop(self) -> None:
+        self.window[1] = time.time()
+
+    def turn(self, index: int, seconds: float) -> None:
+        self.turns[TURN_NAMES[index]].append(seconds)
+
+    def tool(self, name: str, result: Any) -> str:
+        self.tool_calls[name] += 1
+        outcome = classify(result)
+        self.outcomes[outcome] += 1
+        return outcome
+
+    def finished(self, seconds: float, tool_calls: int, booked: bool) -> None:
+        self.conversations.append(seconds)
+        if booked:
+            self.calls_per_booking.append(tool_calls)
+
+    def failed(self, error: BaseException) -> None:
+        self.failures[f"{type(error).__name__}: {error}"[:200]] += 1
+
+    def raw(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "conversations": self.conversations,
+                "tool_calls": self.tool_calls, "outcomes": self.outcomes,
+                "calls_per_booking": self.calls_per_booking, "failures": self.failures,
+                "window": self.window}
+
+    def merge(self, raw: Dict[str, Any]) -> None:
+        for name, samples in raw["turns"].items():
+            self.turns[name].extend(samples)
+        self.conversations.extend(raw["conversations"])
+        self.tool_calls.update(raw["tool_calls"])
+        self.outcomes.update(raw["outcomes"])
+        self.calls_per_booking.extend(raw["calls_per_booking"])
+        self.failures.update(raw["failures"])
+        if self.window:
+            self.window = [min(self.window[0], raw["window"][0]), max(self.window[1], raw["window"][1])]
+        else:
+            self.window = list(raw["window"])
+
+    def summary(self) -> Dict[str, Any]:
+        def latency(samples: List[float]) -> Dict[str, float]:
+            return {
+                "count": len(samples),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p90_ms": round(percentile(samples, 90) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+            }
+
+        elapsed = self.window[1] - self.window[0] if self.window else 0.0
+        bookings = self.outcomes["booked"]
+        per_booking = self.calls_per_booking
+        all_turns = [sample for name in TURN_NAMES for sample in self.turns.get(name, [])]
+        return {
+            "throughput": {
+                "elapsed_s": round(elapsed, 3),
+                "conversations": len(self.conversations),
+                "conversations_per_s": round(len(self.conversations) / elapsed, 2) if elapsed else 0.0,
+                "turns_per_s": round(len(all_turns) / elapsed, 2) if elapsed else 0.0,
+                "bookings": bookings,
+                "bookings_per_s": round(bookings / elapsed, 2) if elapsed else 0.0,
+                "tool_calls_per_s": round(sum(self.tool_calls.values()) / elapsed, 2) if elapsed else 0.0,
+            },
+            "latency": {
+                "turn": latency(all_turns),
+                **{f"turn.{name}": latency(self.turns[name]) for name in TURN_NAMES if name in self.turns},
+                "conversation": latency(self.conversations),
+            },
+            "tool_calls": dict(sorted(self.tool_calls.items())),
+            "tool_calls_per_booking": {
+                "mean": round(sum(per_booking) / len(per_booking), 3) if per_booking else 0.0,
+                "p50": percentile(per_booking, 50),
+                "p99": percentile(per_booking, 99),
+                "max": max(per_booking, default=0),
+            },
+            "errors": {
+                "lock": self.outcomes["lock"],
+                "pool_timeout": self.outcomes["pool"],
+                "booking_conflict": self.outcomes["conflict"],
+                "other": self.outcomes["error"],
+                "failed_conversations": sum(self.failures.values()),
+                "failures": dict(self.failures.most_common(10)),
+            },
+        }
+
+
+# --- agent target ---------------------------------------------------------
+
+def agent_runner(stub_url: str, provider: str):
+    """The coordinator agent on an in-memory ADK runner, its model the stub."""
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    from google.adk.runners import InMemoryRunner
+
+    from homestayagent.agent import build_root_agent
+    from homestayagent.llm_cache import CachingLiteLlm
+
+    api_base = stub_url + "/v1" if provider == "openai" else stub_url
+    model = CachingLiteLlm(model=f"{provider}/stub", api_base=api_base, api_key="stub")
+    return InMemoryRunner(agent=build_root_agent(model=model), app_name="replay")
+
+
+async def agent_conversation(runner, index: int, turns: List[str], recorder: Recorder,
+                             streaming: bool) -> None:
+    from google.genai import types
+
+    from homestayagent.agent import run_config
+
+    user_id = f"replay-{index}"
+    session = await runner.session_service.create_session(app_name="replay", user_id=user_id)
+    started = time.perf_counter()
+    calls, booked = 0, False
+    for turn, text in enumerate(turns):
+        t0 = time.perf_counter()
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        async for event in runner.run_async(user_id=user_id, session_id=session.id,
+                                            new_message=message, run_config=run_config(streaming)):
+            if event.partial or not event.content:
+                continue
+            for part in event.content.parts or ():
+                if part.function_response:
+                    calls += 1
+                    outcome = recorder.tool(part.function_response.name,
+                                            part.function_response.response)
+                    booked = booked or outcome == "booked"
+        recorder.turn(turn, time.perf_counter() - t0)
+    recorder.finished(time.perf_counter() - started, calls, booked)
+
+
+async def run_agent(indexes: List[int], concurrency: int, stub_url: str, provider: str,
+                    streaming: bool, seed: int, days: int) -> Recorder:
+    from homestayagent.agent import stream_reply
+
+    runner = agent_runner(stub_url, provider)
+    # One untimed turn, so LiteLLM's first-call setup is not measured
+    session = await runner.session_service.create_session(app_name="replay", user_id="warmup")
+    async for _ in stream_reply(runner, "warmup", session.id, "Hello", streaming):
+        pass
+    recorder = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        async with gate:
+            try:
+                await agent_conversation(runner, index, conversation(index, seed, days),
+                                         recorder, streaming)
+            except Exception as error:
+                recorder.failed(error)
+
+    recorder.start()
+    await asyncio.gather(*(one(index) for index in indexes))
+    recorder.stop()
+    return recorder
+
+
+# --- MCP target -----------------------------------------------------------
+
+class McpDriver:
+    """One MCP client session over SSE, calling tools by name.
+
+    Args:
+        url (str): The server's SSE endpoint, e.g. http://127.0.0.1:8000/sse.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._stack = None
+        self.session = None
+
+    async def __aenter__(self) -> "McpDriver":
+        from contextlib import AsyncExitStack
+
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+
+        self._stack = AsyncExitStack()
+        try:
+            read, write = await self._stack.enter_async_context(sse_client(self.url))
+            self.session = await self._stack.enter_async_context(ClientSession(read, write))
+            await self.session.initialize()
+        except BaseException:
+            await self._stack.aclose()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._stack.aclose()
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Calls a tool and returns the dict it returned; a tool exception
+        comes back as {'error': ...} the way the tools report errors."""
+        result = await self.session.call_tool(name, arguments)
+        text = "".join(getattr(part, "text", "") for part in result.content)
+        if result.isError:
+            return {"error": text}
+        structured = result.structuredContent
+        if isinstance(structured, dict):
+            inner = structured.get("result")
+            return inner if len(structured) == 1 and isinstance(inner, dict) else structured
+        try:
+            return json.loads(text)
+        except ValueError:
+            return {"result": text}
+
+
+async def mcp_conversation(url: str, index: int, turns: List[str], recorder: Recorder) -> None:
+    started = time.perf_counter()
+    calls, booked = 0, False
+    async with McpDriver(url) as driver:
+        history: List[Dict[str, Any]] = []
+        for turn, text in enumerate(turns):
+            t0 = time.perf_counter()
+            history.append({"role": "user", "content": text})
+            while True:
+                step = next_step(history)
+                if isinstance(step, str):
+                    history.append({"role": "assistant", "content": step})
+                    break
+                name = tool_name(step[0], mcp=True)
+                result = await driver.call(name, step[1])
+                calls += 1
+                booked = recorder.tool(name, result) == "booked" or booked
+                history.append({"role": "tool", "content": json.dumps(result)})
+            recorder.turn(turn, time.perf_counter() - t0)
+    recorder.finished(time.perf_counter() - started, calls, booked)
+
+
+async def run_mcp(urls: List[str], conversations: int, concurrency: int, seed: int,
+                  days: int) -> Recorder:
+    recorder = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> None:
+        async with gate:
+            try:
+                await mcp_conversation(urls[index % len(urls)], index,
+                                       conversation(index, seed, days), recorder)
+            except Exception as error:
+                recorder.failed(error)
+
+    recorder.start()
+    await asyncio.gather(*(one(index) for index in range(conversations)))
+    recorder.stop()
+    return recorder
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not listen on port {port} within {SERVER_START_TIMEOUT_S:g}s")
+
+
+def start_mcp_servers(count: int) -> Tuple[List[subprocess.Popen], List[str]]:
+    """Starts ``count`` mcp_server processes on free ports (HOTEL_MCP_PORT),
+    with this process's environment and database; returns them and their
+    SSE URLs once they all listen."""
+    servers, urls = [], []
+    try:
+        for _ in range(count):
+            port = _free_port()
+            env = dict(os.environ, HOTEL_MCP_HOST="127.0.0.1", HOTEL_MCP_PORT=str(port))
+            process = subprocess.Popen([sys.executable, "-m", "mcp_logic.mcp_server"],
+                                       cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL)
+            servers.append(process)
+            urls.append(f"http://127.0.0.1:{port}/sse")
+            _wait_for_port(port, process)
+    except BaseException:
+        stop(servers)
+        raise
+    return servers, urls
+
+
+def stop(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# --- driver ---------------------------------------------------------------
+
+def _worker(args: argparse.Namespace) -> None:
+    """Runs this worker's share of the agent conversations; writes the raw
+    samples to --json."""
+    index, count = (int(part) for part in args.worker.split("/"))
+    indexes = list(range(index, args.conversations, count))
+    recorder = asyncio.run(run_agent(indexes, args.concurrency, args.stub_url, args.provider,
+                                     not args.blocking, args.seed, args.days))
+    with open(args.json, "w") as fh:
+        json.dump(recorder.raw(), fh)
+
+
+def run_agent_workers(args: argparse.Namespace, stub_url: str) -> Recorder:
+    """The agent conversations in this process, or dealt out to --workers
+    processes and merged."""
+    if args.workers == 1:
+        return asyncio.run(run_agent(list(range(args.conversations)), args.concurrency, stub_url,
+                                     args.provider, not args.blocking, args.seed, args.days))
+    command = [sys.executable, "-m", "benchmarks.replay_load", "--target", "agent",
+               "--conversations", str(args.conversations),
+               "--concurrency", str(max(1, args.concurrency // args.workers)),
+               "--provider", args.provider, "--seed", str(args.seed), "--days", str(args.days),
+               "--stub-url", stub_url] + (["--blocking"] if args.blocking else [])
+    outputs = [os.path.join(tempfile.mkdtemp(prefix="hotel-replay-"), f"worker-{index}.json")
+               for index in range(args.workers)]
+    workers = [subprocess.Popen(command + ["--worker", f"{index}/{args.workers}", "--json", output],
+                                cwd=REPO_DIR)
+               for index, output in enumerate(outputs)]
+    recorder = Recorder()
+    try:
+        for worker, output in zip(workers, outputs):
+            if worker.wait():
+                raise RuntimeError(f"agent worker exited with status {worker.returncode}")
+            with open(output) as fh:
+                recorder.merge(json.load(fh))
+    finally:
+        stop([worker for worker in workers if worker.poll() is None])
+    return recorder
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Prints latency and throughput deltas against ``baseline``; False if any regressed."""
+    ok = True
+    print(f"{'metric':30} {'base':>12} {'now':>12}", file=sys.stderr)
+    checks = [(f"latency.{name}.{key}", False) for name in current["latency"]
+              for key in ("p50_ms", "p99_ms")]
+    checks += [("throughput.conversations_per_s", True), ("throughput.bookings_per_s", True)]
+    for path, higher_is_better in checks:
+        base: Optional[Any] = baseline
+        now: Optional[Any] = current
+        for key in path.split("."):
+            base = base.get(key) if isinstance(base, dict) else None
+            now = now.get(key) if isinstance(now, dict) else None
+        if not base or now is None:
+            continue
+        worse = now < base * (1 - max_regression) if higher_is_better \
+            else now > base * (1 + max_regression)
+        ok = ok and not worse
+        print(f"{path:30} {base:12.3f} {now:12.3f}{'  REGRESSION' if worse else ''}",
+              file=sys.stderr)
+    if current["errors"]["lock"] > baseline.get("errors", {}).get("lock", 0):
+        print(f"lock errors: {baseline.get('errors', {}).get('lock', 0)} -> "
+              f"{current['errors']['lock']}  REGRESSION", file=sys.stderr)
+        ok = False
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["agent", "mcp"], default="agent")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="Conversations in flight at once (over all workers)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Agent processes (--target agent) or MCP server processes (--target mcp)")
+    parser.add_argument("--db", help="Database to copy for the run (default: shipped hotel.db)")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Write to --db itself instead of a scratch copy")
+    parser.add_argument("--days", type=int, default=365,
+                        help="Stays start within this many days, so fewer days means more conflicts")
+    parser.add_argument("--provider", choices=["ollama_chat", "openai"], default="ollama_chat",
+                        help="LiteLLM provider the agent uses to reach the stub")
+    parser.add_argument("--blocking", action="store_true",
+                        help="Run the agent without SSE streaming")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0,
+                        help="Stub model delay per request")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0,
+                        help="Stub model decode delay per word")
+    parser.add_argument("--mcp-url", help="Comma-separated SSE URLs of running MCP servers to drive")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Baseline report JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed p50/p99 slowdown vs baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--stub-url", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return _worker(args)
+
+    external = bool(args.mcp_url) and args.target == "mcp"
+    if not external and not args.in_place and os.getenv("HOTEL_DB_BACKEND", "sqlite") == "sqlite" \
+            and not os.getenv("HOTEL_SHARDS"):
+        db_path = os.path.join(tempfile.mkdtemp(prefix="hotel-replay-"), "hotel.db")
+        shutil.copyfile(os.path.abspath(args.db or SOURCE_DB), db_path)
+        os.environ["HOTEL_DB_PATH"] = db_path
+    elif args.db:
+        os.environ["HOTEL_DB_PATH"] = os.path.abspath(args.db)
+    # Keep the agent's LLM response cache out of the source tree
+    os.environ.setdefault("HOTEL_LLM_CACHE_PATH",
+                          os.path.join(tempfile.mkdtemp(prefix="hotel-replay-"), "llm_cache.db"))
+
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.target == "agent":
+            # The stub gets its own process, as the model is remote in production
+            port = _free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.stub_llm_server", "--port", str(port),
+                 "--latency-ms", str(args.llm_latency_ms), "--prefill-ms-per-kchar", "0",
+                 "--token-ms", str(args.llm_token_ms)],
+                cwd=REPO_DIR, stderr=subprocess.DEVNULL,
+            ))
+            _wait_for_port(port, processes[0])
+            recorder = run_agent_workers(args, f"http://127.0.0.1:{port}")
+        else:
+            if external:
+                urls = [url.strip() for url in args.mcp_url.split(",") if url.strip()]
+            else:
+                processes, urls = start_mcp_servers(args.workers)
+            recorder = asyncio.run(run_mcp(urls, args.conversations, args.concurrency,
+                                           args.seed, args.days))
+    finally:
+        stop(processes)
+
+    report = {
+        "meta": {
+            "target": args.target,
+            "conversations": args.conversations,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "days": args.days,
+            "seed": args.seed,
+            "llm_latency_ms": args.llm_latency_ms if args.target == "agent" else None,
+            "database": os.getenv("HOTEL_DATABASE_URL") if os.getenv("HOTEL_DB_BACKEND") == "postgres"
+            else os.getenv("HOTEL_DB_PATH"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        **recorder.summary(),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as fh:
+            fh.write(text)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Benchmark harness for the homestay tool functions and MCP endpoints.
+
+Measures latency percentiles and throughput of availability_fetcher,
+availability_search, get_quote, booking and add_or_get_guest (called
+directly, sequentially and from concurrent threads), the booking
+double-booking race, the FastMCP tool endpoints under concurrent
+clients, and the agent's time to first token with and without streaming
+(against benchmarks.stub_llm_server, so no model endpoint is needed). Results are written as JSON so runs can be compared for
+regressions with --compare.
+
+Writes (bookings, guests) go to a scratch copy of the database unless
+--in-place is given.
+
+Usage:
+    python -m benchmarks.generate_db /tmp/bench.db --rooms 2000 --bookings 1000000
+    python -m benchmarks.run_benchmarks --db /tmp/bench.db --json results.json
+    python -m benchmarks.run_benchmarks --db /tmp/bench.db --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from mcp_logic.latency_report import percentile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(os.path.dirname(SCRIPT_DIR), 'homestayagent', 'hotel.db')
+
+
+def stats(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """Latency percentiles (ms) and throughput for a list of call durations."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p90_ms": round(percentile(samples, 90) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4) if samples else 0.0,
+        "ops_per_s": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def bench(func: Callable[[int], object], iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """Calls ``func(i)`` sequentially and times each call."""
+    for i in range(warmup):
+        func(i)
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - t0)
+    return stats(samples, time.perf_counter() - started)
+
+
+def bench_concurrent(func: Callable[[int], object], calls: int, threads: int) -> Dict[str, float]:
+    """Calls ``func(i)`` from ``threads`` worker threads and times each call."""
+    samples = []
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        t0 = time.perf_counter()
+        func(i)
+        duration = time.perf_counter() - t0
+        with lock:
+            samples.append(duration)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(calls)))
+    result = stats(samples, time.perf_counter() - started)
+    result["threads"] = threads
+    return result
+
+
+def data_window(db_path: str):
+    """Returns (first check-in, last check-out, guest count, active room count)."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        first, last = conn.execute(
+            "SELECT MIN(check_in_datetime), MAX(check_out_datetime) FROM booking"
+        ).fetchone()
+        guests, rooms = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM guest), (SELECT COUNT(*) FROM room WHERE is_active = 1)"
+        ).fetchone()
+    finally:
+        conn.close()
+    today = datetime(2025, 1, 1)
+    first = datetime.fromisoformat(first) if first else today
+    last = datetime.fromisoformat(last) if last else today + timedelta(days=365)
+    return first, max(last, first + timedelta(days=30)), guests, rooms
+
+
+def run_tool_benchmarks(db_path: str, iterations: int, threads: int, seed: int) -> Dict[str, Dict]:
+    # Imported here so HOTEL_DB_PATH is honoured when set by main()
+    from homestayagent import availability_cache, occupancy, write_queue
+    from homestayagent.availability_fetcher_tool import availability_fetcher, availability_search
+    from homestayagent.booking_tool import booking
+    from homestayagent.get_user import add_or_get_guest
+    from homestayagent.pricing import get_quote
+
+    rng = random.Random(seed)
+    first, last, guest_count, room_count = data_window(db_path)
+    span_days = max(1, (last - first).days - 7)
+    results: Dict[str, Dict] = {}
+
+    def window(offset_days: int, nights: int = 2):
+        arrival = first + timedelta(days=offset_days)
+        return (f"{arrival:%Y-%m-%d} 14:00:00",
+                f"{arrival + timedelta(days=nights):%Y-%m-%d} 11:00:00")
+
+    # A fresh engine, so the full load is timed even if one already exists
+    started = time.perf_counter()
+    occupancy.OccupancyEngine(db_path).sync(force=True)
+    results["occupancy.initial_load"] = {"elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    windows = [window(rng.randrange(span_days), rng.choice((1, 2, 3))) for _ in range(iterations)]
+    people = [rng.randint(1, 6) for _ in range(iterations)]
+    results["availability_fetcher.distinct_windows"] = bench(
+        lambda i: availability_fetcher(people[i], *windows[i]), iterations)
+    hot = window(span_days // 2)
+    results["availability_fetcher.repeated_window"] = bench(
+        lambda i: availability_fetcher(2, *hot), iterations)
+    results["availability_fetcher.concurrent"] = bench_concurrent(
+        lambda i: availability_fetcher(people[i], *windows[i]), iterations, threads)
+    results["availability_search.flexible_week"] = bench(
+        lambda i: availability_search(
+            people[i], earliest_check_in_date=windows[i][0][:10],
+            latest_check_out_date=f"{datetime.fromisoformat(windows[i][0]) + timedelta(days=7):%Y-%m-%d}",
+            stay_nights=2),
+        max(1, iterations // 4))
+    results["get_quote"] = bench(
+        lambda i: get_quote(rng.randint(1, room_count), *windows[i]), iterations)
+
+    results["add_or_get_guest.existing"] = bench(
+        lambda i: add_or_get_guest(f"Guest {i}", f"9{rng.randint(1, max(1, guest_count)):09d}", "Tirupati"),
+        iterations)
+    results["add_or_get_guest.new"] = bench(
+        lambda i: add_or_get_guest(f"Bench Guest {i}", f"+bench-{seed}-{i}", "Tirupati"), iterations)
+    results["add_or_get_guest.concurrent"] = bench_concurrent(
+        lambda i: add_or_get_guest(f"Bench Guest {i}", f"+bench-c-{seed}-{i}", "Tirupati"),
+        iterations, threads)
+
+    # Future stays past the generated data, so most bookings succeed
+    future = last + timedelta(days=30)
+
+    def future_window(i: int):
+        arrival = future + timedelta(days=(i // max(1, room_count)) * 3)
+        return (f"{arrival:%Y-%m-%d} 14:00:00", f"{arrival + timedelta(days=2):%Y-%m-%d} 11:00:00")
+
+    outcomes = {"ok": 0, "conflict": 0, "error": 0}
+    outcome_lock = threading.Lock()
+
+    def book(i: int, room_id: Optional[int] = None, stay=None) -> None:
+        result = booking(1, room_id or (i % room_count) + 1, 1, *(stay or future_window(i)))
+        key = "ok" if "system_booking_id" in result else "conflict" if "conflict" in result else "error"
+        with outcome_lock:
+            outcomes[key] += 1
+
+    results["booking.sequential"] = bench(lambda i: book(i), iterations, warmup=0)
+    offset = iterations
+    results["booking.concurrent"] = bench_concurrent(lambda i: book(offset + i), iterations, threads)
+    results["booking.outcomes"] = dict(outcomes)
+
+    # Double-booking race: every call targets the same room and stay
+    race_stay = future_window(10 * iterations * max(1, room_count))
+    outcomes.update(ok=0, conflict=0, error=0)
+    results["booking.race_same_room"] = bench_concurrent(
+        lambda i: book(i, room_id=1, stay=race_stay), max(iterations, 1000), threads)
+    results["booking.race_same_room"].update(
+        winners=outcomes["ok"], conflicts=outcomes["conflict"], errors=outcomes["error"],
+        exactly_one_winner=outcomes["ok"] == 1,
+    )
+    results["availability_cache"] = availability_cache.get_cache().stats()
+    results["write_queue"] = dict(write_queue.get_write_queue().stats(), enabled=write_queue.ENABLED)
+    return results
+
+
+def run_mcp_benchmarks(clients: int, concurrency: int, seed: int) -> Dict[str, Dict]:
+    from mcp_logic.latency_report import run
+    report = asyncio.run(run(clients, concurrency, seed))
+    return {f"mcp.{name}": values for name, values in report.items()}
+
+
+def run_llm_benchmarks(turns: int, latency_ms: float, token_ms: float) -> Dict[str, Dict]:
+    """Time to first token and full reply time of agent turns, streaming vs not.
+
+    Runs the coordinator agent (real prompt and tools) on an in-memory
+    ADK runner against the stub model server, one fresh session per turn.
+    """
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    from google.adk.models.lite_llm import LiteLlm
+    from google.adk.runners import InMemoryRunner
+
+    from benchmarks.stub_llm_server import serve
+    from homestayagent.agent import build_root_agent, stream_reply
+
+    server = serve(port=0, latency_ms=latency_ms, token_ms=token_ms)
+    model = LiteLlm(model="ollama_chat/stub", api_base=f"http://127.0.0.1:{server.server_address[1]}")
+    runner = InMemoryRunner(agent=build_root_agent(model=model), app_name="bench")
+
+    async def measure(streaming: bool):
+        first_samples, total_samples = [], []
+        # One untimed turn, so LiteLLM's first-call setup is not measured
+        session = await runner.session_service.create_session(app_name="bench", user_id="bench")
+        async for _ in stream_reply(runner, "bench", session.id, "Hello", streaming):
+            pass
+        started = time.perf_counter()
+        for turn in range(turns):
+            session = await runner.session_service.create_session(app_name="bench", user_id="bench")
+            t0 = time.perf_counter()
+            first = None
+            async for _ in stream_reply(runner, "bench", session.id,
+                                        f"Hi, I need a room for two, request {turn}", streaming):
+                if first is None:
+                    first = time.perf_counter() - t0
+            total_samples.append(time.perf_counter() - t0)
+            first_samples.append(first if first is not None else total_samples[-1])
+        elapsed = time.perf_counter() - started
+        return stats(first_samples, elapsed), stats(total_samples, elapsed)
+
+    results = {}
+    try:
+        for streaming in (False, True):
+            mode = "streaming" if streaming else "blocking"
+            first, total = asyncio.run(measure(streaming))
+            results[f"llm.{mode}.first_token"] = first
+            results[f"llm.{mode}.full_reply"] = total
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Prints p50/p99 deltas against ``baseline``; False if any regressed."""
+    ok = True
+    print(f"{'benchmark':45} {'p50 base':>10} {'p50 now':>10} {'p99 base':>10} {'p99 now':>10}")
+    for name, now in sorted(current["results"].items()):
+        base = baseline.get("results", {}).get(name)
+        if not base or "p50_ms" not in now or "p50_ms" not in base:
+            continue
+        flag = ""
+        for key in ("p50_ms", "p99_ms"):
+            if base[key] and now[key] > base[key] * (1 + max_regression):
+                flag = "  REGRESSION"
+                ok = False
+        print(f"{name:45} {base['p50_ms']:10.3f} {now['p50_ms']:10.3f} "
+              f"{base['p99_ms']:10.3f} {now['p99_ms']:10.3f}{flag}")
+    return ok
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Database to benchmark (default: shipped hotel.db)")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Write to --db itself instead of a scratch copy")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--mcp-clients", type=int, default=200)
+    parser.add_argument("--mcp-concurrency", type=int, default=50)
+    parser.add_argument("--llm-turns", type=int, default=10,
+                        help="Agent turns per streaming mode for the first-token benchmark (0 skips it)")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0,
+                        help="Stub model delay before the first token")
+    parser.add_argument("--llm-token-ms", type=float, default=15.0,
+                        help="Stub model decode delay per word")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed p50/p99 slowdown vs baseline before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    source = os.path.abspath(args.db or SOURCE_DB)
+    if args.in_place:
+        db_path = source
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="hotel-bench-"), "hotel.db")
+        shutil.copyfile(source, db_path)
+    os.environ["HOTEL_DB_PATH"] = db_path
+
+    results = run_tool_benchmarks(db_path, args.iterations, args.threads, args.seed)
+    results.update(run_mcp_benchmarks(args.mcp_clients, args.mcp_concurrency, args.seed))
+    if args.llm_turns > 0:
+        results.update(run_llm_benchmarks(args.llm_turns, args.llm_latency_ms, args.llm_token_ms))
+
+    report = {
+        "meta": {
+            "source_db": source,
+            "db_bytes": os.path.getsize(db_path),
+            "iterations": args.iterations,
+            "threads": args.threads,
+            "seed": args.seed,
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as fh:
+            fh.write(text)
+
+    passed = results["booking.race_same_room"]["exactly_one_winner"]
+    if args.compare:
+        with open(args.compare) as fh:
+            passed = compare(report, json.load(fh), args.max_regression) and passed
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Local stub of a chat model server, for testing the agent's LLM caching.
+
+Speaks enough of the Ollama (/api/chat, /api/generate) and OpenAI
+(/v1/chat/completions) APIs for LiteLLM's ``ollama_chat/``, ``ollama/``
+and ``openai/`` providers, streaming included. Replies are deterministic
+text derived from the last user message, after a simulated delay:
+
+    first token = --latency-ms + --prefill-ms-per-kchar * uncached prompt chars / 1000
+
+and then --token-ms per word of the reply. Streamed replies send each
+word as it is "decoded"; blocking ones arrive whole at the end, which is
+what the time-to-first-token benchmark compares.
+
+When the request offers tools, the stub plays the scripted booking
+conversations of ``conversation_script``: their turns are answered with
+the scripted tool calls (Ollama ``tool_calls`` or OpenAI function calls,
+streamed as one chunk) and closing texts, which is how ``replay_load``
+runs the real agent without a model. Other messages get the usual text.
+
+A prompt prefix (the system messages) seen before counts as cached, the
+way Ollama reuses the KV cache of an identical prefix, so the prefill
+part of the delay shows what prompt-prefix caching saves. GET /stats
+returns request and cache counters; POST /reset clears them.
+
+Point the agent at it with:
+    python -m benchmarks.stub_llm_server --port 11500
+    OLLAMA_BASE_URL=http://127.0.0.1:11500 adk web
+
+or run ``--check`` for a self-test of the response cache against it.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from benchmarks.conversation_script import next_step, tool_name
+
+
+class StubState:
+    """Counters shared by the request handlers."""
+
+    def __init__(self, latency_ms: float, prefill_ms_per_kchar: float, token_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.prefill_ms_per_kchar = prefill_ms_per_kchar
+        self.token_ms = token_ms
+        self.lock = threading.Lock()
+        self.prefixes: set = set()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.prefixes.clear()
+            self.counters = {"requests": 0, "prompt_chars": 0, "prefix_hits": 0,
+                             "prefix_misses": 0, "cached_prompt_chars": 0, "tool_calls": 0}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def account(self, messages: List[Dict]) -> Tuple[float, int, int]:
+        """Records a request; returns (delay_s, prompt_chars, cached_chars)."""
+        system = "".join(_text(m) for m in messages if m.get("role") == "system")
+        prompt_chars = sum(len(_text(m)) for m in messages)
+        digest = hashlib.sha256(system.encode()).hexdigest()
+        with self.lock:
+            hit = bool(system) and digest in self.prefixes
+            self.prefixes.add(digest)
+            cached = len(system) if hit else 0
+            counters = self.counters
+            counters["requests"] += 1
+            counters["prompt_chars"] += prompt_chars
+            counters["cached_prompt_chars"] += cached
+            counters["prefix_hits" if hit else "prefix_misses"] += 1
+        delay_ms = self.latency_ms + self.prefill_ms_per_kchar * (prompt_chars - cached) / 1000
+        return delay_ms / 1000, prompt_chars, cached
+
+
+def _text(message: Dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def reply_for(messages: List[Dict]) -> str:
+    """Deterministic reply to the last user message."""
+    last = next((_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Thank you for contacting the Homestay. You said: {last.strip()[:200]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState  # set on the subclass made by serve()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, body: Dict, status: int = 200) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            with self.state.lock:
+                self._send_json(dict(self.state.counters))
+        elif self.path in ("/", "/api/version"):
+            self._send_json({"version": "stub"})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/reset":
+            self.state.reset()
+            return self._send_json({"reset": True})
+        if self.path not in ("/api/chat", "/api/generate", "/v1/chat/completions", "/chat/completions"):
+            return self._send_json({"error": "not found"}, 404)
+
+        messages = body.get("messages") or []
+        if self.path == "/api/generate":
+            messages = [{"role": "system", "content": body.get("system") or ""},
+                        {"role": "user", "content": body.get("prompt") or ""}]
+        delay, prompt_chars, cached = self.state.account(messages)
+        time.sleep(delay)
+        text, call = reply_for(messages), None
+        offered = [tool.get("function", {}).get("name") for tool in body.get("tools") or []]
+        if offered:
+            step = next_step(messages)
+            if isinstance(step, str):
+                text = step
+            elif tool_name(step[0], offered):
+                call, text = (tool_name(step[0], offered), step[1]), ""
+                self.state.count("tool_calls")
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = max(1, len(text or json.dumps(call)) // 4)
+        model = body.get("model", "stub")
+        words = text.split(" ") if text else []
+        token_s = self.state.token_ms / 1000
+        ollama = self.path.startswith("/api/")
+        if not body.get("stream", ollama):
+            time.sleep(token_s * max(1, len(words)))
+
+        if ollama:
+            # /api/chat wraps text in a message, /api/generate does not
+            def wrap(content: str) -> Dict:
+                if self.path == "/api/generate":
+                    return {"response": content}
+                return {"message": {"role": "assistant", "content": content}}
+
+            def wrap_call() -> Dict:
+                return {"message": {"role": "assistant", "content": "", "tool_calls": [
+                    {"function": {"name": call[0], "arguments": call[1]}}]}}
+
+            done = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "done": True, "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens}
+            if not body.get("stream", True):
+                return self._send_json({**done, **(wrap_call() if call else wrap(text))})
+            self._start_stream("application/x-ndjson")
+            if call:
+                self._chunk(json.dumps({"model": model, "done": False, **wrap_call()}).encode() + b"\n")
+            for index, word in enumerate(words):
+                piece = word if index == 0 else " " + word
+                if index:
+                    time.sleep(token_s)
+                self._chunk(json.dumps({"model": model, "done": False, **wrap(piece)}).encode() + b"\n")
+            self._chunk(json.dumps({**done, **wrap("")}).encode() + b"\n")
+            return self._chunk(b"")
+
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached // 4}}
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+        finish = "tool_calls" if call else "stop"
+        tool_calls = None
+        if call:
+            call_id = "call_" + hashlib.sha256(
+                f"{len(messages)}:{call[0]}:{json.dumps(call[1], sort_keys=True)}".encode()
+            ).hexdigest()[:16]
+            tool_calls = [{"id": call_id, "type": "function",
+                           "function": {"name": call[0], "arguments": json.dumps(call[1])}}]
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": text or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return self._send_json({**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "finish_reason": finish, "message": message}]})
+        self._start_stream("text/event-stream")
+        if tool_calls:
+            event = {**base, "object": "chat.completion.chunk", "choices": [{
+                "index": 0, "finish_reason": None, "delta": {
+                    "role": "assistant", "content": None,
+                    "tool_calls": [{"index": 0, **tool_calls[0]}]}}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+        for index, word in enumerate(words):
+            piece = word if index == 0 else " " + word
+            if index:
+                time.sleep(token_s)
+            event = {**base, "object": "chat.completion.chunk", "choices": [{
+                "index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+        final = {**base, "object": "chat.completion.chunk", "usage": usage,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}
+        self._chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self._chunk(b"")
+
+
+def serve(host: str = "127.0.0.1", port: int = 11500, latency_ms: float = 200.0,
+          prefill_ms_per_kchar: float = 20.0, token_ms: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stub on a daemon thread and returns the server."""
+    state = StubState(latency_ms, prefill_ms_per_kchar, token_ms)
+    handler = type("Handler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _check(base_url: str, runs: int) -> Dict:
+    """Sends the same opening twice and a different one, through CachingLiteLlm."""
+    # Offline, LiteLLM would otherwise retry fetching its model cost map
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    from google.adk.models.llm_request import LlmRequest
+    from google.genai import types
+
+    from homestayagent.llm_cache import CachingLiteLlm, ResponseCache
+    from homestayagent.prompts import coordinator_instructions
+
+    cache = ResponseCache(os.path.join(tempfile.mkdtemp(), "llm_cache.db"))
+    model = CachingLiteLlm(model="ollama_chat/stub", api_base=base_url, response_cache=cache)
+
+    def request(text: str) -> LlmRequest:
+        return LlmRequest(
+            model="ollama_chat/stub",
+            contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+            config=types.GenerateContentConfig(system_instruction=coordinator_instructions),
+        )
+
+    timings = []
+    for index in range(runs):
+        text = "Hi, what are your check-in times?" if index % 2 == 0 else f"Hello, question {index}"
+        start = time.perf_counter()
+        async for response in model.generate_content_async(request(text)):
+            pass
+        timings.append({
+            "prompt": text,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+            "cached": (response.custom_metadata or {}).get("llm_cache") == "hit",
+        })
+    return {"calls": timings, "cache": cache.stats()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=200.0,
+                        help="Fixed delay per request (network and decode)")
+    parser.add_argument("--prefill-ms-per-kchar", type=float, default=20.0,
+                        help="Extra delay per 1000 prompt characters not in the prefix cache")
+    parser.add_argument("--token-ms", type=float, default=0.0,
+                        help="Decode delay per word of the reply")
+    parser.add_argument("--check", action="store_true",
+                        help="Run the response cache against the stub and exit")
+    parser.add_argument("--runs", type=int, default=6, help="Requests sent by --check")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms, args.prefill_ms_per_kchar, args.token_ms)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    if args.check:
+        report = asyncio.run(_check(base_url, args.runs))
+        with server.RequestHandlerClass.state.lock:
+            report["server"] = dict(server.RequestHandlerClass.state.counters)
+        print(json.dumps(report, indent=2))
+        server.shutdown()
+        return
+    print(f"stub model server on {base_url}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,132 @@
-from google.adk.agents import Agent,LlmAgent
-from google.adk.models.lite_llm import LiteLlm
+from google.adk.agents import LlmAgent
 from .prompts import (coordinator_instructions)
-from .availability_fetcher_tool import availability_fetcher
+from .availability_fetcher_tool import availability_fetcher, availability_search
 from .booking_tool import booking
 from datetime import date
-from google.adk.tools import FunctionTool,ToolContext
-from google.genai import types
-from google.adk.agents.callback_context import CallbackContext
-from google.adk.tools import load_artifacts
-from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools import FunctionTool
 from .get_user import add_or_get_guest
+from .pricing import get_quote
+from .occupancy_calendar import occupancy_heatmap
+from .holds import hold_room, release_hold
+from . import metrics
 import os
+import threading
+from typing import AsyncIterator
 from dotenv import load_dotenv
 
 load_dotenv()
 
-date_today = date.today()
 availability_fetcher_tool = FunctionTool(func=availability_fetcher)
+availability_search_tool = FunctionTool(func=availability_search)
 booking_tool = FunctionTool(func=booking)
 add_or_get_guest_tool = FunctionTool(func=add_or_get_guest)
+quote_tool = FunctionTool(func=get_quote)
+heatmap_tool = FunctionTool(func=occupancy_heatmap)
+hold_room_tool = FunctionTool(func=hold_room)
+release_hold_tool = FunctionTool(func=release_hold)
 
-root_agent = LlmAgent(
-    name='HomeStayAgent',
-    model=LiteLlm(
-        model="ollama_chat/gpt-oss:120b-cloud",
-        api_base=os.getenv("OLLAMA_BASE_URL"),
-        headers={"Authorization": f"Bearer {os.getenv('OLLAMA_API_KEY')}"}
-    ),
-    description='A helpful assistant for user questions.',
-    instruction=coordinator_instructions,
-    global_instruction=(
-        f"""Todays date: {date_today}"""
-    ),
-    tools=[availability_fetcher_tool, booking_tool, add_or_get_guest_tool]
-)
-
-'''
-root_agent = LlmAgent(
-    name='HomeStayAgent',
-    model='gemini-2.0',
-    description='A helpful assistant for user questions.',
-    instruction=coordinator_instructions,
-    global_instruction=(
-        f"""Todays date: {date_today}"""
-    ),
-    tools=[availability_fetcher_tool, booking_tool, add_or_get_guest_tool]
-)
-'''
\ No newline at end of file
+# Stream the model's output token by token (ADK StreamingMode.SSE) unless
+# HOTEL_STREAMING=0
+STREAMING = os.getenv("HOTEL_STREAMING", "1") != "0"
+
+_root_agent = None
+_root_agent_lock = threading.Lock()
+
+
+def build_root_agent(model=None) -> LlmAgent:
+    """Creates the coordinator agent and its LiteLLM model.
+
+    LiteLLM is imported here rather than at module level; it is the
+    slowest import in the agent and is not needed until the first turn.
+    The model is wrapped with the response and prompt-prefix caches of
+    llm_cache.
+
+    Args:
+        model: Model to use instead (e.g. one pointed at a stub server).
+    """
+    if model is None:
+        from .llm_cache import CachingLiteLlm
+
+        model = CachingLiteLlm(
+            model="ollama_chat/gpt-oss:120b-cloud",
+            api_base=os.getenv("OLLAMA_BASE_URL"),
+            headers={"Authorization": f"Bearer {os.getenv('OLLAMA_API_KEY')}"}
+        )
+
+    return LlmAgent(
+        name='HomeStayAgent',
+        model=model,
+        description='A helpful assistant for user questions.',
+        instruction=coordinator_instructions,
+        global_instruction=(
+            f"""Todays date: {date.today()}"""
+        ),
+        tools=[availability_fetcher_tool, availability_search_tool, booking_tool,
+               add_or_get_guest_tool, quote_tool, heatmap_tool,
+               hold_room_tool, release_hold_tool],
+        before_model_callback=metrics.before_model_callback,
+        after_model_callback=metrics.after_model_callback,
+        on_model_error_callback=metrics.on_model_error_callback,
+        before_tool_callback=metrics.before_tool_callback,
+        after_tool_callback=metrics.after_tool_callback,
+        on_tool_error_callback=metrics.on_tool_error_callback,
+    )
+
+
+def run_config(streaming: bool = STREAMING):
+    """RunConfig for running the agent; SSE streaming unless disabled.
+
+    ``adk web`` and ``adk api_server`` choose streaming per request
+    (/run_sse); pass this to ``Runner.run_async`` when running the agent
+    from code.
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+
+    return RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+
+
+async def stream_reply(runner, user_id: str, session_id: str, text: str,
+                       streaming: bool = STREAMING) -> AsyncIterator[str]:
+    """Runs one user turn and yields the agent's reply text as it is generated.
+
+    With streaming each chunk is yielded on arrival. The aggregated event
+    ADK sends after the chunks is skipped, so no text is yielded twice.
+    Without streaming, each model response is yielded whole.
+
+    Args:
+        runner: ADK Runner for the agent.
+        user_id (str): Session owner.
+        session_id (str): Existing session to continue.
+        text (str): The user's message.
+        streaming (bool): Use StreamingMode.SSE.
+    """
+    from google.genai import types
+
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    streamed = False
+    async for event in runner.run_async(user_id=user_id, session_id=session_id,
+                                        new_message=message,
+                                        run_config=run_config(streaming)):
+        parts = event.content.parts if event.content and event.content.parts else []
+        chunk = "".join(part.text for part in parts if part.text and not part.thought)
+        if event.partial:
+            if chunk:
+                streamed = True
+                yield chunk
+            continue
+        if chunk and not streamed:
+            yield chunk
+        streamed = False
+
+
+def __getattr__(name):
+    # root_agent is built on first access (ADK's loader reads it as an
+    # attribute of this module), not at import
+    global _root_agent
+    if name != "root_agent":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _root_agent is None:
+        with _root_agent_lock:
+            if _root_agent is None:
+                _root_agent = build_root_agent()
+    return _root_agent
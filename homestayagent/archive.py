@@ -0,0 +1,175 @@
+"""Moves booking history out of the hot ``booking`` table.
+
+Every availability and booking query reads ``booking`` (directly, or
+through the occupancy index and calendar built from it), so stays that
+ended long ago and old cancellations only make them slower as history
+grows. ``archive_bookings`` moves such bookings into ``booking_archive``
+in short batched transactions; the delete trigger logs each one, so the
+occupancy index and room_day_occupancy drop them as usual. The hot set
+then only holds current and future stays plus a recent tail.
+
+Reporting reads the ``booking_history`` view (``booking`` UNION ALL
+``booking_archive``). Archived bookings can no longer change status, and
+the occupancy heatmap only covers months after the horizon.
+
+Run it periodically (e.g. nightly from cron):
+    python -m homestayagent.archive --horizon-days 90
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from . import db, occupancy, occupancy_calendar
+
+# Bookings that ended, or were cancelled, longer ago than this are archived
+HORIZON_DAYS = float(os.getenv("HOTEL_ARCHIVE_HORIZON_DAYS", "90"))
+# Bookings moved per transaction, so bookings made meanwhile wait only briefly
+BATCH_SIZE = int(os.getenv("HOTEL_ARCHIVE_BATCH_SIZE", "500"))
+# Change log entries kept when pruning, so occupancy indexes that are a
+# little behind can still catch up incrementally instead of reloading
+CHANGE_LOG_KEEP = int(os.getenv("HOTEL_CHANGE_LOG_KEEP", "10000"))
+
+# booking's columns; booking_archive has the same ones plus archived_at
+BOOKING_COLUMNS = (
+    "booking_id", "guest_id", "building_id", "room_id", "num_persons",
+    "check_in_datetime", "check_out_datetime", "days_charged", "extra_beds",
+    "extra_bed_price", "subtotal_amount", "taxes_and_fees", "total_price",
+    "advance_due_amount", "advance_paid_amount", "advance_paid_datetime",
+    "status_id", "status_updated_at", "created_at", "updated_at",
+    "cancellation_reason", "cancelled_at",
+)
+_COLUMNS = ", ".join(BOOKING_COLUMNS)
+
+# Bookings due for archiving. Stays are compared as text like everywhere
+# else; cancellations are dated by when they were cancelled.
+_DUE = """
+    FROM booking b
+    JOIN booking_status s ON s.booking_status_id = b.status_id
+    WHERE b.check_out_datetime < ?
+       OR (s.code IN ({}) AND COALESCE(b.cancelled_at, b.updated_at) < ?)
+""".format(", ".join("?" * len(occupancy.INACTIVE_STATUS_CODES)))
+# Oldest first, one batch at a time
+CANDIDATES_QUERY = "SELECT b.booking_id" + _DUE + "ORDER BY b.booking_id LIMIT ?"
+
+
+def _move(conn: sqlite3.Connection, booking_ids: List[int]) -> None:
+    placeholders = ", ".join("?" * len(booking_ids))
+    conn.execute(
+        f"INSERT INTO booking_archive ({_COLUMNS})"
+        f" SELECT {_COLUMNS} FROM booking WHERE booking_id IN ({placeholders})",
+        booking_ids,
+    )
+    conn.execute(f"DELETE FROM booking WHERE booking_id IN ({placeholders})", booking_ids)
+
+
+def prune_change_log(conn: sqlite3.Connection, keep: int = CHANGE_LOG_KEEP) -> int:
+    """Deletes change log entries that every derived table has consumed.
+
+    Entries past the lowest occupancy_watermark are kept, as are the
+    latest ``keep``. An occupancy index further behind than that does a
+    full reload on its next sync, which it detects by itself.
+
+    Returns:
+        int: Entries deleted.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        lowest, last_id = conn.execute(
+            "SELECT (SELECT MIN(change_id) FROM occupancy_watermark),"
+            " (SELECT COALESCE(MAX(change_id), 0) FROM occupancy_change_log)"
+        ).fetchone()
+        limit = last_id - max(1, keep)
+        if lowest is not None:
+            limit = min(limit, lowest)
+        deleted = conn.execute(
+            "DELETE FROM occupancy_change_log WHERE change_id <= ?", (limit,)
+        ).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return max(deleted, 0)
+
+
+def archive_bookings(horizon_days: float = HORIZON_DAYS, batch_size: int = BATCH_SIZE,
+                     now: Optional[datetime] = None, db_path: Optional[str] = None,
+                     dry_run: bool = False) -> dict:
+    """Moves bookings older than the horizon from booking to booking_archive.
+
+    A booking is archived once its stay ended more than ``horizon_days``
+    ago, or, if cancelled, once it was cancelled that long ago. Each batch
+    is one ``BEGIN IMMEDIATE`` transaction that also keeps the occupancy
+    calendar in step; the change log is pruned at the end.
+
+    Args:
+        horizon_days (float): How far back bookings stay in the hot table.
+        batch_size (int): Bookings moved per transaction.
+        now (datetime, optional): Reference time; defaults to now.
+        db_path (str, optional): Database; defaults to the configured one.
+        dry_run (bool): Only count what would be archived.
+
+    Returns:
+        dict: On success:
+              {
+                  'cutoff': str,             # 'YYYY-MM-DD HH:MM:SS'
+                  'archived': int,           # or 'would_archive' for a dry run
+                  'batches': int,
+                  'change_log_pruned': int
+              }
+              On failure:
+              {
+                  'error': str,
+                  'archived': int            # moved before the failure
+              }
+    """
+    cutoff = ((now or datetime.now()) - timedelta(days=horizon_days)).strftime("%Y-%m-%d %H:%M:%S")
+    params = (cutoff, *occupancy.INACTIVE_STATUS_CODES, cutoff)
+    pool = db.get_pool(db_path)
+    archived = batches = 0
+    try:
+        conn = pool.acquire()
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}", 'archived': 0}
+    try:
+        if dry_run:
+            count = conn.execute("SELECT COUNT(*)" + _DUE, params).fetchone()[0]
+            return {'cutoff': cutoff, 'would_archive': count}
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            booking_ids = [row[0] for row in conn.execute(CANDIDATES_QUERY, (*params, batch_size))]
+            if not booking_ids:
+                conn.rollback()
+                break
+            _move(conn, booking_ids)
+            occupancy_calendar.refresh(conn)
+            conn.commit()
+            archived += len(booking_ids)
+            batches += 1
+        pruned = prune_change_log(conn)
+    except sqlite3.Error as db_err:
+        if conn.in_transaction:
+            conn.rollback()
+        return {'error': f"Database error: {db_err}", 'archived': archived}
+    finally:
+        pool.release(conn)
+    return {'cutoff': cutoff, 'archived': archived, 'batches': batches,
+            'change_log_pruned': pruned}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive old bookings out of the hot booking table")
+    parser.add_argument("--horizon-days", type=float, default=HORIZON_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--db", help="Database path or PostgreSQL URL (default: configured database)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived")
+    args = parser.parse_args()
+    result = archive_bookings(args.horizon_days, args.batch_size, db_path=args.db,
+                              dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
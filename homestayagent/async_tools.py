@@ -0,0 +1,221 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from . import db, metrics, write_queue
+from .availability_fetcher_tool import (availability_fetcher, availability_search,
+                                        iter_availability_search)
+from .booking_tool import booking, submit_booking
+from .get_user import add_or_get_guest
+from .holds import HOLD_MINUTES, hold_room, release_hold
+from .occupancy_calendar import occupancy_heatmap
+from .pricing import get_quote
+from .reports import outstanding_advances, period_report
+
+# One worker per pooled connection: more threads would only queue on the pool
+TOOL_WORKERS = int(os.getenv("HOTEL_TOOL_WORKERS", str(db.POOL_SIZE)))
+
+# Windows evaluated per step when availability_search is streamed
+SEARCH_STREAM_CHUNK = int(os.getenv("HOTEL_SEARCH_STREAM_CHUNK", "7"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared executor the async tool wrappers run on."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=TOOL_WORKERS, thread_name_prefix="hotel-tool"
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a blocking tool function on the tool executor and awaits it.
+
+    The event loop stays free while sqlite works, so an async server can
+    multiplex many clients; concurrency is bounded by ``TOOL_WORKERS``.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    result = None
+    try:
+        result = await loop.run_in_executor(
+            get_executor(), functools.partial(func, *args, **kwargs)
+        )
+        return result
+    finally:
+        # Timed from the caller's side, so executor queueing is included
+        metrics.record_tool(func.__name__, time.perf_counter() - started, result)
+
+
+async def iterate_blocking(func: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+    """Runs a blocking generator on the tool executor, yielding each item as it is produced.
+
+    Every step runs as its own executor task, so the event loop can send
+    an item to the client before the generator computes the next one.
+    The whole iteration is recorded as one call of ``func``.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    done = object()
+    started = time.perf_counter()
+    items = []
+    try:
+        iterator = await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, done)
+            if item is done:
+                return
+            items.append(item)
+            yield item
+    finally:
+        # A stream that ended in an error counts as a failed call
+        failed = items and isinstance(items[-1], dict) and "error" in items[-1]
+        metrics.record_tool(func.__name__, time.perf_counter() - started,
+                            items[-1] if failed else items)
+
+
+async def availability_fetcher_async(num_people: int, check_in_datetime: str,
+                                     check_out_datetime: str, response_format: str = "full",
+                                     top_k: int = 0, page: int = 1,
+                                     guest_id: Optional[int] = None,
+                                     max_price: Optional[float] = None,
+                                     min_floor: Optional[int] = None,
+                                     max_floor: Optional[int] = None,
+                                     lift: bool = False,
+                                     features: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Async version of ``availability_fetcher``; same arguments and result."""
+    return await run_blocking(
+        availability_fetcher, num_people, check_in_datetime, check_out_datetime,
+        response_format, top_k, page, guest_id, max_price, min_floor, max_floor, lift, features
+    )
+
+
+async def availability_search_async(num_people: int,
+                                    windows: Optional[List[Dict[str, str]]] = None,
+                                    earliest_check_in_date: Optional[str] = None,
+                                    latest_check_out_date: Optional[str] = None,
+                                    stay_nights: int = 0,
+                                    check_in_time: str = "14:00",
+                                    check_out_time: str = "11:00",
+                                    max_rooms_per_window: int = 5,
+                                    response_format: str = "full",
+                                    guest_id: Optional[int] = None,
+                                    max_price: Optional[float] = None,
+                                    min_floor: Optional[int] = None,
+                                    max_floor: Optional[int] = None,
+                                    lift: bool = False,
+                                    features: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Async version of ``availability_search``; same arguments and result."""
+    return await run_blocking(
+        availability_search, num_people, windows, earliest_check_in_date,
+        latest_check_out_date, stay_nights, check_in_time, check_out_time,
+        max_rooms_per_window, response_format, guest_id, max_price, min_floor, max_floor,
+        lift, features
+    )
+
+
+def availability_search_stream_async(num_people: int,
+                                     windows: Optional[List[Dict[str, str]]] = None,
+                                     earliest_check_in_date: Optional[str] = None,
+                                     latest_check_out_date: Optional[str] = None,
+                                     stay_nights: int = 0,
+                                     check_in_time: str = "14:00",
+                                     check_out_time: str = "11:00",
+                                     max_rooms_per_window: int = 5,
+                                     response_format: str = "full",
+                                     guest_id: Optional[int] = None,
+                                     chunk_size: int = SEARCH_STREAM_CHUNK,
+                                     max_price: Optional[float] = None,
+                                     min_floor: Optional[int] = None,
+                                     max_floor: Optional[int] = None,
+                                     lift: bool = False,
+                                     features: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Async iterator over ``iter_availability_search``: the header, then each window."""
+    return iterate_blocking(
+        iter_availability_search, num_people, windows, earliest_check_in_date,
+        latest_check_out_date, stay_nights, check_in_time, check_out_time,
+        max_rooms_per_window, response_format, guest_id, chunk_size, max_price, min_floor,
+        max_floor, lift, features
+    )
+
+
+async def booking_async(guest_id: int, room_id: int, num_persons: int,
+                        check_in_datetime: str, check_out_datetime: str,
+                        extra_beds: int = 0) -> dict:
+    """Async version of ``booking``; same arguments and result.
+
+    With the write queue on, the insert is awaited on the queue directly
+    and no tool worker is tied up while it waits for its batch.
+    """
+    if not write_queue.ENABLED:
+        return await run_blocking(
+            booking, guest_id, room_id, num_persons, check_in_datetime,
+            check_out_datetime, extra_beds
+        )
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    result = None
+    try:
+        # Queueing finds the room's shard, which can query every shard, so
+        # it runs on a tool worker; only the wait for the commit is here
+        future = await loop.run_in_executor(get_executor(), functools.partial(
+            submit_booking, guest_id, room_id, num_persons, check_in_datetime,
+            check_out_datetime, extra_beds
+        ))
+        result = await asyncio.wrap_future(future)
+        return result
+    finally:
+        metrics.record_tool(booking.__name__, time.perf_counter() - started, result)
+
+
+async def add_or_get_guest_async(name: str, phone: str, city: str) -> dict:
+    """Async version of ``add_or_get_guest``; same arguments and result."""
+    return await run_blocking(add_or_get_guest, name, phone, city)
+
+
+async def get_quote_async(room_id: int, check_in_datetime: str, check_out_datetime: str,
+                          extra_beds: int = 0) -> dict:
+    """Async version of ``pricing.get_quote``; same arguments and result."""
+    return await run_blocking(
+        get_quote, room_id, check_in_datetime, check_out_datetime, extra_beds
+    )
+
+
+async def occupancy_heatmap_async(month: str, building_id: Optional[int] = None,
+                                  room_type_id: Optional[int] = None) -> dict:
+    """Async version of ``occupancy_calendar.occupancy_heatmap``; same arguments and result."""
+    return await run_blocking(occupancy_heatmap, month, building_id, room_type_id)
+
+
+async def hold_room_async(guest_id: int, room_id: int, check_in_datetime: str,
+                          check_out_datetime: str, minutes: float = HOLD_MINUTES) -> dict:
+    """Async version of ``holds.hold_room``; same arguments and result."""
+    return await run_blocking(
+        hold_room, guest_id, room_id, check_in_datetime, check_out_datetime, minutes
+    )
+
+
+async def release_hold_async(guest_id: int, hold_id: int) -> dict:
+    """Async version of ``holds.release_hold``; same arguments and result."""
+    return await run_blocking(release_hold, guest_id, hold_id)
+
+
+async def period_report_async(period: str, group_by: str = "building",
+                              building_id: Optional[int] = None) -> dict:
+    """Async version of ``reports.period_report``; same arguments and result."""
+    return await run_blocking(period_report, period, group_by, building_id)
+
+
+async def outstanding_advances_async(building_id: Optional[int] = None, limit: int = 20) -> dict:
+    """Async version of ``reports.outstanding_advances``; same arguments and result."""
+    return await run_blocking(outstanding_advances, building_id, limit)
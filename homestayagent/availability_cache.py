@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from . import db, occupancy
+
+CACHE_MAX_ENTRIES = int(os.getenv("HOTEL_AVAILABILITY_CACHE_SIZE", "1024"))
+CACHE_TTL_S = float(os.getenv("HOTEL_AVAILABILITY_CACHE_TTL_S", "60"))
+
+
+class AvailabilityCache:
+    """LRU + TTL cache of availability results keyed on normalised inputs.
+
+    Keys are ``(num_people, check_in, check_out, ...)`` tuples whose second
+    and third items are canonical datetimes; any further items are
+    filters that only narrow the result. An entry is dropped when the
+    occupancy engine reports a stay added or removed on a room that could
+    appear in it (capacity >= num_people) and overlapping its window, and
+    every entry is dropped when the room catalog changes.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used one
+            is evicted.
+        ttl (float): Seconds an entry stays valid regardless of writes.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every occupancy change; see put()
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for ``key`` or None on miss/expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Stores ``value`` under ``key``.
+
+        Pass the ``generation`` read before computing the value: if an
+        occupancy change arrived in the meantime the value may already be
+        stale and is not stored.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def on_occupancy_change(self,
+                            changes: Optional[List[Tuple[int, Optional[int], str, str]]]) -> None:
+        """Occupancy engine listener: drops entries the changed stays affect."""
+        if changes is None:
+            self.clear()
+            return
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key in self._entries
+                if any(
+                    (capacity is None or capacity >= key[0])
+                    and start < key[2] and end > key[1]
+                    for _, capacity, start, end in changes
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction/invalidation counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_caches: Dict[str, AvailabilityCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path: Optional[str] = None) -> AvailabilityCache:
+    """Returns the cache for ``db_path``, subscribed to its occupancy engine."""
+    path = db.resolve(db_path)
+    cache = _caches.get(path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = AvailabilityCache()
+                occupancy.get_engine(path).add_listener(cache.on_occupancy_change)
+    return cache
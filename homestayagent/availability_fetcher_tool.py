@@ -1,16 +1,145 @@
 import sqlite3
-from prettytable import PrettyTable
-from typing import Union, Dict, Any
-import os
+from datetime import date, timedelta
+from typing import Union, Dict, Any, Iterator, List, Optional, Tuple
+from . import availability_cache, holds, occupancy, pricing, room_filters, shards
+
+# Upper bound on windows evaluated by one availability_search call
+MAX_SEARCH_WINDOWS = 31
+
+AVAILABILITY_COLUMNS = [
+    "Room ID", "Room No", "Type", "Max Guests",
+    "Price/Night", "Building", "Extra Bed", "Extra Bed Price",
+    "Days Charged", "Stay Total",
+]
+
+# Compact format: one row per room type (in a building) instead of per
+# room, numeric values, and the header sent once
+RESPONSE_FORMATS = ("full", "compact")
+COMPACT_COLUMNS = [
+    "type", "building", "max_guests", "price_per_night",
+    "extra_bed_price", "stay_total", "free_rooms", "room_ids",
+]
+# Room types listed per page in compact format when top_k is not given
+COMPACT_TOP_K = 10
+# Room IDs listed per room type in compact format; free_rooms has the count
+COMPACT_MAX_ROOM_IDS = 5
+
+
+def _format_room(row: Tuple, days: int) -> Tuple:
+    """Formats an occupancy catalog row into the AVAILABILITY_COLUMNS values.
+
+    The stay total is priced for ``days`` charged days without extra beds,
+    exactly as ``booking`` will charge it.
+    """
+    room_id, room_number, type_name, capacity, price, building, extra_bed, extra_bed_price = row
+    stay_total = pricing.price_breakdown(days, price, extra_bed, extra_bed_price)['total_price']
+    return (
+        room_id,
+        room_number,
+        type_name,
+        capacity,
+        f"₹{price:.2f}",
+        building,
+        "Yes" if extra_bed else "No",
+        f"₹{(extra_bed_price or 0):.2f}",
+        days,
+        f"₹{stay_total:.2f}",
+    )
+
+
+def _compact_rows(rooms: List[Tuple], days: int) -> List[List[Any]]:
+    """Groups occupancy catalog rows by room type into COMPACT_COLUMNS rows.
+
+    ``rooms`` is cheapest first, so the groups are too. extra_bed_price is
+    None for room types that do not offer extra beds.
+    """
+    groups: Dict[Tuple, List[Any]] = {}
+    for room_id, _, type_name, capacity, price, building, extra_bed, extra_bed_price in rooms:
+        key = (type_name, building, capacity, price, extra_bed, extra_bed_price)
+        group = groups.get(key)
+        if group is None:
+            stay_total = pricing.price_breakdown(days, price, extra_bed, extra_bed_price)['total_price']
+            group = groups[key] = [
+                type_name, building, capacity, float(price),
+                float(extra_bed_price or 0.0) if extra_bed else None,
+                stay_total, 0, [],
+            ]
+        group[6] += 1
+        if len(group[7]) < COMPACT_MAX_ROOM_IDS:
+            group[7].append(room_id)
+    return list(groups.values())
+
+
+def _find_rooms(num_people: int, start: str, end: str, guest_id: Optional[int],
+                prefs: Optional[room_filters.Preferences]) -> List[Tuple]:
+    """Free rooms of the current database for one stay, cheapest first.
+
+    Answers from the result cache, else from the in-memory occupancy
+    index. Syncing the index first delivers any pending invalidations to
+    the cache. The cache holds every free room; preferences narrow the
+    result afterwards.
+    """
+    engine = occupancy.get_engine()
+    cache = availability_cache.get_cache()
+    engine.sync()
+    key = (num_people, start, end)
+    rooms = cache.get(key)
+    if rooms is None:
+        generation = cache.generation
+        rooms = engine.free_rooms(num_people, start, end)
+        cache.put(key, rooms, generation)
+    # Holds are short-lived, so they are applied on top of the cached
+    # result rather than invalidating it
+    rooms = holds.get_registry().filter_rooms(rooms, start, end, guest_id)
+    return room_filters.filter_rooms(rooms, prefs)
+
+
+def _find_rooms_multi(num_people: int, chunk: List[Tuple[str, str]], guest_id: Optional[int],
+                      prefs: Optional[room_filters.Preferences]) -> List[List[Tuple]]:
+    """Free rooms of the current database for each window of ``chunk``."""
+    per_window = occupancy.get_engine().free_rooms_multi(num_people, chunk)
+    registry = holds.get_registry()
+    return [
+        room_filters.filter_rooms(
+            registry.filter_rooms(rooms, occupancy.normalise_datetime(start),
+                                  occupancy.normalise_datetime(end), guest_id),
+            prefs,
+        )
+        for (start, end), rooms in zip(chunk, per_window)
+    ]
+
+
+def _paginate(items: List[Any], top_k: int, page: int) -> Tuple[List[Any], Dict[str, int]]:
+    """Returns page ``page`` (1-based) of ``top_k`` items and the page info."""
+    total_pages = max(1, -(-len(items) // top_k))
+    offset = (page - 1) * top_k
+    return items[offset:offset + top_k], {"page": page, "total_pages": total_pages}
+
+
 def availability_fetcher(num_people: int, 
                      check_in_datetime: str, 
-                     check_out_datetime: str
+                     check_out_datetime: str,
+                     response_format: str = "full",
+                     top_k: int = 0,
+                     page: int = 1,
+                     guest_id: Optional[int] = None,
+                     max_price: Optional[float] = None,
+                     min_floor: Optional[int] = None,
+                     max_floor: Optional[int] = None,
+                     lift: bool = False,
+                     features: Optional[List[str]] = None
                     ) -> Dict[str, Any]:
     """
     Query the hotel database for rooms matching the requested capacity and date range,
     format the results into return structured JSON
     for programmatic consumption by an ADK agent tool.
 
+    Occupancy is answered from the in-memory index in ``occupancy.py``;
+    rooms are blocked only by bookings that are not CANCELLED. Repeated
+    lookups are served from ``availability_cache`` until a write touches an
+    overlapping stay. With ``HOTEL_SHARDS`` set, every shard is searched in
+    parallel (see ``shards.py``).
+
     **Args**
     num_people : int
         The minimum number of guests the room must accommodate.
@@ -18,10 +147,32 @@ def availability_fetcher(num_people: int,
         The desired check-in timestamp in ISO 8601 format (e.g., "2025-05-10 14:00").
     check_out_datetime : str
         The desired check-out timestamp in ISO 8601 format (e.g., "2025-05-12 11:00").
+    response_format : str
+        "full" (default) lists every room as a dict; "compact" lists one
+        row per room type, see below. Prefer "compact" when many rooms
+        may match.
+    top_k : int
+        Page size: rooms per page in "full" format (0 lists all of them),
+        room types per page in "compact" format (0 means 10).
+    page : int
+        Page to return, starting at 1.
+    guest_id : int, optional
+        The guest searching. Rooms held for other guests are never listed;
+        rooms held for this guest are.
+    max_price : float, optional
+        Budget: only rooms whose price per night is at most this.
+    min_floor / max_floor : int, optional
+        Only rooms on these floors or between them.
+    lift : bool
+        Only rooms in buildings with a lift.
+    features : list of str, optional
+        Keywords that must all appear in the room type's name or features,
+        e.g. ["wi-fi", "kitchen"]; the last word of each may be the start
+        of a word ("kitchen" finds "Kitchenette").
 
     **Returns**
     dict
-        A dictionary with two top-level keys:
+        In "full" format, a dictionary with two top-level keys:
         
         - "given_input_specifications": a dict echoing back the inputs plus the total count
           of matching rooms:
@@ -40,6 +191,9 @@ def availability_fetcher(num_people: int,
                 * "Building"          : str
                 * "Extra Bed"         : "Yes" or "No"
                 * "Extra Bed Price"   : str (formatted with currency symbol)
+                * "Days Charged"      : int (days billed under the rate rule)
+                * "Stay Total"        : str (total for the stay without extra
+                                        beds, formatted with currency symbol)
             - The string "No rooms available for this specification" if zero matches.
 
 
@@ -66,45 +220,92 @@ Example outputs:
         },
         "available_rooms": "No rooms available for this specification"
     }
+
+    In "compact" format, the header is sent once and each row is one room
+    type in one building, cheapest first:
+
+    {
+        "given_input_specifications": {
+            "num_people": 2,
+            "check_in": "2025-05-10 14:00:00",
+            "check_out": "2025-05-12 11:00:00",
+            "result_count": 9,
+            "days_charged": 2
+        },
+        "columns": ["type", "building", "max_guests", "price_per_night",
+                    "extra_bed_price", "stay_total", "free_rooms", "room_ids"],
+        "room_types": [
+            ["1 BHK Small", "Block A", 2, 1200.0, null, 2400.0, 3, [1, 2, 3]],
+            ...
+        ],
+        "page": 1,
+        "total_pages": 1
+    }
+
+    "extra_bed_price" is null when the type offers no extra beds,
+    "free_rooms" counts all free rooms of the type and "room_ids" lists up
+    to 5 of them. "room_types" is the string "No rooms available for this
+    specification" if zero matches.
+
+    When top_k is set in "full" format, "page" and "total_pages" are added
+    there too. When any of max_price, min_floor, max_floor, lift or
+    features is given, "given_input_specifications" has a "preferences"
+    dict echoing them, and only matching rooms are counted and listed.
+    Invalid input returns {"error": str}.
     """
-    # Establish database connection
-    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(SCRIPT_DIR, 'hotel.db')
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Build and execute availability query
-    availability_query = """
-    SELECT
-        r.room_id AS "Room ID",
-        r.room_number AS "Room No",
-        rt.name AS "Type",
-        rt.capacity AS "Max Guests",
-        printf("₹%.2f", rt.price) AS "Price/Night",
-        b.name AS "Building",
-        CASE WHEN rt.extra_bed_included THEN 'Yes' ELSE 'No' END AS "Extra Bed",
-        printf("₹%.2f", rt.extra_bed_price) AS "Extra Bed Price"
-    FROM room r
-    JOIN room_type rt ON r.room_type_id = rt.room_type_id
-    JOIN building b ON rt.building_id = b.building_id
-    WHERE rt.capacity >= ?
-      AND r.is_active = 1
-      AND r.room_id NOT IN (
-          SELECT room_id
-          FROM booking
-          WHERE check_in_datetime < ?
-            AND check_out_datetime > ?
-      )
-    ORDER BY rt.price ASC, rt.capacity DESC
-    """
+    try:
+        start = occupancy.normalise_datetime(check_in_datetime)
+        end = occupancy.normalise_datetime(check_out_datetime)
+    except ValueError:
+        return {"error": "Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS)."}
+    try:
+        days = pricing.days_charged(start, end, pricing.get_rate_rule())
+    except pricing.QuoteError as e:
+        return {"error": str(e)}
+    except sqlite3.Error as db_err:
+        return {"error": f"Database error: {db_err}"}
 
-    cursor.execute(
-        availability_query,
-        (num_people, check_out_datetime, check_in_datetime)
-    )
-    results = cursor.fetchall()
-    columns = [desc[0] for desc in cursor.description]
-    conn.close()
+    if response_format not in RESPONSE_FORMATS:
+        return {"error": f"response_format must be one of {', '.join(RESPONSE_FORMATS)}."}
+    if top_k < 0 or page < 1:
+        return {"error": "top_k must be 0 or more and page must be 1 or more."}
+    try:
+        prefs = room_filters.preferences(max_price, min_floor, max_floor, lift, features)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    # With per-building shards every shard is searched in parallel and the
+    # results merged, cheapest first
+    try:
+        rooms = shards.merge_rooms(
+            shards.fan_out(_find_rooms, num_people, start, end, guest_id, prefs)
+        )
+    except sqlite3.Error as db_err:
+        return {"error": f"Database error: {db_err}"}
+    echoed = {"preferences": room_filters.describe(prefs)} if prefs else {}
+    if response_format == "compact":
+        room_types, page_info = _paginate(_compact_rows(rooms, days), top_k or COMPACT_TOP_K, page)
+        return {
+            "given_input_specifications": {
+                "num_people": num_people,
+                "check_in": check_in_datetime,
+                "check_out": check_out_datetime,
+                "result_count": len(rooms),
+                "days_charged": days,
+                **echoed,
+            },
+            "columns": COMPACT_COLUMNS,
+            "room_types": room_types if rooms else "No rooms available for this specification",
+            **page_info,
+        }
+
+    result_count = len(rooms)
+    page_info = {}
+    if top_k:
+        rooms, page_info = _paginate(rooms, top_k, page)
+    # Price every returned room in the same pass
+    results = [_format_room(row, days) for row in rooms]
+    columns = AVAILABILITY_COLUMNS
 
     # Prepare JSON response structure
     json_data: Dict[str, Any] = {
@@ -112,26 +313,218 @@ Example outputs:
             "num_people": num_people,
             "check_in": check_in_datetime,
             "check_out": check_out_datetime,
-            "result_count": len(results)
+            "result_count": result_count,
+            **echoed,
         },
         "available_rooms": []
     }
 
-    # If no rooms found, set message; otherwise populate list and print table
-    if not results:
+    # If no rooms found, set message; otherwise populate list
+    if not result_count:
         json_data["available_rooms"] = "No rooms available for this specification"
     else:
-        # Build and display PrettyTable
-        table = PrettyTable()
-        table.field_names = columns
-        table.align = "l"
-        for row in results:
-            table.add_row(row)
         # Convert rows to list of dicts
         json_data["available_rooms"] = [
             dict(zip(columns, row))
             for row in results
         ]
+    json_data.update(page_info)
 
     return json_data
-print(availability_fetcher(2, "2025-05-10 14:00:00", "2025-05-12 11:00:00"))
\ No newline at end of file
+
+
+def availability_search(num_people: int,
+                        windows: Optional[List[Dict[str, str]]] = None,
+                        earliest_check_in_date: Optional[str] = None,
+                        latest_check_out_date: Optional[str] = None,
+                        stay_nights: int = 0,
+                        check_in_time: str = "14:00",
+                        check_out_time: str = "11:00",
+                        max_rooms_per_window: int = 5,
+                        response_format: str = "full",
+                        guest_id: Optional[int] = None,
+                        max_price: Optional[float] = None,
+                        min_floor: Optional[int] = None,
+                        max_floor: Optional[int] = None,
+                        lift: bool = False,
+                        features: Optional[List[str]] = None
+                        ) -> Dict[str, Any]:
+    """
+    Check availability for several candidate stay windows in a single call,
+    for questions like "what about one day later, or the weekend after?".
+
+    Give either an explicit list of windows, or a flexible date range with a
+    stay length, in which case every possible check-in date in the range is
+    tried. All windows are evaluated in one pass over the occupancy index.
+
+    **Args**
+    num_people : int
+        The minimum number of guests the room must accommodate.
+    windows : list of dict, optional
+        Explicit windows, each {"check_in": "YYYY-MM-DD HH:MM:SS",
+        "check_out": "YYYY-MM-DD HH:MM:SS"}.
+    earliest_check_in_date : str, optional
+        Flexible mode: first acceptable check-in date ("YYYY-MM-DD").
+    latest_check_out_date : str, optional
+        Flexible mode: last acceptable check-out date ("YYYY-MM-DD").
+    stay_nights : int
+        Flexible mode: number of nights of the stay.
+    check_in_time / check_out_time : str
+        Flexible mode: times of day used for generated windows ("HH:MM").
+    max_rooms_per_window : int
+        How many of the cheapest free rooms (room types in "compact"
+        format) to list per window; the count of all free rooms is always
+        reported.
+    response_format : str
+        "full" (default) or "compact", as for availability_fetcher.
+    guest_id : int, optional
+        The guest searching, as for availability_fetcher.
+    max_price / min_floor / max_floor / lift / features : optional
+        The guest's budget and preferences, as for availability_fetcher.
+
+    **Returns**
+    dict
+        - "given_input_specifications": the inputs and "window_count"
+          (and "preferences", as for availability_fetcher).
+        - "windows": one entry per window, in input/date order:
+            - "check_in": str
+            - "check_out": str
+            - "result_count": int (all free rooms for this window)
+            - "available_rooms": list of room dicts in the same format as
+              availability_fetcher, cheapest first, capped at
+              max_rooms_per_window; or the string
+              "No rooms available for this specification".
+        In "compact" format a top-level "columns" list is added and each
+        window has "days_charged" and "room_types" (rows in the
+        availability_fetcher compact format) instead of "available_rooms".
+        Or {"error": str} if the windows are invalid.
+    """
+    items = iter_availability_search(
+        num_people, windows, earliest_check_in_date, latest_check_out_date, stay_nights,
+        check_in_time, check_out_time, max_rooms_per_window, response_format, guest_id,
+        max_price=max_price, min_floor=min_floor, max_floor=max_floor, lift=lift,
+        features=features,
+    )
+    result = next(items)
+    if "error" in result:
+        return result
+    result["windows"] = []
+    for window in items:
+        if "error" in window:
+            return window
+        result["windows"].append(window)
+    return result
+
+
+def iter_availability_search(num_people: int,
+                             windows: Optional[List[Dict[str, str]]] = None,
+                             earliest_check_in_date: Optional[str] = None,
+                             latest_check_out_date: Optional[str] = None,
+                             stay_nights: int = 0,
+                             check_in_time: str = "14:00",
+                             check_out_time: str = "11:00",
+                             max_rooms_per_window: int = 5,
+                             response_format: str = "full",
+                             guest_id: Optional[int] = None,
+                             chunk_size: int = 0,
+                             max_price: Optional[float] = None,
+                             min_floor: Optional[int] = None,
+                             max_floor: Optional[int] = None,
+                             lift: bool = False,
+                             features: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Generator form of ``availability_search``, for streaming its result.
+
+    Yields the result without "windows" first (or a single {"error": str}),
+    then one window entry at a time in the same order and format as
+    ``availability_search``. With ``chunk_size`` set, windows are evaluated
+    that many at a time, so the first entries are ready before the whole
+    range is searched; 0 evaluates them all in one pass. An error while
+    evaluating a chunk is yielded as {"error": str} and ends the stream.
+    """
+    if response_format not in RESPONSE_FORMATS:
+        yield {"error": f"response_format must be one of {', '.join(RESPONSE_FORMATS)}."}
+        return
+    try:
+        prefs = room_filters.preferences(max_price, min_floor, max_floor, lift, features)
+    except ValueError as e:
+        yield {"error": str(e)}
+        return
+    if windows:
+        pairs = [(w.get("check_in", ""), w.get("check_out", "")) for w in windows]
+    elif earliest_check_in_date and latest_check_out_date and stay_nights > 0:
+        try:
+            first = date.fromisoformat(earliest_check_in_date)
+            last = date.fromisoformat(latest_check_out_date)
+        except ValueError:
+            yield {"error": "Invalid date format. Please use YYYY-MM-DD."}
+            return
+        pairs = []
+        arrival = first
+        while arrival + timedelta(days=stay_nights) <= last and len(pairs) <= MAX_SEARCH_WINDOWS:
+            departure = arrival + timedelta(days=stay_nights)
+            pairs.append((f"{arrival} {check_in_time}", f"{departure} {check_out_time}"))
+            arrival += timedelta(days=1)
+    else:
+        yield {"error": "Provide either windows, or earliest_check_in_date, latest_check_out_date and stay_nights."}
+        return
+
+    if not pairs:
+        yield {"error": "The date range is shorter than the requested stay."}
+        return
+    if len(pairs) > MAX_SEARCH_WINDOWS:
+        yield {"error": f"Too many windows; at most {MAX_SEARCH_WINDOWS} can be checked at once."}
+        return
+
+    header: Dict[str, Any] = {
+        "given_input_specifications": {
+            "num_people": num_people,
+            "window_count": len(pairs),
+        },
+    }
+    if prefs:
+        header["given_input_specifications"]["preferences"] = room_filters.describe(prefs)
+    if response_format == "compact":
+        header["columns"] = COMPACT_COLUMNS
+    yield header
+
+    limit = max(0, max_rooms_per_window)
+    step = chunk_size if chunk_size > 0 else len(pairs)
+    for offset in range(0, len(pairs), step):
+        chunk = pairs[offset:offset + step]
+        try:
+            rule = pricing.get_rate_rule()
+            days = [pricing.days_charged(start, end, rule) for start, end in chunk]
+            per_shard = shards.fan_out(_find_rooms_multi, num_people, chunk, guest_id, prefs)
+            per_window = [shards.merge_rooms(rooms) for rooms in zip(*per_shard)]
+        except pricing.QuoteError as e:
+            yield {"error": str(e)}
+            return
+        except ValueError:
+            yield {"error": "Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS)."}
+            return
+        except sqlite3.Error as db_err:
+            yield {"error": f"Database error: {db_err}"}
+            return
+
+        for (start, end), window_days, rooms in zip(chunk, days, per_window):
+            if response_format == "compact":
+                yield {
+                    "check_in": start,
+                    "check_out": end,
+                    "result_count": len(rooms),
+                    "days_charged": window_days,
+                    "room_types": (_compact_rows(rooms, window_days)[:limit] if rooms
+                                   else "No rooms available for this specification"),
+                }
+                continue
+            listed = [
+                dict(zip(AVAILABILITY_COLUMNS, _format_room(row, window_days)))
+                for row in rooms[:limit]
+            ]
+            yield {
+                "check_in": start,
+                "check_out": end,
+                "result_count": len(rooms),
+                "available_rooms": listed if rooms else "No rooms available for this specification",
+            }
+
@@ -1,19 +1,41 @@
 import sqlite3
 import hashlib
+from concurrent.futures import Future
 from datetime import datetime
-import os
+from typing import Optional, Tuple
+from . import db, holds, occupancy, occupancy_calendar, pricing, shards, write_queue
+
+
+def _refresh_occupancy(conn: sqlite3.Connection) -> None:
+    """Pushes a committed write into the occupancy index and its caches now.
+
+    Best effort: if this fails the next regular sync picks the change up.
+    """
+    try:
+        occupancy.get_engine().sync(conn, force=True)
+    except sqlite3.Error:
+        pass
+
+
 def booking(guest_id: int, room_id: int, num_persons: int,
-                 check_in_datetime: str, check_out_datetime: str, days_charged: int,
-                 extra_beds: int, extra_bed_price: float, subtotal_amount: float,
-                 taxes_and_fees: float, total_price: float, advance_due_amount: float):
+                 check_in_datetime: str, check_out_datetime: str, extra_beds: int = 0):
     """Creates a booking record in the database and generates a reference code.
 
-    This function connects to the 'hotel.db' SQLite database, inserts a new
-    booking record with the provided details, and sets the initial status
-    to 'REQUESTED'. It retrieves the building ID associated with the room
-    and calculates a human-readable booking reference code based on building,
-    check-in date, room ID, and a hash of booking details. The database
-    transaction is committed upon success or rolled back on error.
+    This function inserts a new booking record into the 'hotel.db' SQLite
+    database with the provided details and sets the initial status to
+    'REQUESTED'. The insert is handed to the write queue (see
+    ``write_queue``), which commits it in a ``BEGIN IMMEDIATE``
+    transaction, possibly together with other writes, after first
+    re-checking the room against every active (not cancelled) booking, so
+    two sessions can never book overlapping stays of the same room. It retrieves the building ID
+    associated with the room and calculates a human-readable booking
+    reference code based on building, check-in date, room ID, and a hash of
+    booking details. The database transaction is committed upon success or
+    rolled back on error.
+
+    All amounts (days charged, subtotal, taxes, total, advance) are computed
+    by ``pricing`` from the room type's rates and the 'rate_rule' table,
+    inside the same transaction, so they always match ``get_quote``.
 
     Args:
         guest_id (int): The unique identifier for the guest making the booking.
@@ -23,13 +45,8 @@ def booking(guest_id: int, room_id: int, num_persons: int,
             (e.g., 'YYYY-MM-DD HH:MM').
         check_out_datetime (str): The check-out date and time in ISO format
             (e.g., 'YYYY-MM-DD HH:MM').
-        days_charged (int): The number of days the guest will be charged for.
-        extra_beds (int): The number of extra beds requested.
-        extra_bed_price (float): The price per extra bed.
-        subtotal_amount (float): The base price for the room stay before taxes.
-        taxes_and_fees (float): The amount added for taxes and other fees.
-        total_price (float): The final price including subtotal, extras, and taxes.
-        advance_due_amount (float): The amount required as an advance payment.
+        extra_beds (int): The number of extra beds requested (0 to 2, only
+            for rooms that offer them). Defaults to 0.
 
     Returns:
         dict: A dictionary containing the booking result.
@@ -38,11 +55,12 @@ def booking(guest_id: int, room_id: int, num_persons: int,
                   'system_booking_id': int,  # Auto-generated DB primary key
                   'reference_code': str,     # Human-readable code (e.g., BKG-1010305-ABCDEF-12)
                   'message': str,            # Confirmation message with reference code
-                  'details': {               # Dictionary mirroring input financial/stay details
+                  'details': {               # Stay details and the computed price breakdown
                       'num_persons': int,
                       'check_in_datetime': str,
                       'check_out_datetime': str,
                       'days_charged': int,
+                      'price_per_night': float,
                       'extra_beds': int,
                       'extra_bed_price': float,
                       'subtotal_amount': float,
@@ -55,34 +73,124 @@ def booking(guest_id: int, room_id: int, num_persons: int,
               {
                   'error': str  # Description of the error encountered
               }
+              If the room was taken in the meantime, 'error' is accompanied by:
+              {
+                  'conflict': {
+                      'room_id': int,
+                      'requested_check_in': str,
+                      'requested_check_out': str,
+                      'booked_check_in': str,   # Window of the existing booking
+                      'booked_check_out': str
+                  }
+              }
+              If another guest holds the room (see holds.hold_room), the
+              conflict has 'held_until' instead of the booked window. The
+              guest's own hold on the stay is released by the booking.
 
     Side Effects:
-        - Connects to and potentially modifies the 'hotel.db' SQLite database.
-        - Inserts a new row into the 'booking' table.
-        - Reads from the 'room' and 'booking_status' tables.
+        - Reads and potentially modifies the 'hotel.db' SQLite database through
+          the write queue and the shared connection pool.
+        - Inserts a new row into the 'booking' table and deletes the
+          guest's hold on the stay from 'room_hold'.
+        - Reads from the 'room', 'room_type', 'rate_rule' and
+          'booking_status' tables.
+    """
+    return submit_booking(
+        guest_id, room_id, num_persons, check_in_datetime, check_out_datetime, extra_beds
+    ).result()
+
+
+def submit_booking(guest_id: int, room_id: int, num_persons: int,
+                   check_in_datetime: str, check_out_datetime: str,
+                   extra_beds: int = 0) -> "Future[dict]":
+    """Validates a booking request and queues its insert without waiting.
+
+    Returns:
+        Future: resolves to the ``booking`` result once the insert is
+        committed, or right away for invalid input.
+    """
+    # Ensure datetime strings are valid ISO format before queueing the insert
+    try:
+        datetime.fromisoformat(check_in_datetime)
+        check_in_datetime = occupancy.normalise_datetime(check_in_datetime)
+        check_out_datetime = occupancy.normalise_datetime(check_out_datetime)
+    except ValueError:
+        error = {'error': "Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS)."}
+    else:
+        if check_out_datetime > check_in_datetime:
+            # Queued on the writer of the shard that owns the room
+            with db.use(shards.room_location(room_id)):
+                return write_queue.submit(
+                    insert_booking, guest_id, room_id, num_persons,
+                    check_in_datetime, check_out_datetime, extra_beds
+                )
+        error = {'error': "Check-out must be after check-in."}
+    future: "Future[dict]" = Future()
+    future.set_result(error)
+    return future
+
+
+def insert_booking(conn: sqlite3.Connection, guest_id: int, room_id: int, num_persons: int,
+                   check_in_datetime: str, check_out_datetime: str,
+                   extra_beds: int = 0) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``booking``; runs inside the write queue's transaction.
+
+    Both datetimes must already be normalised. The caller's transaction
+    holds the write lock, so the overlap check and the insert are atomic
+    with respect to every other writer.
+
+    Returns:
+        tuple: (the ``booking`` result, a callback that refreshes the
+        occupancy index and the hold registry after the commit).
     """
-    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(SCRIPT_DIR, 'hotel.db')
-    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     try:
-        # Insert main booking data
-        cursor.execute('SELECT building_id FROM room WHERE room_id = ?', (room_id,))
-        room_data = cursor.fetchone()
-        if not room_data:
-            conn.close() # Close connection before returning error
-            return {'error': f"Invalid room_id: {room_id} not found."}
-        building_id = room_data[0]
-
-        # Ensure datetime strings are valid ISO format before inserting
+        # Price the stay from the room type's rates inside the transaction
         try:
-            check_in_dt_obj = datetime.fromisoformat(check_in_datetime)
-            # check_out_dt_obj = datetime.fromisoformat(check_out_datetime) # Optional: validate checkout too
-        except ValueError:
-            conn.close()
-            return {'error': "Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS)."}
+            quote = pricing.quote_rooms(
+                [room_id], check_in_datetime, check_out_datetime, extra_beds, conn
+            ).get(room_id)
+        except pricing.QuoteError as e:
+            return {'error': str(e)}, None
+        if not quote:
+            return {'error': f"Invalid room_id: {room_id} not found."}, None
+        if 'error' in quote:
+            return quote, None
+        if num_persons > quote['capacity'] + extra_beds:
+            return {'error': f"The room accommodates at most {quote['capacity']} guests plus extra beds."}, None
+        building_id = quote['building_id']
+        days_charged = quote['days_charged']
 
+        conflict = occupancy.find_overlapping_booking(
+            conn, room_id, check_in_datetime, check_out_datetime
+        )
+        if conflict:
+            return {
+                'error': "The selected room is no longer available for these dates. Please check availability again and choose another room.",
+                'conflict': {
+                    'room_id': room_id,
+                    'requested_check_in': check_in_datetime,
+                    'requested_check_out': check_out_datetime,
+                    'booked_check_in': conflict[1],
+                    'booked_check_out': conflict[2],
+                }
+            }, None
+        held = holds.find_conflicting_hold(
+            conn, room_id, check_in_datetime, check_out_datetime, guest_id
+        )
+        if held:
+            return {
+                'error': "The selected room is being held for another guest. Please choose another room or try again in a few minutes.",
+                'conflict': {
+                    'room_id': room_id,
+                    'requested_check_in': check_in_datetime,
+                    'requested_check_out': check_out_datetime,
+                    'held_until': datetime.fromtimestamp(held[1]).strftime("%Y-%m-%d %H:%M:%S"),
+                }
+            }, None
+
+        # Insert main booking data
         cursor.execute('''
             INSERT INTO booking (
                 guest_id, building_id, room_id, num_persons,
@@ -97,24 +205,36 @@ def booking(guest_id: int, room_id: int, num_persons: int,
                 ?, ?, ?, ?,
                 (SELECT booking_status_id FROM booking_status WHERE code = 'REQUESTED')
             )
+            RETURNING booking_id
         ''', (
             guest_id, building_id, room_id, num_persons,
             check_in_datetime, check_out_datetime,
-            days_charged, extra_beds, extra_bed_price,
-            subtotal_amount, taxes_and_fees, total_price, advance_due_amount
+            days_charged, extra_beds, quote['extra_bed_price'],
+            quote['subtotal_amount'], quote['taxes_and_fees'],
+            quote['total_price'], quote['advance_due_amount']
         ))
 
         # Get auto-incremented ID
-        db_booking_id = cursor.lastrowid
+        db_booking_id = cursor.fetchone()[0]
 
         # Generate human-friendly code (not stored in DB)
         code_seed = f"{building_id}{room_id}{check_in_datetime}{days_charged}"
         short_hash = hashlib.md5(code_seed.encode()).hexdigest()[:6].upper()
-        # Use the validated datetime object for formatting
-        check_in_date_str = check_in_dt_obj.strftime("%d%m")
+        check_in_date_str = datetime.fromisoformat(check_in_datetime).strftime("%d%m")
         booking_code = f"BKG-{building_id}{check_in_date_str}-{short_hash}-{room_id}"
 
-        conn.commit()
+        # The guest's own hold on this stay is used up by the booking
+        released_holds = holds.release_guest_holds(
+            conn, room_id, check_in_datetime, check_out_datetime, guest_id
+        )
+        # Keep the per-day calendar in step within the same transaction
+        occupancy_calendar.refresh(conn)
+
+        def after_commit(conn: sqlite3.Connection) -> None:
+            _refresh_occupancy(conn)
+            for hold_id in released_holds:
+                holds.get_registry().remove(hold_id)
+
         return {
             'system_booking_id': db_booking_id,
             'reference_code': booking_code,
@@ -124,25 +244,173 @@ def booking(guest_id: int, room_id: int, num_persons: int,
                 'check_in_datetime': check_in_datetime,
                 'check_out_datetime': check_out_datetime,
                 'days_charged': days_charged,
+                'price_per_night': quote['price_per_night'],
                 'extra_beds': extra_beds,
-                'extra_bed_price': extra_bed_price,
-                'subtotal_amount': subtotal_amount,
-                'taxes_and_fees': taxes_and_fees,
-                'total_price': total_price,
-                'advance_due_amount': advance_due_amount
+                'extra_bed_price': quote['extra_bed_price'],
+                'subtotal_amount': quote['subtotal_amount'],
+                'taxes_and_fees': quote['taxes_and_fees'],
+                'total_price': quote['total_price'],
+                'advance_due_amount': quote['advance_due_amount']
             }
-        }
+        }, after_commit
 
+    # The write queue rolls back to before this op on an error result
+    except sqlite3.IntegrityError as db_err:
+        # PostgreSQL's booking_no_overlap constraint rejects an overlap the
+        # check above could not see
+        if 'booking_no_overlap' not in str(db_err):
+            return {'error': f"Database error: {db_err}"}, None
+        return {
+            'error': "The selected room is no longer available for these dates. Please check availability again and choose another room.",
+            'conflict': {
+                'room_id': room_id,
+                'requested_check_in': check_in_datetime,
+                'requested_check_out': check_out_datetime,
+            }
+        }, None
     except sqlite3.Error as db_err: # Catch specific DB errors
-        conn.rollback()
-        return {'error': f"Database error: {db_err}"}
+        return {'error': f"Database error: {db_err}"}, None
     except Exception as e:
-        conn.rollback()
         # Log the full error for debugging if needed
         # print(f"Unexpected error during booking: {e}")
-        return {'error': f"An unexpected error occurred: {e}"}
+        return {'error': f"An unexpected error occurred: {e}"}, None
 
-    finally:
-        # Ensure connection is always closed
-        if conn:
-            conn.close()
\ No newline at end of file
+
+def update_booking_status(booking_id: int, status_code: str,
+                          cancellation_reason: str = None) -> dict:
+    """Moves a booking to another status, e.g. 'CONFIRMED' or 'CANCELLED'.
+
+    Updates 'status_id', 'status_updated_at' and 'updated_at'; cancelling
+    also records 'cancelled_at' and the optional reason. A cancelled
+    booking stops blocking its room, and cached availability for the
+    affected room and dates is invalidated immediately. Moving a cancelled
+    booking back to an active status re-checks its room inside the same
+    transaction and fails if the stay has since been booked or held by
+    someone else.
+
+    Args:
+        booking_id (int): The system booking id returned by ``booking``.
+        status_code (str): A code from the 'booking_status' table
+            ('REQUESTED', 'ADVANCE_PAID', 'CONFIRMED', 'CANCELLED').
+        cancellation_reason (str, optional): Stored when cancelling.
+
+    Returns:
+        dict: On success:
+              {
+                  'system_booking_id': int,
+                  'status': str,          # The new status code
+                  'previous_status': str
+              }
+              On failure:
+              {
+                  'error': str
+              }
+              If a reactivated booking's room is no longer free, 'error' is
+              accompanied by a 'conflict' dict as in ``booking``.
+    """
+    # Queued on the writer of the shard holding the booking
+    with db.use(shards.booking_location(booking_id)):
+        return write_queue.run(set_booking_status, booking_id, status_code, cancellation_reason)
+
+
+def set_booking_status(conn: sqlite3.Connection, booking_id: int, status_code: str,
+                       cancellation_reason: Optional[str]) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``update_booking_status``; runs inside the write queue's transaction.
+
+    Returns:
+        tuple: (the ``update_booking_status`` result, a callback that
+        refreshes the occupancy index after the commit).
+    """
+    current = None
+    try:
+        status_row = conn.execute(
+            'SELECT booking_status_id FROM booking_status WHERE code = ?', (status_code,)
+        ).fetchone()
+        if not status_row:
+            return {'error': f"Unknown booking status: {status_code}"}, None
+        current = conn.execute(
+            '''SELECT s.code, b.room_id, b.check_in_datetime, b.check_out_datetime, b.guest_id
+               FROM booking b
+               JOIN booking_status s ON s.booking_status_id = b.status_id
+               WHERE b.booking_id = ?''', (booking_id,)
+        ).fetchone()
+        if not current:
+            if conn.execute(
+                'SELECT 1 FROM booking_archive WHERE booking_id = ?', (booking_id,)
+            ).fetchone():
+                return {'error': f"Booking {booking_id} is archived and can no longer be changed."}, None
+            return {'error': f"Invalid booking_id: {booking_id} not found."}, None
+
+        if (current[0] in occupancy.INACTIVE_STATUS_CODES
+                and status_code not in occupancy.INACTIVE_STATUS_CODES):
+            # Reactivating a cancelled booking takes its room back, which
+            # another booking or a hold may have claimed in the meantime
+            conflict = _reactivation_conflict(conn, *current[1:])
+            if conflict:
+                return conflict, None
+
+        cancelling = status_code == 'CANCELLED'
+        conn.execute('''
+            UPDATE booking SET
+                status_id = ?,
+                status_updated_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP,
+                cancelled_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE cancelled_at END,
+                cancellation_reason = CASE WHEN ? THEN ? ELSE cancellation_reason END
+            WHERE booking_id = ?
+        ''', (status_row[0], cancelling, cancelling, cancellation_reason, booking_id))
+        occupancy_calendar.refresh(conn)
+        return {
+            'system_booking_id': booking_id,
+            'status': status_code,
+            'previous_status': current[0]
+        }, _refresh_occupancy
+
+    # The write queue rolls back to before this op on an error result
+    except sqlite3.IntegrityError as db_err:
+        # PostgreSQL's booking_no_overlap constraint
+        if current is None or 'booking_no_overlap' not in str(db_err):
+            return {'error': f"Database error: {db_err}"}, None
+        return {
+            'error': "The room of this booking has been booked by someone else for these dates.",
+            'conflict': {'room_id': current[1], 'requested_check_in': current[2],
+                         'requested_check_out': current[3]},
+        }, None
+
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}, None
+
+
+def _reactivation_conflict(conn: sqlite3.Connection, room_id: int, check_in_datetime: str,
+                           check_out_datetime: str, guest_id: int) -> Optional[dict]:
+    """The conflict error if the stay of a cancelled booking is no longer free.
+
+    Runs inside the caller's write transaction, like the checks in
+    ``insert_booking``.
+    """
+    check_in_datetime = occupancy.normalise_datetime(check_in_datetime)
+    check_out_datetime = occupancy.normalise_datetime(check_out_datetime)
+    request = {
+        'room_id': room_id,
+        'requested_check_in': check_in_datetime,
+        'requested_check_out': check_out_datetime,
+    }
+    overlapping = occupancy.find_overlapping_booking(
+        conn, room_id, check_in_datetime, check_out_datetime
+    )
+    if overlapping:
+        return {
+            'error': "The room of this booking has been booked by someone else for these dates.",
+            'conflict': {**request, 'booked_check_in': overlapping[1],
+                         'booked_check_out': overlapping[2]},
+        }
+    held = holds.find_conflicting_hold(
+        conn, room_id, check_in_datetime, check_out_datetime, guest_id
+    )
+    if held:
+        return {
+            'error': "The room of this booking is being held for another guest.",
+            'conflict': {**request, 'held_until': datetime.fromtimestamp(held[1]).strftime(
+                "%Y-%m-%d %H:%M:%S")},
+        }
+    return None
@@ -0,0 +1,420 @@
+import atexit
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from . import metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("HOTEL_DB_PATH", os.path.join(SCRIPT_DIR, 'hotel.db'))
+
+# Storage backend for the default database: "sqlite" (DB_PATH) or
+# "postgres" (DATABASE_URL; see pg_backend). A postgresql:// URL passed as
+# a db_path selects PostgreSQL regardless.
+BACKEND = os.getenv("HOTEL_DB_BACKEND", "sqlite")
+DATABASE_URL = os.getenv("HOTEL_DATABASE_URL", "postgresql:///hotel")
+_URL_PREFIXES = ("postgresql://", "postgres://")
+
+# Pool tuning, overridable from the environment for deployments
+POOL_SIZE = int(os.getenv("HOTEL_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.getenv("HOTEL_DB_BUSY_TIMEOUT_MS", "5000"))
+CHECKOUT_TIMEOUT_S = float(os.getenv("HOTEL_DB_CHECKOUT_TIMEOUT_S", "10"))
+STATEMENT_CACHE_SIZE = 256
+
+# Idempotent schema additions applied once per pool on first connect.
+# The base tables ship in hotel.db; these only add indexes and helper
+# tables/triggers on top of them.
+SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_booking_room_window
+    ON booking (room_id, check_in_datetime, check_out_datetime, status_id);
+CREATE INDEX IF NOT EXISTS idx_room_type_capacity_price
+    ON room_type (capacity, price);
+CREATE INDEX IF NOT EXISTS idx_room_type_price_capacity
+    ON room_type (price, capacity);
+CREATE INDEX IF NOT EXISTS idx_room_room_type_floor ON room (room_type_id, floor);
+-- Bookings with part of the advance still to collect (reports.py)
+CREATE INDEX IF NOT EXISTS idx_booking_advance_outstanding
+    ON booking (check_out_datetime, building_id, status_id, check_in_datetime,
+                advance_due_amount, advance_paid_amount)
+    WHERE advance_due_amount > COALESCE(advance_paid_amount, 0);
+-- Full-text index over room type names and features for preference
+-- searches (see room_filters.py); rowid is room_type_id. "joined" repeats
+-- both without hyphens, so "wifi" finds "Wi-Fi".
+CREATE VIRTUAL TABLE IF NOT EXISTS room_type_fts USING fts5(name, features, joined);
+INSERT INTO room_type_fts (rowid, name, features, joined)
+    SELECT room_type_id, name, COALESCE(features, ''),
+           REPLACE(name || ' ' || COALESCE(features, ''), '-', '')
+    FROM room_type
+    WHERE room_type_id NOT IN (SELECT rowid FROM room_type_fts);
+CREATE TRIGGER IF NOT EXISTS trg_room_type_fts_insert AFTER INSERT ON room_type
+BEGIN
+    INSERT INTO room_type_fts (rowid, name, features, joined)
+    VALUES (NEW.room_type_id, NEW.name, COALESCE(NEW.features, ''),
+            REPLACE(NEW.name || ' ' || COALESCE(NEW.features, ''), '-', ''));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_room_type_fts_update AFTER UPDATE ON room_type
+BEGIN
+    DELETE FROM room_type_fts WHERE rowid = OLD.room_type_id;
+    INSERT INTO room_type_fts (rowid, name, features, joined)
+    VALUES (NEW.room_type_id, NEW.name, COALESCE(NEW.features, ''),
+            REPLACE(NEW.name || ' ' || COALESCE(NEW.features, ''), '-', ''));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_room_type_fts_delete AFTER DELETE ON room_type
+BEGIN
+    DELETE FROM room_type_fts WHERE rowid = OLD.room_type_id;
+END;
+
+-- Append-only log of writes that affect occupancy. NULL booking_id marks a
+-- change to the room catalog (room, room_type, building, rate_rule).
+CREATE TABLE IF NOT EXISTS occupancy_change_log (
+    change_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id  INTEGER
+);
+-- Short-lived room holds; expires_at is a unix timestamp. See holds.py
+CREATE TABLE IF NOT EXISTS room_hold (
+    hold_id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_id             INTEGER NOT NULL,
+    guest_id            INTEGER NOT NULL,
+    check_in_datetime   TEXT NOT NULL,
+    check_out_datetime  TEXT NOT NULL,
+    expires_at          REAL NOT NULL,
+    created_at          DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_room_hold_room ON room_hold (room_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_room_hold_expiry ON room_hold (expires_at);
+
+-- How far each derived table has consumed occupancy_change_log
+CREATE TABLE IF NOT EXISTS occupancy_watermark (
+    name       TEXT PRIMARY KEY,
+    change_id  INTEGER NOT NULL
+);
+-- One row per room per night occupied by an active booking; maintained by
+-- occupancy_calendar.refresh
+CREATE TABLE IF NOT EXISTS room_day_occupancy (
+    room_id     INTEGER NOT NULL,
+    day         TEXT NOT NULL,
+    booking_id  INTEGER NOT NULL,
+    PRIMARY KEY (room_id, day, booking_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_room_day_occupancy_booking
+    ON room_day_occupancy (booking_id);
+-- Past and cancelled bookings moved out of the hot booking table by
+-- archive.py. Same columns in the same order as booking, plus archived_at.
+CREATE TABLE IF NOT EXISTS booking_archive (
+    booking_id            INTEGER PRIMARY KEY,
+    guest_id              INTEGER NOT NULL,
+    building_id           INTEGER NOT NULL,
+    room_id               INTEGER NOT NULL,
+    num_persons           INTEGER NOT NULL,
+    check_in_datetime     TEXT    NOT NULL,
+    check_out_datetime    TEXT    NOT NULL,
+    days_charged          INTEGER NOT NULL,
+    extra_beds            INTEGER NOT NULL DEFAULT 0,
+    extra_bed_price       REAL    NOT NULL,
+    subtotal_amount       REAL    NOT NULL,
+    taxes_and_fees        REAL    NOT NULL DEFAULT 0,
+    total_price           REAL    NOT NULL,
+    advance_due_amount    REAL    NOT NULL,
+    advance_paid_amount   REAL    DEFAULT 0,
+    advance_paid_datetime TEXT,
+    status_id             INTEGER NOT NULL,
+    status_updated_at     TEXT    NOT NULL,
+    created_at            TEXT    NOT NULL,
+    updated_at            TEXT    NOT NULL,
+    cancellation_reason   TEXT,
+    cancelled_at          TEXT,
+    archived_at           TEXT    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_booking_archive_check_in
+    ON booking_archive (check_in_datetime);
+CREATE INDEX IF NOT EXISTS idx_booking_archive_guest ON booking_archive (guest_id);
+-- Every booking, hot or archived, for reporting; archived_at is NULL for
+-- bookings still in the booking table
+CREATE VIEW IF NOT EXISTS booking_history AS
+    SELECT *, NULL AS archived_at FROM booking
+    UNION ALL
+    SELECT * FROM booking_archive;
+CREATE TRIGGER IF NOT EXISTS trg_booking_log_insert AFTER INSERT ON booking
+BEGIN
+    INSERT INTO occupancy_change_log (booking_id) VALUES (NEW.booking_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_booking_log_update
+AFTER UPDATE OF room_id, check_in_datetime, check_out_datetime, status_id ON booking
+BEGIN
+    INSERT INTO occupancy_change_log (booking_id) VALUES (NEW.booking_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_booking_log_delete AFTER DELETE ON booking
+BEGIN
+    INSERT INTO occupancy_change_log (booking_id) VALUES (OLD.booking_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_room_log_insert AFTER INSERT ON room
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_room_log_update AFTER UPDATE ON room
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_room_log_delete AFTER DELETE ON room
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_room_type_log_insert AFTER INSERT ON room_type
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_room_type_log_update AFTER UPDATE ON room_type
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_room_type_log_delete AFTER DELETE ON room_type
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_building_log_update AFTER UPDATE ON building
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_rate_rule_log_insert AFTER INSERT ON rate_rule
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_rate_rule_log_update AFTER UPDATE ON rate_rule
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+CREATE TRIGGER IF NOT EXISTS trg_rate_rule_log_delete AFTER DELETE ON rate_rule
+BEGIN INSERT INTO occupancy_change_log (booking_id) VALUES (NULL); END;
+"""
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections to a single database file.
+
+    Connections are opened lazily up to ``size`` and handed out to one
+    thread at a time, so a checked-out connection can be used freely from
+    a worker thread (``check_same_thread`` is disabled for that reason).
+    Every connection runs in WAL mode with a busy timeout, which lets
+    readers proceed while a writer holds the lock, and keeps a per
+    connection cache of prepared statements. The first connection also
+    applies ``SCHEMA``. Connections are ``metrics.InstrumentedConnection``
+    unless metrics are disabled.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        size (int): Maximum number of open connections.
+        busy_timeout_ms (int): How long a statement waits on a locked
+            database before failing with ``database is locked``.
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE,
+                 busy_timeout_ms: int = BUSY_TIMEOUT_MS):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=metrics.connection_factory(),
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL is durable across application crashes and avoids an
+        # fsync on every commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def acquire(self, timeout: Optional[float] = CHECKOUT_TIMEOUT_S) -> sqlite3.Connection:
+        """Checks a connection out of the pool, opening one if under the limit.
+
+        Raises:
+            sqlite3.OperationalError: If the pool is closed or no connection
+                becomes free within ``timeout`` seconds.
+        """
+        if self._closed:
+            raise sqlite3.OperationalError("connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+            with self._lock:
+                self._all.append(conn)
+            return conn
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"connection pool exhausted ({self.size} connections busy)"
+            ) from None
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Returns a connection to the pool, rolling back any open transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Closes every connection opened by the pool."""
+        self._closed = True
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def is_url(db_path: str) -> bool:
+    """Whether ``db_path`` is a PostgreSQL connection URL rather than a file."""
+    return db_path.startswith(_URL_PREFIXES)
+
+
+# Database selected by ``use`` for the current thread or task
+_current: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "hotel_db", default=None
+)
+
+
+def resolve(db_path: Optional[str] = None) -> str:
+    """Canonical name of a database, used to key per-database registries.
+
+    None means the database selected with ``use``, else the configured
+    default (``DB_PATH``, or ``DATABASE_URL`` when ``BACKEND`` is
+    "postgres"). URLs are kept as given; file paths are made absolute.
+    """
+    if db_path is None:
+        db_path = _current.get() or (DATABASE_URL if BACKEND == "postgres" else DB_PATH)
+    return db_path if is_url(db_path) else os.path.abspath(db_path)
+
+
+@contextmanager
+def use(db_path: Optional[str]) -> Iterator[None]:
+    """Makes ``db_path`` the default database inside the block.
+
+    Everything that takes an optional db_path (pools, the occupancy
+    index, caches, the write queue) then works on that database, which is
+    how ``shards`` points the unchanged tool code at one shard. The
+    selection is per thread and per asyncio task; None leaves it as is.
+    """
+    if db_path is None:
+        yield
+        return
+    token = _current.set(resolve(db_path))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def get_pool(db_path: Optional[str] = None) -> ConnectionPool:
+    """Returns the process-wide pool for ``db_path`` (defaults to the configured database)."""
+    path = resolve(db_path)
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                if is_url(path):
+                    # Imported here so psycopg is only needed with PostgreSQL
+                    from .pg_backend import PostgresPool
+                    pool = _pools[path] = PostgresPool(path)
+                else:
+                    pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+@contextmanager
+def connection(db_path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """Checks out a pooled connection to the hotel database.
+
+    Usage:
+        with db.connection() as conn:
+            conn.execute(...)
+
+    Any transaction still open when the block exits is rolled back, so
+    callers must commit explicitly.
+    """
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+
+@contextmanager
+def read_only_connection(db_path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """A connection for long reads (reports, the SQL console) that cannot write.
+
+    For SQLite it is a fresh connection opened with ``mode=ro`` outside
+    the pool, so it never takes the write lock or a pooled connection
+    away from the tools; in WAL mode its reads see a snapshot and never
+    block writers. PostgreSQL readers never block writers either, so
+    there a pooled connection is used, switched to read-only for the
+    duration of the block.
+    """
+    path = resolve(db_path)
+    if is_url(path):
+        with connection(path) as conn:
+            conn.execute("SET default_transaction_read_only = on")
+            try:
+                yield conn
+            finally:
+                conn.rollback()
+                conn.execute("RESET default_transaction_read_only")
+        return
+    # The pool's first connection applies SCHEMA and switches to WAL mode,
+    # which a read-only connection cannot do
+    with connection(path):
+        pass
+    conn = sqlite3.connect(
+        f"file:{path}?mode=ro",
+        uri=True,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=metrics.connection_factory(),
+    )
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        yield conn
+    finally:
+        conn.close()
+
+
+def close_all() -> None:
+    """Closes all pools; registered to run at interpreter exit."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all)
@@ -1,5 +1,118 @@
-import sqlite3
+import argparse
+import csv
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import db, write_queue
+
+GUEST_CACHE_SIZE = int(os.getenv("HOTEL_GUEST_CACHE_SIZE", "4096"))
+# Bounds how long a change made outside this process (e.g. the sql console)
+# can go unnoticed by the read-first path
+GUEST_CACHE_TTL_S = float(os.getenv("HOTEL_GUEST_CACHE_TTL_S", "300"))
+
+# Phones looked up per IN (...) batch during bulk import
+_IN_BATCH = 500
+
+# phone -> (guest_id, name, city, created_at)
+GuestRow = Tuple[int, str, str, str]
+
+
+class GuestCache:
+    """LRU + TTL cache of guest rows keyed on phone number.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used one
+            is evicted.
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_entries: int = GUEST_CACHE_SIZE, ttl: float = GUEST_CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, GuestRow]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone: str) -> Optional[GuestRow]:
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[phone]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(phone)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, phone: str, row: GuestRow) -> None:
+        with self._lock:
+            self._entries[phone] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end(phone)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, phone: str) -> None:
+        with self._lock:
+            self._entries.pop(phone, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_caches: Dict[str, GuestCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_guest_cache(db_path: Optional[str] = None) -> GuestCache:
+    """Returns the guest cache for ``db_path`` (defaults to the configured database)."""
+    path = db.resolve(db_path)
+    cache = _caches.get(path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = GuestCache()
+    return cache
+
+
+def _normalise(name: Optional[str], phone: Optional[str],
+               city: Optional[str]) -> Tuple[str, str, str]:
+    """Guest fields as they are stored and looked up: surrounding whitespace
+    removed, so " +91..." and "+91..." are the same phone."""
+    return (name or "").strip(), (phone or "").strip(), (city or "").strip()
+
+
+def _guest_result(new_user: int, phone: str, row: GuestRow) -> dict:
+    guest_id, name, city, created_at = row
+    return {
+        "new_user": new_user,
+        "guest_details": {
+            "guest_id": guest_id,
+            "name": name,
+            "phone": phone,
+            "city": city,
+            "created_at": created_at
+        }
+    }
+
+
 def add_or_get_guest(name: str, phone: str, city: str) -> dict:
     """
     Adds a new guest to the database or updates an existing guest's details
@@ -10,17 +123,22 @@ def add_or_get_guest(name: str, phone: str, city: str) -> dict:
     record associated with that phone number. The 'created_at' timestamp is
     only set on initial creation and is not updated.
 
+    Returning guests whose details are unchanged are served from a phone
+    cache or a plain read; only inserting or changing a record goes
+    through the write queue (see ``write_queue``).
+
     Args:
         name (str): The full name of the guest.
         phone (str): The unique phone number of the guest. Used as the key
-                     for checking existence and updating.
+                     for checking existence and updating. Surrounding
+                     whitespace is ignored here, as in ``import_guests``.
         city (str): The city where the guest resides.
 
     Returns:
         dict: A dictionary containing the operation result:
               On success:
               {
-                  "new_user": int,  # 1 if a new guest was created, 0 if updated
+                  "new_user": int,  # 1 if a new guest was created, 0 if existing
                   "guest_details": {
                       "guest_id": int,
                       "name": str,
@@ -34,58 +152,178 @@ def add_or_get_guest(name: str, phone: str, city: str) -> dict:
                   "error": str  # Description of the error
               }
     """
-    if not all([name.strip(), phone.strip(), city.strip()]):
+    name, phone, city = _normalise(name, phone, city)
+    if not all([name, phone, city]):
         return {"error": "All fields must contain non-whitespace characters"}
-    
+
+    # Returning guests with unchanged details are answered without taking
+    # the write lock: from the cache, else from a plain indexed read
+    cache = get_guest_cache()
+    cached = cache.get(phone)
+    if cached is not None and cached[1:3] == (name, city):
+        return _guest_result(0, phone, cached)
+
+    pool = db.get_pool()
     conn = None
     try:
-        SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-        DB_PATH = os.path.join(SCRIPT_DIR, 'hotel.db')
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("BEGIN IMMEDIATE")  # Critical for atomic operations
-        cursor = conn.cursor()
-
-        # Atomic upsert using SQLite's conflict resolution
-        cursor.execute("""
-            INSERT INTO guest (name, phone, city)
-            VALUES (?, ?, ?)
-            ON CONFLICT(phone) DO UPDATE SET
-                name = excluded.name,
-                city = excluded.city
-            RETURNING guest_id, created_at
-        """, (name, phone, city))
-        
-        result = cursor.fetchone()
-        new_user_flag = 0 if cursor.rowcount == -1 else 1
-        
-        # For SQLite versions without RETURNING (compatibility layer)
-        if not result:
-            cursor.execute(
-                "SELECT guest_id, created_at FROM guest WHERE phone = ?", 
-                (phone,)
-            )
-            result = cursor.fetchone()
-            new_user_flag = 0
+        conn = pool.acquire()
+        row = conn.execute(
+            "SELECT guest_id, name, city, created_at FROM guest WHERE phone = ?", (phone,)
+        ).fetchone()
+        if row is not None and row[1:3] == (name, city):
+            cache.put(phone, row)
+            return _guest_result(0, phone, row)
+    except Exception as e:
+        return {"error": f"Database operation failed: {str(e)}"}
+    finally:
+        if conn: pool.release(conn)
 
-        guest_id, created_at = result
-        conn.commit()
-
-        return {
-            "new_user": new_user_flag,
-            "guest_details": {
-                "guest_id": guest_id,
-                "name": name,
-                "phone": phone,
-                "city": city,
-                "created_at": created_at
-            }
-        }
+    return write_queue.run(upsert_guest, name, phone, city)
 
+
+def upsert_guest(conn: sqlite3.Connection, name: str, phone: str,
+                 city: str) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``add_or_get_guest``; runs inside the write queue's transaction.
+
+    Returns:
+        tuple: (the ``add_or_get_guest`` result, a callback that caches
+        the guest after the commit).
+    """
+    try:
+        # Re-read under the lock; another writer may have added the phone
+        existing = conn.execute(
+            "SELECT guest_id, created_at FROM guest WHERE phone = ?", (phone,)
+        ).fetchone()
+        if existing:
+            conn.execute(
+                "UPDATE guest SET name = ?, city = ? WHERE guest_id = ?",
+                (name, city, existing[0]),
+            )
+            guest_id, created_at = existing
+            new_user_flag = 0
+        else:
+            guest_id, created_at = conn.execute(
+                "INSERT INTO guest (name, phone, city) VALUES (?, ?, ?)"
+                " RETURNING guest_id, created_at",
+                (name, phone, city),
+            ).fetchone()
+            new_user_flag = 1
     except sqlite3.IntegrityError as e:
-        conn.rollback()
-        return {"error": f"Duplicate phone exists: {phone}"}
+        return {"error": f"Duplicate phone exists: {phone}"}, None
     except Exception as e:
-        if conn: conn.rollback()
-        return {"error": f"Database operation failed: {str(e)}"}
-    finally:
-        if conn: conn.close()
\ No newline at end of file
+        return {"error": f"Database operation failed: {str(e)}"}, None
+
+    row = (guest_id, name, city, created_at)
+    return _guest_result(new_user_flag, phone, row), lambda conn: get_guest_cache().put(phone, row)
+
+
+def import_guests(guests: Iterable[Tuple[str, str, str]]) -> dict:
+    """Upserts many guests in a single write (see ``write_queue``).
+
+    Rows are ``(name, phone, city)``. Phones already on file are updated
+    only if the name or city differs; if a phone appears more than once,
+    the last row wins. Rows with a blank field are skipped.
+
+    Returns:
+        dict: On success:
+              {
+                  "received": int,
+                  "inserted": int,
+                  "updated": int,
+                  "unchanged": int,
+                  "skipped": int
+              }
+              On failure:
+              {
+                  "error": str
+              }
+    """
+    latest: Dict[str, Tuple[str, str]] = {}
+    received = skipped = 0
+    for name, phone, city in guests:
+        received += 1
+        name, phone, city = _normalise(name, phone, city)
+        if not (name and phone and city):
+            skipped += 1
+            continue
+        latest[phone] = (name, city)
+    return write_queue.run(_import_guests, latest, received, skipped)
+
+
+def _import_guests(conn: sqlite3.Connection, latest: Dict[str, Tuple[str, str]],
+                   received: int, skipped: int) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``import_guests``; runs inside the write queue's transaction.
+
+    Returns:
+        tuple: (the ``import_guests`` result, a callback that drops the
+        updated guests from the cache after the commit).
+    """
+    try:
+        phones = list(latest)
+        existing: Dict[str, Tuple[str, str]] = {}
+        for offset in range(0, len(phones), _IN_BATCH):
+            batch = phones[offset:offset + _IN_BATCH]
+            for phone, name, city in conn.execute(
+                "SELECT phone, name, city FROM guest WHERE phone IN ({})".format(
+                    ", ".join("?" * len(batch))),
+                batch,
+            ):
+                existing[phone] = (name, city)
+
+        inserts = [(name, phone, city) for phone, (name, city) in latest.items()
+                   if phone not in existing]
+        updates = [(name, city, phone) for phone, (name, city) in latest.items()
+                   if phone in existing and existing[phone] != (name, city)]
+        conn.executemany("INSERT INTO guest (name, phone, city) VALUES (?, ?, ?)", inserts)
+        conn.executemany("UPDATE guest SET name = ?, city = ? WHERE phone = ?", updates)
+    except sqlite3.Error as db_err:
+        return {"error": f"Database operation failed: {db_err}"}, None
+
+    def after_commit(conn: sqlite3.Connection) -> None:
+        cache = get_guest_cache()
+        for _, _, phone in updates:
+            cache.discard(phone)
+
+    return {
+        "received": received,
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "unchanged": len(latest) - len(inserts) - len(updates),
+        "skipped": skipped,
+    }, after_commit
+
+
+def import_guests_csv(path: str, name_column: str = "name", phone_column: str = "phone",
+                      city_column: str = "city", encoding: str = "utf-8-sig") -> dict:
+    """Runs ``import_guests`` over a CSV file with a header row.
+
+    Column names are matched case-insensitively, so exports with e.g.
+    "Name,Phone,City" headers work as they are; pass the column names for
+    other layouts.
+    """
+    with open(path, newline="", encoding=encoding) as fh:
+        reader = csv.DictReader(fh)
+        columns = {column.strip().lower(): column for column in reader.fieldnames or ()}
+        try:
+            name_key, phone_key, city_key = (
+                columns[column.lower()] for column in (name_column, phone_column, city_column)
+            )
+        except KeyError as e:
+            return {"error": f"Missing CSV column: {e.args[0]}"}
+        return import_guests(
+            (row.get(name_key), row.get(phone_key), row.get(city_key)) for row in reader
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import guests from a CSV file.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--name-column", default="name")
+    parser.add_argument("--phone-column", default="phone")
+    parser.add_argument("--city-column", default="city")
+    args = parser.parse_args()
+    print(import_guests_csv(args.csv_path, args.name_column, args.phone_column, args.city_column))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import db, occupancy, shards, write_queue
+
+# Default and maximum lifetime of a hold, in minutes
+HOLD_MINUTES = float(os.getenv("HOTEL_HOLD_MINUTES", "10"))
+MAX_HOLD_MINUTES = 30
+
+# Unexpired holds on one room overlapping a window; served by
+# idx_room_hold_room. Datetimes are stored canonical, so text comparison
+# is exact.
+OVERLAPPING_HOLDS_QUERY = """
+    SELECT hold_id, guest_id, expires_at
+    FROM room_hold
+    WHERE room_id = ?
+      AND check_in_datetime < ?
+      AND check_out_datetime > ?
+      AND expires_at > ?
+"""
+
+# hold_id -> (room_id, guest_id, check_in, check_out, expires_at)
+Hold = Tuple[int, int, str, str, float]
+
+
+def find_conflicting_hold(conn: sqlite3.Connection, room_id: int, check_in_datetime: str,
+                          check_out_datetime: str, guest_id: int,
+                          now: Optional[float] = None) -> Optional[Tuple[int, float]]:
+    """Returns an unexpired hold of another guest on ``room_id`` overlapping the window.
+
+    Reads the table directly, so inside the caller's write transaction the
+    answer is authoritative. Both datetimes must already be normalised.
+
+    Returns:
+        (hold_id, expires_at) of the blocking hold, or None.
+    """
+    rows = conn.execute(
+        OVERLAPPING_HOLDS_QUERY,
+        (room_id, check_out_datetime, check_in_datetime, time.time() if now is None else now),
+    )
+    for hold_id, holder, expires_at in rows:
+        if holder != guest_id:
+            return hold_id, expires_at
+    return None
+
+
+def release_guest_holds(conn: sqlite3.Connection, room_id: int, check_in_datetime: str,
+                        check_out_datetime: str, guest_id: int) -> List[int]:
+    """Deletes ``guest_id``'s holds on ``room_id`` that overlap the window.
+
+    Returns:
+        The deleted hold ids, to drop from the registry after commit.
+    """
+    return [hold_id for (hold_id,) in conn.execute(
+        "DELETE FROM room_hold WHERE room_id = ? AND guest_id = ?"
+        " AND check_in_datetime < ? AND check_out_datetime > ? RETURNING hold_id",
+        (room_id, guest_id, check_out_datetime, check_in_datetime),
+    ).fetchall()]
+
+
+class HoldRegistry:
+    """In-memory view of the unexpired rows of ``room_hold``.
+
+    Holds are kept per room, and a heap ordered by expiry drops them the
+    moment they lapse without touching the database. The table stays the
+    source of truth: ``sync`` reloads the (small) set of unexpired holds at
+    most once per ``sync_interval``, which picks up holds placed or
+    released by other processes; holds placed or released through this
+    process are applied immediately. Those that land while a reload is
+    reading the table are replayed on top of what it read, so a reload
+    never loses a hold added after its read began.
+
+    Args:
+        db_path (str, optional): Database to read; defaults to the configured database.
+        sync_interval (float): Seconds between reloads for unforced syncs.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 sync_interval: float = occupancy.SYNC_INTERVAL_S):
+        self.db_path = db_path
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._holds: Dict[int, Hold] = {}
+        self._by_room: Dict[int, Set[int]] = {}
+        self._expiry: List[Tuple[float, int]] = []
+        self._last_sync: Optional[float] = None
+        # One journal per reload in progress: hold_id -> hold, or None
+        # for a removal, recorded while that reload reads the table
+        self._journals: List[Dict[int, Optional[Hold]]] = []
+
+    def _put(self, hold_id: int, hold: Hold) -> None:
+        self._holds[hold_id] = hold
+        self._by_room.setdefault(hold[0], set()).add(hold_id)
+        heapq.heappush(self._expiry, (hold[4], hold_id))
+
+    def _drop(self, hold_id: int) -> None:
+        hold = self._holds.pop(hold_id, None)
+        if hold is not None:
+            room = self._by_room.get(hold[0])
+            room.discard(hold_id)
+            if not room:
+                del self._by_room[hold[0]]
+
+    def _expire(self, now: float) -> None:
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, hold_id = heapq.heappop(expiry)
+            hold = self._holds.get(hold_id)
+            # A hold extended since it was pushed has a later entry too
+            if hold is not None and hold[4] <= now:
+                self._drop(hold_id)
+
+    def sync(self, conn: Optional[sqlite3.Connection] = None, force: bool = False) -> None:
+        """Reloads unexpired holds from the table, at most once per interval."""
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        if conn is None:
+            with db.connection(self.db_path) as pooled:
+                return self.sync(pooled, force=True)
+        # Started before the read, so any add or remove whose commit the
+        # read might miss is journaled
+        journal: Dict[int, Optional[Hold]] = {}
+        with self._lock:
+            self._journals.append(journal)
+        try:
+            rows = conn.execute(
+                "SELECT hold_id, room_id, guest_id, check_in_datetime, check_out_datetime, expires_at"
+                " FROM room_hold WHERE expires_at > ?", (time.time(),)
+            ).fetchall()
+        except BaseException:
+            with self._lock:
+                self._journals.remove(journal)
+            raise
+        with self._lock:
+            self._journals.remove(journal)
+            self._holds = {}
+            self._by_room = {}
+            self._expiry = []
+            for hold_id, *hold in rows:
+                self._put(hold_id, tuple(hold))
+            for hold_id, hold in journal.items():
+                self._drop(hold_id)
+                if hold is not None:
+                    self._put(hold_id, hold)
+            self._last_sync = now
+
+    def add(self, hold_id: int, hold: Hold) -> None:
+        with self._lock:
+            self._put(hold_id, hold)
+            for journal in self._journals:
+                journal[hold_id] = hold
+
+    def remove(self, hold_id: int) -> None:
+        with self._lock:
+            self._drop(hold_id)
+            for journal in self._journals:
+                journal[hold_id] = None
+
+    def held_rooms(self, check_in_datetime: str, check_out_datetime: str,
+                   guest_id: Optional[int] = None) -> Set[int]:
+        """Rooms held by anyone but ``guest_id`` for part of the window.
+
+        Both datetimes must already be normalised.
+        """
+        self.sync()
+        with self._lock:
+            if not self._holds:
+                return set()
+            self._expire(time.time())
+            return {
+                room_id
+                for room_id, hold_ids in self._by_room.items()
+                if any(
+                    self._holds[hold_id][1] != guest_id
+                    and self._holds[hold_id][2] < check_out_datetime
+                    and self._holds[hold_id][3] > check_in_datetime
+                    for hold_id in hold_ids
+                )
+            }
+
+    def filter_rooms(self, rooms: List[Tuple], check_in_datetime: str,
+                     check_out_datetime: str, guest_id: Optional[int] = None) -> List[Tuple]:
+        """Drops catalog rows of rooms held by other guests for the window."""
+        held = self.held_rooms(check_in_datetime, check_out_datetime, guest_id)
+        if not held:
+            return rooms
+        return [row for row in rooms if row[0] not in held]
+
+
+_registries: Dict[str, HoldRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(db_path: Optional[str] = None) -> HoldRegistry:
+    """Returns the process-wide hold registry for ``db_path``."""
+    path = db.resolve(db_path)
+    registry = _registries.get(path)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(path)
+            if registry is None:
+                registry = _registries[path] = HoldRegistry(path)
+    return registry
+
+
+def hold_room(guest_id: int, room_id: int, check_in_datetime: str,
+              check_out_datetime: str, minutes: float = HOLD_MINUTES) -> dict:
+    """Holds a room for a guest for a few minutes while they decide.
+
+    Use this as soon as the guest picks a room from the availability
+    results. While the hold lasts the room is not offered to other guests
+    and cannot be booked by them; the booking tool then books it for this
+    guest. Holding again extends the hold.
+
+    Args:
+        guest_id (int): The guest the room is held for.
+        room_id (int): The room to hold.
+        check_in_datetime (str): Check-in in ISO format (YYYY-MM-DD HH:MM:SS).
+        check_out_datetime (str): Check-out in ISO format (YYYY-MM-DD HH:MM:SS).
+        minutes (float): How long to hold it (default 10, at most 30).
+
+    Returns:
+        dict: On success:
+              {
+                  'hold_id': int,
+                  'room_id': int,
+                  'expires_at': str,          # local time, 'YYYY-MM-DD HH:MM:SS'
+                  'expires_in_seconds': int
+              }
+              On failure:
+              {
+                  'error': str
+              }
+    """
+    try:
+        start = occupancy.normalise_datetime(check_in_datetime)
+        end = occupancy.normalise_datetime(check_out_datetime)
+    except ValueError:
+        return {'error': "Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS)."}
+    if end <= start:
+        return {'error': "Check-out must be after check-in."}
+    if not 0 < minutes <= MAX_HOLD_MINUTES:
+        return {'error': f"A hold lasts between 0 and {MAX_HOLD_MINUTES} minutes."}
+
+    # Queued on the writer of the shard that owns the room
+    with db.use(shards.room_location(room_id)):
+        return write_queue.run(place_hold, guest_id, room_id, start, end, minutes)
+
+
+def place_hold(conn: sqlite3.Connection, guest_id: int, room_id: int, start: str, end: str,
+               minutes: float) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``hold_room``; runs inside the write queue's transaction.
+
+    Both datetimes must already be normalised.
+
+    Returns:
+        tuple: (the ``hold_room`` result, a callback that updates the hold
+        registry after the commit).
+    """
+    try:
+        now = time.time()
+        if not conn.execute(
+            "SELECT 1 FROM room WHERE room_id = ? AND is_active = 1", (room_id,)
+        ).fetchone():
+            return {'error': f"Invalid room_id: {room_id} not found."}, None
+        if occupancy.find_overlapping_booking(conn, room_id, start, end):
+            return {'error': "The selected room is no longer available for these dates. Please check availability again and choose another room."}, None
+        if find_conflicting_hold(conn, room_id, start, end, guest_id, now):
+            return {'error': "The selected room is being held for another guest. Please choose another room or try again in a few minutes."}, None
+
+        # Expired rows are only dead weight; clear them while holding the lock
+        conn.execute("DELETE FROM room_hold WHERE expires_at <= ?", (now,))
+        previous = release_guest_holds(conn, room_id, start, end, guest_id)
+        expires_at = now + minutes * 60
+        hold_id = conn.execute(
+            "INSERT INTO room_hold (room_id, guest_id, check_in_datetime, check_out_datetime, expires_at)"
+            " VALUES (?, ?, ?, ?, ?) RETURNING hold_id",
+            (room_id, guest_id, start, end, expires_at),
+        ).fetchone()[0]
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}, None
+
+    def after_commit(conn: sqlite3.Connection) -> None:
+        # The writer thread runs with this shard as the default database
+        registry = get_registry()
+        for old in previous:
+            registry.remove(old)
+        registry.add(hold_id, (room_id, guest_id, start, end, expires_at))
+
+    return {
+        'hold_id': hold_id,
+        'room_id': room_id,
+        'expires_at': datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S"),
+        'expires_in_seconds': int(minutes * 60),
+    }, after_commit
+
+
+def release_hold(guest_id: int, hold_id: int) -> dict:
+    """Releases a room hold early, e.g. when the guest picks another room.
+
+    Only the guest the room is held for can release the hold.
+
+    Args:
+        guest_id (int): The guest the room is held for.
+        hold_id (int): The hold_id returned by ``hold_room``.
+
+    Returns:
+        dict: {'released': bool} (False if the hold has already expired or
+        been released), or {'error': str} if the hold belongs to another
+        guest.
+    """
+    with db.use(shards.hold_location(hold_id)):
+        return write_queue.run(delete_hold, guest_id, hold_id)
+
+
+def delete_hold(conn: sqlite3.Connection, guest_id: int,
+                hold_id: int) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op behind ``release_hold``; runs inside the write queue's transaction."""
+    try:
+        released = conn.execute(
+            "DELETE FROM room_hold WHERE hold_id = ? AND guest_id = ?", (hold_id, guest_id)
+        ).rowcount > 0
+        if not released and conn.execute(
+            "SELECT 1 FROM room_hold WHERE hold_id = ?", (hold_id,)
+        ).fetchone():
+            return {'error': f"Hold {hold_id} is not held for guest {guest_id}."}, None
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}, None
+    return {'released': released}, lambda conn: get_registry().remove(hold_id)
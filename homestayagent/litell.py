@@ -1,25 +1,34 @@
 from litellm import completion
 import os
+import time
 from dotenv import load_dotenv
 
-load_dotenv()
 
-response = completion(
-    model="ollama/gpt-oss:20b-cloud", 
-    messages=[{ "content": "respond in 20 words. who are you?","role": "user"}], 
-    api_base=os.getenv("OLLAMA_BASE_URL"),
-    headers={"Authorization": f"Bearer {os.getenv('OLLAMA_API_KEY')}"},
-)
+def main() -> None:
+    """Streams a short answer from the agent's model and prints its timings."""
+    load_dotenv()
 
-print(response)
+    # Streamed, so the answer prints as it is generated instead of after the
+    # whole completion
+    started = time.perf_counter()
+    response = completion(
+        model="ollama/gpt-oss:20b-cloud",
+        messages=[{"content": "respond in 20 words. who are you?", "role": "user"}],
+        api_base=os.getenv("OLLAMA_BASE_URL"),
+        headers={"Authorization": f"Bearer {os.getenv('OLLAMA_API_KEY')}"},
+        stream=True,
+    )
 
-'''
-llm = ChatOllama(
-    model="gpt-oss:20b-cloud",
-    base_url=os.getenv("OLLAMA_BASE_URL"),
-    headers={"Authorization": f"Bearer {os.getenv('OLLAMA_API_KEY')}"},
-)
-print(response)
-for chunk in response:
-    print(chunk['choices'][0]['delta'])
-'''
\ No newline at end of file
+    first_token = None
+    for chunk in response:
+        text = chunk.choices[0].delta.content
+        if text:
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            print(text, end="", flush=True)
+    print()
+    print(f"time to first token: {first_token or 0:.2f}s, total: {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
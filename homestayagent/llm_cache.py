@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+from . import metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Response cache; HOTEL_LLM_CACHE=0 turns it off
+CACHE_ENABLED = os.getenv("HOTEL_LLM_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("HOTEL_LLM_CACHE_PATH", os.path.join(SCRIPT_DIR, "llm_cache.db"))
+CACHE_SIZE = int(os.getenv("HOTEL_LLM_CACHE_SIZE", "2048"))
+CACHE_TTL_S = float(os.getenv("HOTEL_LLM_CACHE_TTL_S", "3600"))
+# Also cache turns where the model called a tool. Off by default: a text
+# answer to an identical conversation is safe to replay, a tool call
+# usually is too but re-runs its side effect.
+CACHE_TOOL_CALLS = os.getenv("HOTEL_LLM_CACHE_TOOL_CALLS", "0") == "1"
+
+# Provider prompt-prefix caching: "auto" marks the system prompt as a
+# cache breakpoint for providers that take explicit breakpoints, "1"
+# always does, "0" never does. Ollama needs no breakpoints; it reuses the
+# KV cache of an identical prompt prefix by itself, which is why the
+# system prompt is kept byte-identical between turns.
+PREFIX_CACHE = os.getenv("HOTEL_LLM_PREFIX_CACHE", "auto")
+PREFIX_CACHE_TTL_S = int(os.getenv("HOTEL_LLM_PREFIX_CACHE_TTL_S", "300"))
+PREFIX_CACHE_PROVIDERS = ("anthropic", "bedrock", "vertex_ai", "openrouter")
+
+# LlmRequest fields that do not change what the model answers
+_KEY_EXCLUDE = {"tools_dict", "cache_config", "cache_metadata",
+                "cacheable_contents_token_count", "live_connect_config"}
+# Completion arguments that do change it (credentials and headers do not)
+_KEY_ARGS = ("api_base", "custom_llm_provider", "temperature", "top_p", "max_tokens", "seed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    responses TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache(last_used);
+"""
+
+
+class ResponseCache:
+    """Exact-match LLM response cache, LRU + TTL, in a SQLite file.
+
+    Kept on disk so that answers survive restarts and are shared by every
+    worker process on the host. Entries past ``ttl`` are misses; once
+    there are more than ``max_entries`` the least recently used are
+    evicted.
+
+    Args:
+        path (str): Cache database file; created if missing.
+        max_entries (int): Entries kept before eviction.
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_SIZE,
+                 ttl: float = CACHE_TTL_S):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the cached responses for ``key``, or None."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT responses FROM llm_response_cache WHERE cache_key = ? AND created_at > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE llm_response_cache SET last_used = ?, hits = hits + 1 WHERE cache_key = ?",
+                (now, key),
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, responses: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO llm_response_cache (cache_key, model, responses, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(cache_key) DO UPDATE SET responses = excluded.responses,"
+                " created_at = excluded.created_at, last_used = excluded.last_used",
+                (key, model, json.dumps(responses), now, now),
+            )
+            self._puts += 1
+            # Trimming on every put would scan the index each time
+            if self._puts % 64 == 1:
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM llm_response_cache WHERE created_at <= ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM llm_response_cache WHERE cache_key IN ("
+            " SELECT cache_key FROM llm_response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM llm_response_cache")
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection().execute(
+                "SELECT COUNT(*) FROM llm_response_cache"
+            ).fetchone()[0]
+        return {"path": self.path, "entries": entries, "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(path: Optional[str] = None) -> ResponseCache:
+    """Returns the process-wide response cache for ``path`` (defaults to ``CACHE_PATH``)."""
+    path = os.path.abspath(path or CACHE_PATH)
+    cache = _caches.get(path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = ResponseCache(path)
+    return cache
+
+
+def cache_key(model: str, llm_request: LlmRequest, completion_args: Dict[str, Any]) -> str:
+    """Hash of everything that determines the model's answer.
+
+    Covers the conversation, system instruction, tool declarations and
+    generation config, plus the model and the sampling arguments it was
+    built with. The system instruction carries today's date, so entries
+    never outlive the day they were made on.
+    """
+    payload = {
+        "model": model,
+        "request": llm_request.model_dump(mode="json", exclude=_KEY_EXCLUDE, exclude_none=True),
+        "args": {name: completion_args[name] for name in _KEY_ARGS if name in completion_args},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _cacheable(responses: List[LlmResponse], tool_calls: bool) -> bool:
+    if not responses:
+        return False
+    for response in responses:
+        if response.error_code or response.content is None or not response.content.parts:
+            return False
+        if not tool_calls and any(part.function_call for part in response.content.parts):
+            return False
+    return True
+
+
+def _uses_prefix_cache(model: str) -> bool:
+    if PREFIX_CACHE == "auto":
+        return model.split("/", 1)[0] in PREFIX_CACHE_PROVIDERS
+    return PREFIX_CACHE == "1"
+
+
+class CachingLiteLlm(LiteLlm):
+    """LiteLlm with an exact-match response cache and prompt-prefix caching.
+
+    A request identical to one answered before (same conversation, system
+    prompt, tools and config; see ``cache_key``) is answered from the
+    ``ResponseCache`` without calling the provider. Only complete,
+    error-free responses are stored, and by default only text answers.
+    Replayed responses carry no usage_metadata, so the llm_tokens metric
+    counts tokens actually spent, and ``custom_metadata['llm_cache']``
+    is 'hit'.
+
+    Independently, requests without a cache config of their own get one
+    (see ``PREFIX_CACHE``), which makes LiteLlm add cache_control
+    breakpoints so the provider can reuse the static system prompt.
+
+    Args:
+        model (str): LiteLLM model name.
+        response_cache (ResponseCache, optional): Cache to use; None uses
+            the shared one unless ``HOTEL_LLM_CACHE=0``.
+        cache_tool_calls (bool): Also cache turns that call a tool.
+        **kwargs: Passed to LiteLlm.
+    """
+
+    _response_cache: Optional[ResponseCache] = PrivateAttr(default=None)
+    _cache_tool_calls: bool = PrivateAttr(default=False)
+
+    def __init__(self, model: str, response_cache: Optional[ResponseCache] = None,
+                 cache_tool_calls: bool = CACHE_TOOL_CALLS, **kwargs: Any) -> None:
+        super().__init__(model=model, **kwargs)
+        if response_cache is None and CACHE_ENABLED:
+            response_cache = get_response_cache()
+        self._response_cache = response_cache
+        self._cache_tool_calls = cache_tool_calls
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        model = llm_request.model or self.model
+        if llm_request.cache_config is None and _uses_prefix_cache(model):
+            llm_request.cache_config = ContextCacheConfig(ttl_seconds=PREFIX_CACHE_TTL_S)
+
+        cache = self._response_cache
+        if cache is None:
+            async for response in super().generate_content_async(llm_request, stream):
+                yield response
+            return
+
+        key = cache_key(model, llm_request, self._additional_args)
+        # The cache is a SQLite file; its reads and writes run on a worker
+        # thread so the event loop keeps serving other sessions
+        cached = await asyncio.to_thread(cache.get, key)
+        if metrics.ENABLED:
+            metrics.registry.inc("llm_cache_hits_total" if cached is not None
+                                 else "llm_cache_misses_total", model=model)
+        if cached is not None:
+            for data in cached:
+                response = LlmResponse.model_validate(data)
+                response.custom_metadata = {**(response.custom_metadata or {}), "llm_cache": "hit"}
+                yield response
+            return
+
+        final: List[LlmResponse] = []
+        async for response in super().generate_content_async(llm_request, stream):
+            if not response.partial:
+                final.append(response)
+            yield response
+        if _cacheable(final, self._cache_tool_calls):
+            await asyncio.to_thread(cache.put, key, model, [
+                response.model_dump(mode="json", exclude_none=True,
+                                    exclude={"usage_metadata", "cache_metadata"})
+                for response in final
+            ])
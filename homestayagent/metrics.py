@@ -0,0 +1,473 @@
+import atexit
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Instrumentation is on unless HOTEL_METRICS=0. With it off, pooled
+# connections are plain sqlite3 connections and the hooks below return
+# immediately.
+ENABLED = os.getenv("HOTEL_METRICS", "1") != "0"
+# If set, a JSON snapshot is written here at interpreter exit
+METRICS_FILE = os.getenv("HOTEL_METRICS_FILE")
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Histogram bucket upper bounds for sizes (rows, bytes, tokens)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Metric name -> (help text, buckets); anything else is a counter
+HISTOGRAMS = {
+    "tool_call_seconds": ("Tool function latency", LATENCY_BUCKETS),
+    "tool_payload_bytes": ("Size of the JSON a tool returned", SIZE_BUCKETS),
+    "sql_statement_seconds": ("SQL statement execution time", LATENCY_BUCKETS),
+    "sql_rows_returned": ("Rows fetched per SQL statement", SIZE_BUCKETS),
+    "write_queue_seconds": ("Time a write waited in the write queue", LATENCY_BUCKETS),
+    "write_batch_size": ("Writes committed per write-queue transaction", SIZE_BUCKETS),
+    "llm_call_seconds": ("LLM request latency", LATENCY_BUCKETS),
+    "llm_first_token_seconds": ("Time from LLM request to its first streamed output", LATENCY_BUCKETS),
+    "llm_tokens": ("Tokens per LLM call, by direction", SIZE_BUCKETS),
+}
+COUNTERS = {
+    "tool_errors_total": "Tool calls that returned an error",
+    "sql_errors_total": "SQL statements that raised",
+    "write_after_commit_errors_total": "Committed writes whose after-commit refresh failed",
+    "llm_errors_total": "LLM calls that failed",
+    "llm_cache_hits_total": "LLM requests answered from the response cache",
+    "llm_cache_misses_total": "LLM requests sent to the provider after a cache miss",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_WHITESPACE = re.compile(r"\s+")
+# "IN (?, ?, ?)" lists of any length map to one statement label
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_STATEMENT_LABEL_LENGTH = 80
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count, sum and max.
+
+    Each histogram has its own lock, so observations of different series
+    never wait on each other.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def copy(self) -> "Histogram":
+        """Consistent copy for reading while observations continue."""
+        copied = Histogram(self.buckets)
+        with self._lock:
+            copied.counts = list(self.counts)
+            copied.count = self.count
+            copied.sum = self.sum
+            copied.max = self.max
+        return copied
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding quantile ``q`` (0-1)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Counter:
+    """Monotonic counter with its own lock."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Registry:
+    """Thread-safe store of labelled histograms and counters.
+
+    The registry lock is only taken to add a series or to list them; an
+    observation locks just its own series, so SQL statements timed on
+    different threads do not serialise on one process-wide lock.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = self._counters[key] = Counter()
+        counter.inc(amount)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics as JSON-serialisable data.
+
+        Returns:
+            dict: {"started_at": float, "uptime_s": float,
+            "histograms": {name: [{"labels": {...}, "count", "sum",
+            "mean", "max", "p50", "p95", "p99"}]},
+            "counters": {name: [{"labels": {...}, "value"}]}}. Quantiles
+            are bucket upper bounds.
+        """
+        with self._lock:
+            histogram_items = sorted(self._histograms.items(), key=lambda item: item[0])
+            counter_items = sorted(self._counters.items(), key=lambda item: item[0])
+        histograms: Dict[str, List[Dict]] = {}
+        for (name, labels), histogram in histogram_items:
+            histograms.setdefault(name, []).append(
+                {"labels": dict(labels), **histogram.copy().to_dict()}
+            )
+        counters: Dict[str, List[Dict]] = {}
+        for (name, labels), counter in counter_items:
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": counter.value})
+        return {
+            "started_at": self.started_at,
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "histograms": histograms,
+            "counters": counters,
+        }
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            counters = sorted(self._counters.items(), key=lambda item: item[0])
+        described = set()
+        for (name, labels), histogram in histograms:
+            histogram = histogram.copy()
+            metric = f"hotel_{name}"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {HISTOGRAMS[name][0]}")
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, le=repr(float(bound)))} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, le='+Inf')} {histogram.count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), counter in counters:
+            value = counter.value
+            metric = f"hotel_{name}"
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {COUNTERS.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in items) + "}"
+
+
+registry = Registry()
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current metrics of the process-wide registry; see Registry.snapshot."""
+    return registry.snapshot()
+
+
+def to_prometheus() -> str:
+    """Current metrics of the process-wide registry in Prometheus text format."""
+    return registry.to_prometheus()
+
+
+def write_json(path: str) -> None:
+    """Writes a snapshot to ``path`` atomically (write, then rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(snapshot(), fh, indent=2)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Short, low-cardinality label for a SQL statement (memoised)."""
+    text = _PLACEHOLDER_LIST.sub("(?...)", _WHITESPACE.sub(" ", sql).strip())
+    return text[:_STATEMENT_LABEL_LENGTH]
+
+
+# --- Tool timing --------------------------------------------------------
+
+def payload_bytes(result: Any) -> int:
+    try:
+        return len(json.dumps(result, ensure_ascii=False, default=str).encode())
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_tool(name: str, seconds: float, result: Any) -> None:
+    """Records one tool call: latency, payload size and error outcome."""
+    if not ENABLED:
+        return
+    registry.observe("tool_call_seconds", seconds, tool=name)
+    registry.observe("tool_payload_bytes", payload_bytes(result), tool=name)
+    if isinstance(result, dict) and "error" in result:
+        registry.inc("tool_errors_total", tool=name)
+
+
+# --- SQL timing ---------------------------------------------------------
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor recording statement time and rows fetched.
+
+    Rows are counted when read with fetchone/fetchmany/fetchall; rows read
+    by iterating the cursor are not counted, to keep bulk loads cheap.
+    """
+
+    _label = ""
+
+    def execute(self, sql, parameters=()):
+        self._label = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error:
+            registry.inc("sql_errors_total", statement=self._label)
+            raise
+        finally:
+            registry.observe("sql_statement_seconds", time.perf_counter() - started,
+                             statement=self._label)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._label = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            registry.inc("sql_errors_total", statement=self._label)
+            raise
+        finally:
+            registry.observe("sql_statement_seconds", time.perf_counter() - started,
+                             statement=self._label)
+
+    def fetchone(self):
+        row = super().fetchone()
+        registry.observe("sql_rows_returned", 0 if row is None else 1, statement=self._label)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        registry.observe("sql_rows_returned", len(rows), statement=self._label)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        registry.observe("sql_rows_returned", len(rows), statement=self._label)
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute) are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory() -> type:
+    """Connection class for ``sqlite3.connect(factory=...)``."""
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+# --- ADK callbacks ------------------------------------------------------
+# Start times are kept per call id so concurrent sessions do not mix up
+
+_started: Dict[Any, float] = {}
+_started_lock = threading.Lock()
+# Model calls whose first streamed chunk has been timed
+_first_token_seen: set = set()
+
+
+def _start(key: Any) -> None:
+    with _started_lock:
+        _started[key] = time.perf_counter()
+
+
+def _stop(key: Any) -> Optional[float]:
+    with _started_lock:
+        started = _started.pop(key, None)
+    return None if started is None else time.perf_counter() - started
+
+
+def _first_token(key: Any) -> Optional[float]:
+    """Time since ``_start(key)`` if this is the call's first output, else None."""
+    with _started_lock:
+        started = _started.get(key)
+        if started is None or key in _first_token_seen:
+            return None
+        _first_token_seen.add(key)
+    return time.perf_counter() - started
+
+
+def _tool_key(tool, tool_context) -> Tuple:
+    return ("tool", getattr(tool_context, "function_call_id", None) or id(tool_context), tool.name)
+
+
+def before_tool_callback(tool, args, tool_context) -> None:
+    """ADK before_tool_callback: starts the tool timer."""
+    if ENABLED:
+        _start(_tool_key(tool, tool_context))
+    return None
+
+
+def after_tool_callback(tool, args, tool_context, tool_response) -> None:
+    """ADK after_tool_callback: records the tool call."""
+    if ENABLED:
+        seconds = _stop(_tool_key(tool, tool_context))
+        if seconds is not None:
+            record_tool(tool.name, seconds, tool_response)
+    return None
+
+
+def on_tool_error_callback(tool, args, tool_context, error) -> None:
+    """ADK on_tool_error_callback: counts the failure and drops the timer."""
+    if ENABLED:
+        seconds = _stop(_tool_key(tool, tool_context))
+        if seconds is not None:
+            registry.observe("tool_call_seconds", seconds, tool=tool.name)
+        registry.inc("tool_errors_total", tool=tool.name)
+    return None
+
+
+def _model_key(callback_context) -> Tuple:
+    return ("llm", callback_context.invocation_id, getattr(callback_context, "agent_name", ""))
+
+
+def before_model_callback(callback_context, llm_request) -> None:
+    """ADK before_model_callback: starts the LLM call timer."""
+    if ENABLED:
+        _start(_model_key(callback_context))
+    return None
+
+
+def after_model_callback(callback_context, llm_response) -> None:
+    """ADK after_model_callback: records LLM latency, time to first token and token usage.
+
+    With streaming, the first partial response gives the time to first
+    token; without it, that is the full latency.
+    """
+    if not ENABLED:
+        return None
+    key = _model_key(callback_context)
+    model = getattr(llm_response, "model_version", None) or "unknown"
+    first = _first_token(key)
+    if first is not None:
+        registry.observe("llm_first_token_seconds", first, model=model)
+    if getattr(llm_response, "partial", False):
+        return None
+    seconds = _stop(key)
+    with _started_lock:
+        _first_token_seen.discard(key)
+    if seconds is not None:
+        registry.observe("llm_call_seconds", seconds, model=model)
+    if getattr(llm_response, "error_code", None):
+        registry.inc("llm_errors_total", model=model)
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        for direction, field in (("prompt", "prompt_token_count"),
+                                 ("completion", "candidates_token_count")):
+            tokens = getattr(usage, field, None)
+            if tokens:
+                registry.observe("llm_tokens", tokens, model=model, direction=direction)
+    return None
+
+
+def on_model_error_callback(callback_context, llm_request, error) -> None:
+    """ADK on_model_error_callback: counts the failure and drops the timer."""
+    if ENABLED:
+        key = _model_key(callback_context)
+        _stop(key)
+        with _started_lock:
+            _first_token_seen.discard(key)
+        registry.inc("llm_errors_total", model=getattr(llm_request, "model", None) or "unknown")
+    return None
+
+
+if METRICS_FILE:
+    atexit.register(write_json, METRICS_FILE)
@@ -0,0 +1,384 @@
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import db
+
+# Bookings in these states no longer hold their room
+INACTIVE_STATUS_CODES = ('CANCELLED',)
+
+# Room catalog rows, ordered like the original availability query:
+# (room_id, room_number, type_name, capacity, price, building_name,
+#  extra_bed_included, extra_bed_price)
+CATALOG_QUERY = """
+    SELECT
+        r.room_id,
+        r.room_number,
+        rt.name,
+        rt.capacity,
+        rt.price,
+        b.name,
+        rt.extra_bed_included,
+        rt.extra_bed_price
+    FROM room r
+    JOIN room_type rt ON r.room_type_id = rt.room_type_id
+    JOIN building b ON rt.building_id = b.building_id
+    WHERE r.is_active = 1
+    ORDER BY rt.price ASC, rt.capacity DESC, r.room_id ASC
+"""
+
+ACTIVE_BOOKINGS_QUERY = """
+    SELECT b.booking_id, b.room_id, b.check_in_datetime, b.check_out_datetime
+    FROM booking b
+    JOIN booking_status s ON s.booking_status_id = b.status_id
+    WHERE s.code NOT IN ({})
+""".format(", ".join("?" * len(INACTIVE_STATUS_CODES)))
+
+# Candidate overlaps for one room, served by idx_booking_room_window. Text
+# comparison against canonical bounds never misses an overlap with legacy
+# 'YYYY-MM-DD HH:MM' values, but can over-report touching stays, so
+# candidates are re-checked after normalising.
+OVERLAP_CANDIDATES_QUERY = """
+    SELECT b.booking_id, b.check_in_datetime, b.check_out_datetime
+    FROM booking b
+    JOIN booking_status s ON s.booking_status_id = b.status_id
+    WHERE b.room_id = ?
+      AND b.check_in_datetime < ?
+      AND b.check_out_datetime > ?
+      AND s.code NOT IN ({})
+""".format(", ".join("?" * len(INACTIVE_STATUS_CODES)))
+
+# Upper bound on host parameters per IN (...) batch
+_IN_BATCH = 500
+
+# How stale (in seconds) the index may be before a query re-probes the
+# change log. Writes made through this process force a sync right away,
+# so this only bounds how late writes from other processes are seen.
+SYNC_INTERVAL_S = float(os.getenv("HOTEL_OCCUPANCY_SYNC_INTERVAL_S", "1.0"))
+
+# A change notification: (room_id, capacity, start, end) for each stay
+# added or removed, or None when everything must be considered changed
+# (first load, full reload, room catalog edit).
+OccupancyListener = Callable[[Optional[List[Tuple[int, Optional[int], str, str]]]], None]
+
+
+def normalise_datetime(value: str) -> str:
+    """Returns ``value`` as a canonical 'YYYY-MM-DD HH:MM:SS' string.
+
+    Stored stay windows mix 'YYYY-MM-DD HH:MM' and 'YYYY-MM-DD HH:MM:SS',
+    which do not compare correctly as text. Canonical strings sort in
+    chronological order, so the interval index can compare them directly.
+
+    Raises:
+        ValueError: If ``value`` is not an ISO 8601 datetime.
+    """
+    if len(value) == 19 and value[10] == ' ':
+        return value
+    if len(value) == 16 and value[10] == ' ':
+        return value + ':00'
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def find_overlapping_booking(conn: sqlite3.Connection, room_id: int,
+                             check_in_datetime: str,
+                             check_out_datetime: str) -> Optional[Tuple[int, str, str]]:
+    """Returns the first active booking of ``room_id`` overlapping the window.
+
+    This reads the database directly rather than the in-memory index, so
+    run inside the caller's write transaction it gives an authoritative
+    answer. Both datetimes must already be normalised.
+
+    Returns:
+        (booking_id, check_in, check_out) of a conflicting booking, or None.
+    """
+    rows = conn.execute(
+        OVERLAP_CANDIDATES_QUERY,
+        (room_id, check_out_datetime, check_in_datetime, *INACTIVE_STATUS_CODES),
+    )
+    for booking_id, check_in, check_out in rows:
+        if (normalise_datetime(check_in) < check_out_datetime
+                and normalise_datetime(check_out) > check_in_datetime):
+            return booking_id, check_in, check_out
+    return None
+
+
+class RoomIntervals:
+    """Sorted stay intervals of one room with a running maximum of end times.
+
+    ``starts`` is kept sorted, and ``max_end[i]`` is the latest check-out
+    among the first ``i + 1`` intervals, so an overlap test is a single
+    bisect even if legacy data contains overlapping stays.
+    """
+
+    __slots__ = ('starts', 'ends', 'booking_ids', 'max_end')
+
+    def __init__(self):
+        self.starts: List[str] = []
+        self.ends: List[str] = []
+        self.booking_ids: List[int] = []
+        self.max_end: List[str] = []
+
+    def _rebuild_from(self, index: int) -> None:
+        del self.max_end[index:]
+        running = self.max_end[-1] if self.max_end else ''
+        for end in self.ends[index:]:
+            if end > running:
+                running = end
+            self.max_end.append(running)
+
+    def add(self, booking_id: int, start: str, end: str) -> None:
+        index = bisect.bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.booking_ids.insert(index, booking_id)
+        self._rebuild_from(index)
+
+    def remove(self, booking_id: int) -> None:
+        try:
+            index = self.booking_ids.index(booking_id)
+        except ValueError:
+            return
+        del self.starts[index]
+        del self.ends[index]
+        del self.booking_ids[index]
+        self._rebuild_from(index)
+
+    def overlaps(self, start: str, end: str) -> bool:
+        """True if any stored stay intersects the half-open window [start, end)."""
+        index = bisect.bisect_left(self.starts, end)
+        return index > 0 and self.max_end[index - 1] > start
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class OccupancyEngine:
+    """In-memory occupancy index answering "which rooms are free" queries.
+
+    The engine holds the active room catalog and, per room, the stay
+    intervals of every booking that is not cancelled. It is kept in sync
+    with the database through ``occupancy_change_log``, which triggers on
+    ``booking``, ``room``, ``room_type`` and ``building`` append to on every
+    write, so changes made by other processes (or the raw sql console) are
+    picked up as well. A sync is a single indexed probe of that log when
+    nothing changed.
+
+    Listeners registered with ``add_listener`` are told which stays were
+    added or removed on every sync, which is how derived caches are
+    invalidated.
+
+    Args:
+        db_path (str, optional): Database to index; defaults to the configured database.
+        sync_interval (float): Seconds between change-log probes for
+            unforced syncs.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 sync_interval: float = SYNC_INTERVAL_S):
+        self.db_path = db_path
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._catalog: List[Tuple] = []
+        self._capacity: Dict[int, int] = {}
+        self._rooms: Dict[int, RoomIntervals] = {}
+        self._bookings: Dict[int, Tuple[int, str, str]] = {}
+        self._last_change_id: Optional[int] = None
+        self._last_sync = 0.0
+        self._listeners: List[OccupancyListener] = []
+
+    def add_listener(self, listener: OccupancyListener) -> None:
+        """Registers ``listener`` to be called with the changes of each sync."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, changes: Optional[List[Tuple[int, Optional[int], str, str]]]) -> None:
+        for listener in self._listeners:
+            listener(changes)
+
+    # -- loading ---------------------------------------------------------
+
+    def _load_catalog(self, conn: sqlite3.Connection) -> None:
+        self._catalog = conn.execute(CATALOG_QUERY).fetchall()
+        self._capacity = {row[0]: row[3] for row in self._catalog}
+
+    def _load_all(self, conn: sqlite3.Connection) -> None:
+        self._last_change_id = conn.execute(
+            "SELECT COALESCE(MAX(change_id), 0) FROM occupancy_change_log"
+        ).fetchone()[0]
+        self._load_catalog(conn)
+        self._rooms = {}
+        self._bookings = {}
+        rows = conn.execute(ACTIVE_BOOKINGS_QUERY, INACTIVE_STATUS_CODES)
+        for booking_id, room_id, check_in, check_out in rows:
+            self._add(booking_id, room_id, check_in, check_out)
+
+    def _add(self, booking_id: int, room_id: int, check_in: str, check_out: str) -> None:
+        start = normalise_datetime(check_in)
+        end = normalise_datetime(check_out)
+        intervals = self._rooms.get(room_id)
+        if intervals is None:
+            intervals = self._rooms[room_id] = RoomIntervals()
+        intervals.add(booking_id, start, end)
+        self._bookings[booking_id] = (room_id, start, end)
+
+    def _remove(self, booking_id: int) -> Optional[Tuple[int, str, str]]:
+        previous = self._bookings.pop(booking_id, None)
+        if previous is not None:
+            self._rooms[previous[0]].remove(booking_id)
+        return previous
+
+    def _reload_bookings(self, conn: sqlite3.Connection,
+                         booking_ids: List[int]) -> List[Tuple[int, str, str]]:
+        """Re-reads ``booking_ids``; returns every stay removed or added."""
+        touched = []
+        for offset in range(0, len(booking_ids), _IN_BATCH):
+            batch = booking_ids[offset:offset + _IN_BATCH]
+            for booking_id in batch:
+                previous = self._remove(booking_id)
+                if previous is not None:
+                    touched.append(previous)
+            rows = conn.execute(
+                "SELECT b.booking_id, b.room_id, b.check_in_datetime, b.check_out_datetime"
+                " FROM booking b JOIN booking_status s ON s.booking_status_id = b.status_id"
+                " WHERE b.booking_id IN ({}) AND s.code NOT IN ({})".format(
+                    ", ".join("?" * len(batch)),
+                    ", ".join("?" * len(INACTIVE_STATUS_CODES)),
+                ),
+                (*batch, *INACTIVE_STATUS_CODES),
+            )
+            for booking_id, room_id, check_in, check_out in rows:
+                self._add(booking_id, room_id, check_in, check_out)
+                touched.append(self._bookings[booking_id])
+        return touched
+
+    def sync(self, conn: Optional[sqlite3.Connection] = None, force: bool = False) -> None:
+        """Applies any writes logged since the last sync.
+
+        Unless ``force`` is set, the change log is probed at most once per
+        ``sync_interval``. Falls back to a full reload on first use or when
+        the log has been pruned past the last change this engine saw.
+        """
+        now = time.monotonic()
+        if (not force and self._last_change_id is not None
+                and now - self._last_sync < self.sync_interval):
+            return
+        if conn is None:
+            with db.connection(self.db_path) as pooled:
+                return self.sync(pooled, force=True)
+
+        with self._lock:
+            self._last_sync = now
+            if self._last_change_id is None:
+                self._load_all(conn)
+                self._notify(None)
+                return
+            first_id, last_id = conn.execute(
+                "SELECT (SELECT MIN(change_id) FROM occupancy_change_log),"
+                " (SELECT MAX(change_id) FROM occupancy_change_log)"
+            ).fetchone()
+            if last_id is None or last_id <= self._last_change_id:
+                return
+            if first_id > self._last_change_id + 1:
+                self._load_all(conn)
+                self._notify(None)
+                return
+
+            changed = conn.execute(
+                "SELECT change_id, booking_id FROM occupancy_change_log WHERE change_id > ?",
+                (self._last_change_id,),
+            ).fetchall()
+            booking_ids = {booking_id for _, booking_id in changed if booking_id is not None}
+            catalog_changed = len(booking_ids) < len(changed)
+            if catalog_changed:
+                self._load_catalog(conn)
+            touched = self._reload_bookings(conn, sorted(booking_ids))
+            self._last_change_id = changed[-1][0]
+            if catalog_changed:
+                self._notify(None)
+            elif touched:
+                self._notify([
+                    (room_id, self._capacity.get(room_id), start, end)
+                    for room_id, start, end in touched
+                ])
+
+    # -- queries ---------------------------------------------------------
+
+    def free_rooms(self, num_people: int, check_in_datetime: str,
+                   check_out_datetime: str) -> List[Tuple]:
+        """Returns catalog rows of active rooms free for the whole window.
+
+        Rows are ordered by price ascending, then capacity descending, and
+        only rooms with ``capacity >= num_people`` are considered.
+
+        Raises:
+            ValueError: If either datetime is not ISO 8601.
+        """
+        start = normalise_datetime(check_in_datetime)
+        end = normalise_datetime(check_out_datetime)
+        self.sync()
+        with self._lock:
+            rooms = self._rooms
+            free = []
+            for row in self._catalog:
+                if row[3] < num_people:
+                    continue
+                intervals = rooms.get(row[0])
+                if intervals is not None and intervals.overlaps(start, end):
+                    continue
+                free.append(row)
+            return free
+
+    def free_rooms_multi(self, num_people: int,
+                         windows: List[Tuple[str, str]]) -> List[List[Tuple]]:
+        """Evaluates several stay windows in one pass over the catalog.
+
+        Each window is a ``(check_in, check_out)`` pair of ISO datetimes.
+        Returns one list of free catalog rows per window, in the same order
+        and with the same ordering and capacity rules as ``free_rooms``.
+
+        Raises:
+            ValueError: If any datetime is not ISO 8601.
+        """
+        bounds = [(normalise_datetime(start), normalise_datetime(end)) for start, end in windows]
+        self.sync()
+        results: List[List[Tuple]] = [[] for _ in bounds]
+        with self._lock:
+            rooms = self._rooms
+            for row in self._catalog:
+                if row[3] < num_people:
+                    continue
+                intervals = rooms.get(row[0])
+                for index, (start, end) in enumerate(bounds):
+                    if intervals is None or not intervals.overlaps(start, end):
+                        results[index].append(row)
+        return results
+
+    def is_free(self, room_id: int, check_in_datetime: str,
+                check_out_datetime: str) -> bool:
+        """True if ``room_id`` has no active booking overlapping the window."""
+        start = normalise_datetime(check_in_datetime)
+        end = normalise_datetime(check_out_datetime)
+        self.sync()
+        with self._lock:
+            intervals = self._rooms.get(room_id)
+            return intervals is None or not intervals.overlaps(start, end)
+
+
+_engines: Dict[str, OccupancyEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(db_path: Optional[str] = None) -> OccupancyEngine:
+    """Returns the process-wide occupancy engine for ``db_path``."""
+    path = db.resolve(db_path)
+    engine = _engines.get(path)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(path)
+            if engine is None:
+                engine = _engines[path] = OccupancyEngine(path)
+    return engine
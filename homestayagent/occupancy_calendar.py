@@ -0,0 +1,256 @@
+import sqlite3
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from . import db, occupancy, shards, write_queue
+
+# Consumer name of the calendar in occupancy_watermark
+WATERMARK_NAME = 'room_day_occupancy'
+_WATERMARK_QUERY = "SELECT change_id FROM occupancy_watermark WHERE name = ?"
+_LAST_CHANGE_QUERY = "SELECT COALESCE(MAX(change_id), 0) FROM occupancy_change_log"
+
+_INSERT = "INSERT OR IGNORE INTO room_day_occupancy (room_id, day, booking_id) VALUES (?, ?, ?)"
+
+# One row per active room with the occupied days of the range, so a whole
+# month for a building or room type is a single indexed query
+HEATMAP_QUERY = """
+    SELECT r.room_id, r.room_number, rt.name, b.name,
+           (SELECT group_concat(DISTINCT o.day)
+              FROM room_day_occupancy o
+             WHERE o.room_id = r.room_id AND o.day >= ? AND o.day < ?),
+           r.building_id
+    FROM room r
+    JOIN room_type rt ON r.room_type_id = rt.room_type_id
+    JOIN building b ON r.building_id = b.building_id
+    WHERE r.is_active = 1
+      AND (? IS NULL OR r.building_id = ?)
+      AND (? IS NULL OR r.room_type_id = ?)
+    ORDER BY r.building_id, rt.price, r.room_id
+"""
+
+
+def stay_days(check_in_datetime: str, check_out_datetime: str) -> List[str]:
+    """Calendar days ('YYYY-MM-DD') whose night a stay occupies.
+
+    A stay from 10 May 14:00 to 12 May 11:00 occupies the 10th and 11th.
+    A stay that starts and ends on the same date occupies that date.
+    """
+    first = date.fromisoformat(occupancy.normalise_datetime(check_in_datetime)[:10])
+    last = date.fromisoformat(occupancy.normalise_datetime(check_out_datetime)[:10])
+    nights = max(1, (last - first).days)
+    return [(first + timedelta(days=offset)).isoformat() for offset in range(nights)]
+
+
+def _day_rows(rows: Iterable[Tuple[int, int, str, str]]) -> Iterable[Tuple[int, str, int]]:
+    for booking_id, room_id, check_in, check_out in rows:
+        for day in stay_days(check_in, check_out):
+            yield room_id, day, booking_id
+
+
+def _rebuild(conn: sqlite3.Connection, last_change_id: int) -> None:
+    conn.execute("DELETE FROM room_day_occupancy")
+    conn.executemany(
+        _INSERT,
+        _day_rows(conn.execute(occupancy.ACTIVE_BOOKINGS_QUERY, occupancy.INACTIVE_STATUS_CODES)),
+    )
+    _set_watermark(conn, last_change_id)
+
+
+def _set_watermark(conn: sqlite3.Connection, change_id: int) -> None:
+    conn.execute(
+        "INSERT INTO occupancy_watermark (name, change_id) VALUES (?, ?)"
+        " ON CONFLICT(name) DO UPDATE SET change_id = excluded.change_id",
+        (WATERMARK_NAME, change_id),
+    )
+
+
+def refresh(conn: sqlite3.Connection, build: bool = False) -> Optional[int]:
+    """Brings room_day_occupancy up to date with occupancy_change_log.
+
+    Only bookings logged since the calendar's watermark are re-read, so the
+    cost is proportional to the writes since the last refresh. Call it
+    inside the write transaction that changed the bookings (booking_tool
+    does) to keep the calendar exactly in step with them; writes made
+    elsewhere are picked up by the next refresh.
+
+    The first refresh, or one after the log was pruned past the
+    watermark, rebuilds the table from all active bookings. That only
+    happens when ``build`` is set, so a write path never pays for it;
+    readers leave it to ``update_calendar`` on the write queue.
+
+    Args:
+        conn: Connection; a transaction is opened if none is active and
+            committed before returning.
+        build: Allow a full rebuild.
+
+    Returns:
+        The change_id the calendar is now current to, or None if it was
+        not built.
+    """
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        # Cheap read-only check first, so an up-to-date calendar never
+        # takes the write lock
+        row = conn.execute(_WATERMARK_QUERY, (WATERMARK_NAME,)).fetchone()
+        last_id = conn.execute(_LAST_CHANGE_QUERY).fetchone()[0]
+        if row is not None and row[0] == last_id:
+            return last_id
+        if row is None and not build:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(_WATERMARK_QUERY, (WATERMARK_NAME,)).fetchone()
+        first_id, last_id = conn.execute(
+            "SELECT (SELECT MIN(change_id) FROM occupancy_change_log),"
+            " (SELECT COALESCE(MAX(change_id), 0) FROM occupancy_change_log)"
+        ).fetchone()
+        if row is None or (first_id is not None and first_id > row[0] + 1):
+            if build:
+                _rebuild(conn, last_id)
+            else:
+                last_id = None
+        elif last_id > row[0]:
+            booking_ids = sorted({
+                booking_id for (booking_id,) in conn.execute(
+                    "SELECT booking_id FROM occupancy_change_log"
+                    " WHERE change_id > ? AND booking_id IS NOT NULL", (row[0],)
+                )
+            })
+            _apply(conn, booking_ids)
+            _set_watermark(conn, last_id)
+        if owns_transaction:
+            conn.commit()
+        return last_id
+    except BaseException:
+        if owns_transaction:
+            conn.rollback()
+        raise
+
+
+def _apply(conn: sqlite3.Connection, booking_ids: List[int]) -> None:
+    """Re-derives the calendar rows of ``booking_ids``."""
+    status_params = ", ".join("?" * len(occupancy.INACTIVE_STATUS_CODES))
+    for offset in range(0, len(booking_ids), occupancy._IN_BATCH):
+        batch = booking_ids[offset:offset + occupancy._IN_BATCH]
+        placeholders = ", ".join("?" * len(batch))
+        conn.execute(
+            f"DELETE FROM room_day_occupancy WHERE booking_id IN ({placeholders})", batch
+        )
+        rows = conn.execute(
+            "SELECT b.booking_id, b.room_id, b.check_in_datetime, b.check_out_datetime"
+            " FROM booking b JOIN booking_status s ON s.booking_status_id = b.status_id"
+            f" WHERE b.booking_id IN ({placeholders}) AND s.code NOT IN ({status_params})",
+            (*batch, *occupancy.INACTIVE_STATUS_CODES),
+        ).fetchall()
+        conn.executemany(_INSERT, _day_rows(rows))
+
+
+def is_current(conn: sqlite3.Connection) -> bool:
+    """Whether room_day_occupancy reflects every logged change. Read-only."""
+    row = conn.execute(_WATERMARK_QUERY, (WATERMARK_NAME,)).fetchone()
+    return row is not None and row[0] == conn.execute(_LAST_CHANGE_QUERY).fetchone()[0]
+
+
+def update_calendar(conn: sqlite3.Connection) -> Tuple[dict, write_queue.AfterCommit]:
+    """Write op that catches the calendar up, building it if needed; see ``refresh``."""
+    try:
+        return {'change_id': refresh(conn, build=True)}, None
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}, None
+
+
+def _heatmap_rows(params: Tuple) -> List[Tuple]:
+    with db.connection() as conn:
+        current = is_current(conn)
+    if not current:
+        # Built or caught up by the database's writer, not on a reader's
+        # pooled connection
+        result = write_queue.run(update_calendar)
+        if 'error' in result:
+            # Reported like any other database error of the tool
+            raise sqlite3.OperationalError(result['error'].removeprefix("Database error: "))
+    with db.connection() as conn:
+        return conn.execute(HEATMAP_QUERY, params).fetchall()
+
+
+def occupancy_heatmap(month: str, building_id: Optional[int] = None,
+                      room_type_id: Optional[int] = None) -> dict:
+    """Day-by-day occupancy of every room for one month, for calendar views
+    and "which dates are free?" questions.
+
+    Args:
+        month (str): The month, "YYYY-MM".
+        building_id (int, optional): Only rooms in this building.
+        room_type_id (int, optional): Only rooms of this room type.
+
+    Returns:
+        dict: On success:
+              {
+                  'month': str,
+                  'first_day': str,          # 'YYYY-MM-01'
+                  'days': int,               # days in the month
+                  'legend': str,
+                  'rooms': [
+                      {
+                          'room_id': int,
+                          'room_number': str,
+                          'type': str,
+                          'building': str,
+                          'occupancy': str   # one character per day,
+                                             # '1' occupied, '0' free
+                      },
+                      ...
+                  ],
+                  'free_rooms_per_day': [int, ...]
+              }
+              A day is occupied when the room is booked for that night.
+              On failure:
+              {
+                  'error': str
+              }
+    """
+    try:
+        first = date.fromisoformat(f"{month}-01")
+    except ValueError:
+        return {'error': "Invalid month. Please use YYYY-MM."}
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    days = (following - first).days
+
+    params = (first.isoformat(), following.isoformat(),
+              building_id, building_id, room_type_id, room_type_id)
+    try:
+        if building_id is not None:
+            with db.use(shards.building_location(building_id)):
+                rows = _heatmap_rows(params)
+        else:
+            # Every shard's calendar, back in building order
+            per_shard = shards.fan_out(_heatmap_rows, params)
+            rows = per_shard[0] if len(per_shard) == 1 else sorted(
+                (row for shard_rows in per_shard for row in shard_rows), key=lambda row: row[5]
+            )
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}
+
+    rooms = []
+    free_per_day = [len(rows)] * days
+    for room_id, room_number, type_name, building, occupied, _ in rows:
+        cells = ['0'] * days
+        for day in (occupied.split(',') if occupied else ()):
+            index = int(day[8:10]) - 1
+            cells[index] = '1'
+            free_per_day[index] -= 1
+        rooms.append({
+            'room_id': room_id,
+            'room_number': room_number,
+            'type': type_name,
+            'building': building,
+            'occupancy': ''.join(cells),
+        })
+    return {
+        'month': month,
+        'first_day': first.isoformat(),
+        'days': days,
+        'legend': "occupancy has one character per day of the month: 1 = booked, 0 = free",
+        'rooms': rooms,
+        'free_rooms_per_day': free_per_day,
+    }
@@ -0,0 +1,520 @@
+"""PostgreSQL storage backend.
+
+Selected with ``HOTEL_DB_BACKEND=postgres`` (connection string in
+``HOTEL_DATABASE_URL``), or by passing a ``postgresql://`` URL wherever a
+database path is accepted. The tools keep issuing the same SQL through the
+same pool API as with SQLite: ``PgConnection`` exposes the subset of
+``sqlite3.Connection`` they use, rewrites the few SQLite-only constructs
+(see ``translate``) and re-raises driver errors as the matching
+``sqlite3`` exceptions, so the existing error handling applies unchanged.
+
+Writers keep SQLite's one-writer-at-a-time semantics: ``BEGIN IMMEDIATE``
+takes a transaction-scoped advisory lock, which also makes
+occupancy_change_log ids commit in order. On top of the application's
+overlap check, an exclusion constraint on (room, stay range) makes
+overlapping active bookings impossible at the storage level.
+
+Create the schema and copy the shipped data with:
+    python -m homestayagent.pg_backend init --from homestayagent/hotel.db
+"""
+import argparse
+import functools
+import re
+import sqlite3
+import time
+from typing import Any, Iterable, Iterator, Sequence
+
+from . import db, metrics
+
+try:
+    import psycopg
+    from psycopg import ClientCursor
+    from psycopg.pq import TransactionStatus
+except ImportError:  # pragma: no cover - optional dependency
+    psycopg = None
+
+# Advisory lock key standing in for SQLite's database write lock
+WRITE_LOCK_KEY = 0x484f544c  # "HOTL"
+
+# Booking status ids are fixed so the exclusion constraint can name the
+# inactive one; they match the ids shipped in hotel.db
+CANCELLED_STATUS_ID = 4
+
+_NOW = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+# Base tables (shipped in hotel.db for SQLite) plus everything db.SCHEMA
+# adds. Datetimes stay ISO-8601 TEXT as in SQLite, so comparisons and the
+# values the tools return are identical on both backends; hotel_ts()
+# converts them for the exclusion constraint. There are no foreign keys,
+# matching SQLite, which does not enforce them without PRAGMA
+# foreign_keys (and the shipped data relies on that).
+SCHEMA = f"""
+SELECT pg_advisory_xact_lock({WRITE_LOCK_KEY});
+CREATE OR REPLACE FUNCTION hotel_ts(value text) RETURNS timestamp
+    LANGUAGE sql IMMUTABLE STRICT AS $$ SELECT value::timestamp $$;
+
+CREATE TABLE IF NOT EXISTS guest (
+    guest_id            INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name                TEXT    NOT NULL,
+    phone               TEXT    NOT NULL UNIQUE,
+    city                TEXT    NOT NULL,
+    created_at          TEXT    NOT NULL DEFAULT {_NOW}
+);
+CREATE TABLE IF NOT EXISTS building (
+    building_id         INTEGER PRIMARY KEY,
+    name                TEXT    NOT NULL,
+    has_lift            INTEGER NOT NULL DEFAULT 0,
+    total_flats         INTEGER NOT NULL,
+    created_at          TEXT    NOT NULL DEFAULT {_NOW}
+);
+CREATE TABLE IF NOT EXISTS room_type (
+    room_type_id        INTEGER PRIMARY KEY,
+    building_id         INTEGER NOT NULL,
+    name                TEXT    NOT NULL,
+    capacity            INTEGER NOT NULL,
+    price               DOUBLE PRECISION NOT NULL,
+    extra_bed_included  INTEGER NOT NULL DEFAULT 0,
+    extra_bed_price     DOUBLE PRECISION DEFAULT 0,
+    features            TEXT,
+    created_at          TEXT    NOT NULL DEFAULT {_NOW}
+);
+CREATE TABLE IF NOT EXISTS room (
+    room_id             INTEGER PRIMARY KEY,
+    room_type_id        INTEGER NOT NULL,
+    building_id         INTEGER NOT NULL,
+    room_number         TEXT    NOT NULL,
+    floor               INTEGER,
+    is_active           INTEGER NOT NULL DEFAULT 1,
+    created_at          TEXT    NOT NULL DEFAULT {_NOW}
+);
+CREATE TABLE IF NOT EXISTS booking_status (
+    booking_status_id   INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    code                TEXT    NOT NULL UNIQUE,
+    description         TEXT,
+    created_at          TEXT    NOT NULL DEFAULT {_NOW}
+);
+INSERT INTO booking_status (booking_status_id, code, description) VALUES
+    (1, 'REQUESTED', 'Initial booking'),
+    (2, 'ADVANCE_PAID', 'Advance paid'),
+    (3, 'CONFIRMED', 'Confirmed'),
+    ({CANCELLED_STATUS_ID}, 'CANCELLED', 'Cancelled')
+ON CONFLICT DO NOTHING;
+CREATE TABLE IF NOT EXISTS rate_rule (
+    rule_id             INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    threshold_time      TEXT    NOT NULL,
+    extra_day_charge    INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS booking (
+    booking_id            INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    guest_id              INTEGER NOT NULL,
+    building_id           INTEGER NOT NULL,
+    room_id               INTEGER NOT NULL,
+    num_persons           INTEGER NOT NULL,
+    check_in_datetime     TEXT    NOT NULL,
+    check_out_datetime    TEXT    NOT NULL,
+    days_charged          INTEGER NOT NULL,
+    extra_beds            INTEGER NOT NULL DEFAULT 0,
+    extra_bed_price       DOUBLE PRECISION NOT NULL,
+    subtotal_amount       DOUBLE PRECISION NOT NULL,
+    taxes_and_fees        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_price           DOUBLE PRECISION NOT NULL,
+    advance_due_amount    DOUBLE PRECISION NOT NULL,
+    advance_paid_amount   DOUBLE PRECISION DEFAULT 0,
+    advance_paid_datetime TEXT,
+    status_id             INTEGER NOT NULL,
+    status_updated_at     TEXT    NOT NULL DEFAULT {_NOW},
+    created_at            TEXT    NOT NULL DEFAULT {_NOW},
+    updated_at            TEXT    NOT NULL DEFAULT {_NOW},
+    cancellation_reason   TEXT,
+    cancelled_at          TEXT,
+    -- No two active bookings of a room may overlap. int4range over the
+    -- single room id stands in for btree_gist equality, which is not
+    -- always installed; ranges are [check_in, check_out) so back-to-back
+    -- stays do not collide.
+    CONSTRAINT booking_no_overlap EXCLUDE USING gist (
+        int4range(room_id, room_id, '[]') WITH &&,
+        tsrange(hotel_ts(check_in_datetime), hotel_ts(check_out_datetime)) WITH &&
+    ) WHERE (status_id <> {CANCELLED_STATUS_ID})
+);
+
+CREATE INDEX IF NOT EXISTS idx_booking_room_window
+    ON booking (room_id, check_in_datetime, check_out_datetime, status_id);
+CREATE INDEX IF NOT EXISTS idx_room_type_capacity_price
+    ON room_type (capacity, price);
+CREATE INDEX IF NOT EXISTS idx_room_type_price_capacity
+    ON room_type (price, capacity);
+CREATE INDEX IF NOT EXISTS idx_room_room_type_floor ON room (room_type_id, floor);
+-- Bookings with part of the advance still to collect (reports.py)
+CREATE INDEX IF NOT EXISTS idx_booking_advance_outstanding
+    ON booking (check_out_datetime, building_id, status_id, check_in_datetime,
+                advance_due_amount, advance_paid_amount)
+    WHERE advance_due_amount > COALESCE(advance_paid_amount, 0);
+-- Text search over room type names and features (also without hyphens),
+-- in place of SQLite's room_type_fts; the expression matches room_filters'
+CREATE INDEX IF NOT EXISTS idx_room_type_features ON room_type USING gin (to_tsvector('simple',
+    name || ' ' || COALESCE(features, '') || ' ' || replace(name || ' ' || COALESCE(features, ''), '-', '')));
+
+CREATE TABLE IF NOT EXISTS occupancy_change_log (
+    change_id   BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    booking_id  INTEGER
+);
+CREATE TABLE IF NOT EXISTS room_hold (
+    hold_id             INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    room_id             INTEGER NOT NULL,
+    guest_id            INTEGER NOT NULL,
+    check_in_datetime   TEXT NOT NULL,
+    check_out_datetime  TEXT NOT NULL,
+    expires_at          DOUBLE PRECISION NOT NULL,
+    created_at          TEXT DEFAULT {_NOW}
+);
+CREATE INDEX IF NOT EXISTS idx_room_hold_room ON room_hold (room_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_room_hold_expiry ON room_hold (expires_at);
+CREATE TABLE IF NOT EXISTS occupancy_watermark (
+    name       TEXT PRIMARY KEY,
+    change_id  BIGINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS room_day_occupancy (
+    room_id     INTEGER NOT NULL,
+    day         TEXT NOT NULL,
+    booking_id  INTEGER NOT NULL,
+    PRIMARY KEY (room_id, day, booking_id)
+);
+CREATE INDEX IF NOT EXISTS idx_room_day_occupancy_booking
+    ON room_day_occupancy (booking_id);
+CREATE TABLE IF NOT EXISTS booking_archive (
+    booking_id            INTEGER PRIMARY KEY,
+    guest_id              INTEGER NOT NULL,
+    building_id           INTEGER NOT NULL,
+    room_id               INTEGER NOT NULL,
+    num_persons           INTEGER NOT NULL,
+    check_in_datetime     TEXT    NOT NULL,
+    check_out_datetime    TEXT    NOT NULL,
+    days_charged          INTEGER NOT NULL,
+    extra_beds            INTEGER NOT NULL DEFAULT 0,
+    extra_bed_price       DOUBLE PRECISION NOT NULL,
+    subtotal_amount       DOUBLE PRECISION NOT NULL,
+    taxes_and_fees        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_price           DOUBLE PRECISION NOT NULL,
+    advance_due_amount    DOUBLE PRECISION NOT NULL,
+    advance_paid_amount   DOUBLE PRECISION DEFAULT 0,
+    advance_paid_datetime TEXT,
+    status_id             INTEGER NOT NULL,
+    status_updated_at     TEXT    NOT NULL,
+    created_at            TEXT    NOT NULL,
+    updated_at            TEXT    NOT NULL,
+    cancellation_reason   TEXT,
+    cancelled_at          TEXT,
+    archived_at           TEXT    NOT NULL DEFAULT {_NOW}
+);
+CREATE INDEX IF NOT EXISTS idx_booking_archive_check_in
+    ON booking_archive (check_in_datetime);
+CREATE INDEX IF NOT EXISTS idx_booking_archive_guest ON booking_archive (guest_id);
+CREATE OR REPLACE VIEW booking_history AS
+    SELECT *, NULL::text AS archived_at FROM booking
+    UNION ALL
+    SELECT * FROM booking_archive;
+
+CREATE OR REPLACE FUNCTION hotel_log_booking_change() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO occupancy_change_log (booking_id)
+    VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.booking_id ELSE NEW.booking_id END);
+    RETURN NULL;
+END $$;
+CREATE OR REPLACE FUNCTION hotel_log_catalog_change() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO occupancy_change_log (booking_id) VALUES (NULL);
+    RETURN NULL;
+END $$;
+CREATE OR REPLACE TRIGGER trg_booking_log
+AFTER INSERT OR DELETE
+   OR UPDATE OF room_id, check_in_datetime, check_out_datetime, status_id ON booking
+FOR EACH ROW EXECUTE FUNCTION hotel_log_booking_change();
+CREATE OR REPLACE TRIGGER trg_room_log AFTER INSERT OR UPDATE OR DELETE ON room
+FOR EACH ROW EXECUTE FUNCTION hotel_log_catalog_change();
+CREATE OR REPLACE TRIGGER trg_room_type_log AFTER INSERT OR UPDATE OR DELETE ON room_type
+FOR EACH ROW EXECUTE FUNCTION hotel_log_catalog_change();
+CREATE OR REPLACE TRIGGER trg_building_log AFTER UPDATE ON building
+FOR EACH ROW EXECUTE FUNCTION hotel_log_catalog_change();
+CREATE OR REPLACE TRIGGER trg_rate_rule_log AFTER INSERT OR UPDATE OR DELETE ON rate_rule
+FOR EACH ROW EXECUTE FUNCTION hotel_log_catalog_change();
+"""
+
+# Tables copied by ``init --from``, parents first
+COPY_TABLES = ("building", "room_type", "room", "booking_status", "rate_rule", "guest", "booking")
+# Identity columns whose sequences must move past copied ids
+_IDENTITY_COLUMNS = (("guest", "guest_id"), ("booking_status", "booking_status_id"),
+                     ("rate_rule", "rule_id"), ("booking", "booking_id"),
+                     ("room_hold", "hold_id"))
+
+_GROUP_CONCAT = re.compile(r"group_concat\(\s*(DISTINCT\s+)?([^()]+?)\s*\)", re.IGNORECASE)
+_INSERT_OR_IGNORE = re.compile(r"^\s*INSERT\s+OR\s+IGNORE\s+INTO", re.IGNORECASE)
+_CURRENT_TIMESTAMP = re.compile(r"\bCURRENT_TIMESTAMP\b", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql: str, bind: bool = True) -> str:
+    """Rewrites a statement written for SQLite into PostgreSQL (memoised).
+
+    Handles what the tools actually use: ``?`` placeholders (and literal
+    ``%``, which psycopg would read as one), ``INSERT OR IGNORE``,
+    ``group_concat`` and ``CURRENT_TIMESTAMP`` (stored as UTC text, like
+    SQLite's). Everything else is already portable.
+
+    Args:
+        sql (str): SQLite statement.
+        bind (bool): Whether parameters will be bound, i.e. whether
+            placeholders and ``%`` need converting.
+    """
+    if bind:
+        parts = re.split(r"('(?:[^']|'')*')", sql)
+        for index, part in enumerate(parts):
+            part = part.replace("%", "%%")
+            # Odd parts are string literals, where '?' is just a character
+            parts[index] = part if index % 2 else part.replace("?", "%s")
+        sql = "".join(parts)
+    if _INSERT_OR_IGNORE.match(sql):
+        sql = _INSERT_OR_IGNORE.sub("INSERT INTO", sql, count=1).rstrip().rstrip(";")
+        sql += " ON CONFLICT DO NOTHING"
+    sql = _GROUP_CONCAT.sub(
+        lambda m: f"string_agg({m.group(1) or ''}({m.group(2)})::text, ',')", sql
+    )
+    return _CURRENT_TIMESTAMP.sub(_NOW, sql)
+
+
+@functools.lru_cache(maxsize=64)
+def _is_begin_immediate(sql: str) -> bool:
+    return " ".join(sql.split()).upper() == "BEGIN IMMEDIATE"
+
+
+def _sqlite_error(error: Exception) -> sqlite3.Error:
+    """The sqlite3 exception the tools already handle for a psycopg error."""
+    if isinstance(error, psycopg.IntegrityError):
+        return sqlite3.IntegrityError(str(error))
+    if isinstance(error, psycopg.OperationalError):
+        return sqlite3.OperationalError(str(error))
+    return sqlite3.DatabaseError(str(error))
+
+
+class PgCursor:
+    """sqlite3.Cursor look-alike over a psycopg cursor, with the same metrics
+    as ``metrics.InstrumentedCursor``."""
+
+    def __init__(self, cursor: "psycopg.Cursor"):
+        self._cursor = cursor
+        self._label = ""
+
+    def _run(self, method, sql: str, params) -> "PgCursor":
+        self._label = metrics.statement_label(sql) if metrics.ENABLED else ""
+        started = time.perf_counter()
+        try:
+            if _is_begin_immediate(sql):
+                self._cursor.execute("BEGIN")
+                self._cursor.execute(f"SELECT pg_advisory_xact_lock({WRITE_LOCK_KEY})")
+            else:
+                method(translate(sql, params is not None), params)
+        except psycopg.Error as error:
+            if metrics.ENABLED:
+                metrics.registry.inc("sql_errors_total", statement=self._label)
+            raise _sqlite_error(error) from error
+        finally:
+            if metrics.ENABLED:
+                metrics.registry.observe("sql_statement_seconds",
+                                         time.perf_counter() - started, statement=self._label)
+        return self
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> "PgCursor":
+        return self._run(self._cursor.execute, sql, tuple(parameters) or None)
+
+    def executemany(self, sql: str, seq_of_parameters: Iterable[Sequence[Any]]) -> "PgCursor":
+        rows = [tuple(params) for params in seq_of_parameters]
+        if not rows:
+            return self
+        return self._run(self._cursor.executemany, sql, rows)
+
+    def _rows(self, rows: list) -> list:
+        if metrics.ENABLED:
+            metrics.registry.observe("sql_rows_returned", len(rows), statement=self._label)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone() if self._cursor.description else None
+        if metrics.ENABLED:
+            metrics.registry.observe("sql_rows_returned", 0 if row is None else 1,
+                                     statement=self._label)
+        return row
+
+    def fetchmany(self, size: int = 1) -> list:
+        return self._rows(self._cursor.fetchmany(size) if self._cursor.description else [])
+
+    def fetchall(self) -> list:
+        return self._rows(self._cursor.fetchall() if self._cursor.description else [])
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._cursor) if self._cursor.description else iter(())
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self) -> None:
+        # PostgreSQL has no rowid; inserts use RETURNING instead
+        return None
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class PgConnection:
+    """The subset of ``sqlite3.Connection`` the tools use, over psycopg.
+
+    The connection runs in autocommit mode and transactions are opened by
+    the statements the tools already issue (``BEGIN IMMEDIATE``,
+    savepoints), so ``in_transaction``, ``commit`` and ``rollback`` behave
+    as they do with SQLite's default isolation level.
+    """
+
+    def __init__(self, raw: "psycopg.Connection"):
+        self._raw = raw
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._raw.info.transaction_status in (
+            TransactionStatus.INTRANS, TransactionStatus.INERROR, TransactionStatus.ACTIVE
+        )
+
+    def cursor(self) -> PgCursor:
+        return PgCursor(self._raw.cursor())
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> PgCursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Iterable[Sequence[Any]]) -> PgCursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script: str) -> None:
+        try:
+            self._raw.execute(script)
+        except psycopg.Error as error:
+            raise _sqlite_error(error) from error
+
+    def _end(self, statement: str) -> None:
+        if not self.in_transaction:
+            return
+        try:
+            self._raw.execute(statement)
+        except psycopg.Error as error:
+            raise _sqlite_error(error) from error
+
+    def commit(self) -> None:
+        self._end("COMMIT")
+
+    def rollback(self) -> None:
+        self._end("ROLLBACK")
+
+    def close(self) -> None:
+        self._raw.close()
+
+
+def connect(url: str, busy_timeout_ms: int = db.BUSY_TIMEOUT_MS) -> PgConnection:
+    """Opens a ``PgConnection``; lock waits give up after ``busy_timeout_ms``.
+
+    Raises:
+        sqlite3.OperationalError: If psycopg is not installed or the server
+            cannot be reached.
+    """
+    if psycopg is None:
+        raise sqlite3.OperationalError(
+            "the postgres backend needs psycopg: pip install 'psycopg[binary]'"
+        )
+    try:
+        # Client-side binding, like sqlite3: parameters are typed by value
+        # (so '? IS NULL' works) and no statement is prepared per query
+        raw = psycopg.connect(url, autocommit=True, cursor_factory=ClientCursor)
+        raw.execute(f"SET lock_timeout = {int(busy_timeout_ms)}")
+    except psycopg.Error as error:
+        raise _sqlite_error(error) from error
+    return PgConnection(raw)
+
+
+class PostgresPool(db.ConnectionPool):
+    """``db.ConnectionPool`` of ``PgConnection``s to one PostgreSQL database.
+
+    Args:
+        url (str): libpq connection string, e.g. ``postgresql://host/hotel``.
+        size (int): Maximum number of open connections.
+        busy_timeout_ms (int): How long a statement waits for a lock
+            (including the write lock) before failing.
+    """
+
+    def _connect(self) -> PgConnection:
+        conn = connect(self.db_path, self.busy_timeout_ms)
+        if not self._schema_ready:
+            with self._lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+
+def copy_from_sqlite(conn: PgConnection, source_path: str) -> dict:
+    """Copies the base tables of a SQLite hotel database into empty tables.
+
+    Tables that already have rows are left alone. Returns the number of
+    rows copied per table.
+    """
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    copied = {}
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for table in COPY_TABLES:
+            columns = [row[1] for row in source.execute(f"PRAGMA table_info({table})")]
+            rows = source.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+            if table != "booking_status" and conn.execute(
+                f"SELECT 1 FROM {table} LIMIT 1"
+            ).fetchone():
+                continue
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)})"
+                f" VALUES ({', '.join('?' * len(columns))}) ON CONFLICT DO NOTHING",
+                rows,
+            )
+            copied[table] = len(rows)
+        for table, column in _IDENTITY_COLUMNS:
+            conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'),"
+                f" COALESCE(MAX({column}), 0) + 1, false) FROM {table}"
+            )
+        conn.commit()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        source.close()
+    return copied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Set up the PostgreSQL hotel database")
+    parser.add_argument("command", choices=["init"])
+    parser.add_argument("--url", default=db.DATABASE_URL, help="Connection string")
+    parser.add_argument("--from", dest="source", metavar="SQLITE_DB",
+                        help="Copy rooms, guests and bookings from this SQLite database")
+    args = parser.parse_args()
+
+    pool = PostgresPool(args.url, size=1)
+    with pool.connection() as conn:
+        print("schema ready")
+        if args.source:
+            for table, count in copy_from_sqlite(conn, args.source).items():
+                print(f"{table}: {count} rows")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import functools
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import db, occupancy, shards
+
+# Commercial terms the coordinator prompt used to ask the LLM to apply
+MAX_EXTRA_BEDS = 2
+TAX_RATE = 0.0
+ADVANCE_RATE = 0.10
+
+# Used when the rate_rule table is empty
+DEFAULT_RATE_RULE = ('21:00', True)
+
+ROOM_PRICING_QUERY = """
+    SELECT r.room_id, r.building_id, rt.capacity, rt.price,
+           rt.extra_bed_included, rt.extra_bed_price
+    FROM room r
+    JOIN room_type rt ON r.room_type_id = rt.room_type_id
+    WHERE r.room_id IN ({})
+"""
+
+# Cached rate rule per database (see db.resolve)
+_rate_rules: Dict[str, Tuple[str, bool]] = {}
+_rate_rule_lock = threading.Lock()
+_listening: set = set()
+
+
+class QuoteError(ValueError):
+    """Raised when a stay cannot be priced (bad dates, too many extra beds)."""
+
+
+def _on_catalog_change(path: str, changes) -> None:
+    # rate_rule edits are logged as catalog changes (changes is None)
+    if changes is None:
+        _rate_rules.pop(path, None)
+
+
+def get_rate_rule(conn: Optional[sqlite3.Connection] = None) -> Tuple[str, bool]:
+    """Returns ``(threshold_time, extra_day_charge)`` from the rate_rule table.
+
+    The value is cached per database until its occupancy engine reports a
+    catalog change, which includes any write to rate_rule.
+    """
+    path = db.resolve()
+    rule = _rate_rules.get(path)
+    if rule is not None:
+        return rule
+    if conn is None:
+        with db.connection() as pooled:
+            return get_rate_rule(pooled)
+    with _rate_rule_lock:
+        row = conn.execute(
+            "SELECT threshold_time, extra_day_charge FROM rate_rule ORDER BY rule_id LIMIT 1"
+        ).fetchone()
+        rule = (row[0], bool(row[1])) if row else DEFAULT_RATE_RULE
+        if path not in _listening:
+            occupancy.get_engine().add_listener(functools.partial(_on_catalog_change, path))
+            _listening.add(path)
+        _rate_rules[path] = rule
+    return rule
+
+
+def days_charged(check_in_datetime: str, check_out_datetime: str,
+                 rate_rule: Tuple[str, bool]) -> int:
+    """Number of days billed for a stay.
+
+    One day per calendar night between the check-in and check-out dates
+    (at least one). If the rate rule charges extra days, a check-out later
+    than its threshold time (e.g. after 21:00) adds one more day.
+
+    Raises:
+        QuoteError: If a datetime is malformed or check-out is not after check-in.
+    """
+    try:
+        check_in = datetime.fromisoformat(check_in_datetime)
+        check_out = datetime.fromisoformat(check_out_datetime)
+    except ValueError:
+        raise QuoteError("Invalid datetime format. Please use ISO format (YYYY-MM-DD HH:MM:SS).") from None
+    if check_out <= check_in:
+        raise QuoteError("Check-out must be after check-in.")
+
+    days = max(1, (check_out.date() - check_in.date()).days)
+    threshold_time, extra_day_charge = rate_rule
+    if extra_day_charge and check_out.strftime("%H:%M") > threshold_time:
+        days += 1
+    return days
+
+
+def price_breakdown(days: int, price: float, extra_bed_included: bool,
+                    extra_bed_price: Optional[float], extra_beds: int = 0) -> Dict[str, float]:
+    """Full price breakdown for ``days`` at a room type's rates.
+
+    Follows the booking table's definitions: subtotal is
+    ``days * price + extra_beds * extra_bed_price``, total is subtotal plus
+    taxes, and the advance is ``ADVANCE_RATE`` of the total.
+
+    Raises:
+        QuoteError: If the extra beds are not offered or exceed MAX_EXTRA_BEDS.
+    """
+    if extra_beds < 0 or extra_beds > MAX_EXTRA_BEDS:
+        raise QuoteError(f"Extra beds must be between 0 and {MAX_EXTRA_BEDS}.")
+    if extra_beds and not extra_bed_included:
+        raise QuoteError("This room does not offer extra beds.")
+
+    bed_price = float(extra_bed_price or 0.0) if extra_bed_included else 0.0
+    subtotal = round(days * float(price) + extra_beds * bed_price, 2)
+    taxes = round(subtotal * TAX_RATE, 2)
+    total = round(subtotal + taxes, 2)
+    return {
+        'days_charged': days,
+        'price_per_night': float(price),
+        'extra_beds': extra_beds,
+        'extra_bed_price': bed_price,
+        'subtotal_amount': subtotal,
+        'taxes_and_fees': taxes,
+        'total_price': total,
+        'advance_due_amount': round(total * ADVANCE_RATE, 2),
+    }
+
+
+def quote_rooms(room_ids: Iterable[int], check_in_datetime: str, check_out_datetime: str,
+                extra_beds: int = 0,
+                conn: Optional[sqlite3.Connection] = None) -> Dict[int, Dict]:
+    """Prices the same stay for many rooms with a single query.
+
+    Returns:
+        dict: room_id -> breakdown from ``price_breakdown`` plus
+        'building_id' and 'capacity'. Rooms that do not exist are omitted;
+        rooms that cannot take ``extra_beds`` map to ``{'error': str}``.
+
+    Raises:
+        QuoteError: If the stay window itself is invalid.
+    """
+    room_ids = list(dict.fromkeys(room_ids))
+    if conn is None:
+        with db.connection() as pooled:
+            return quote_rooms(room_ids, check_in_datetime, check_out_datetime,
+                               extra_beds, pooled)
+
+    days = days_charged(check_in_datetime, check_out_datetime, get_rate_rule(conn))
+    if not room_ids:
+        return {}
+    rows = conn.execute(
+        ROOM_PRICING_QUERY.format(", ".join("?" * len(room_ids))), room_ids
+    ).fetchall()
+
+    quotes = {}
+    for room_id, building_id, capacity, price, bed_included, bed_price in rows:
+        try:
+            quote = price_breakdown(days, price, bed_included, bed_price, extra_beds)
+        except QuoteError as e:
+            quotes[room_id] = {'error': str(e)}
+            continue
+        quote['building_id'] = building_id
+        quote['capacity'] = capacity
+        quotes[room_id] = quote
+    return quotes
+
+
+def get_quote(room_id: int, check_in_datetime: str, check_out_datetime: str,
+              extra_beds: int = 0) -> dict:
+    """Computes the exact price of a stay in one room.
+
+    Use this to tell the guest what a stay will cost before booking; the
+    booking tool charges exactly the same amounts.
+
+    Args:
+        room_id (int): The room being considered.
+        check_in_datetime (str): Check-in in ISO format (YYYY-MM-DD HH:MM:SS).
+        check_out_datetime (str): Check-out in ISO format (YYYY-MM-DD HH:MM:SS).
+        extra_beds (int): Extra beds requested (0 to 2, only for rooms
+            that offer them).
+
+    Returns:
+        dict: On success:
+              {
+                  'room_id': int,
+                  'days_charged': int,
+                  'price_per_night': float,
+                  'extra_beds': int,
+                  'extra_bed_price': float,
+                  'subtotal_amount': float,
+                  'taxes_and_fees': float,
+                  'total_price': float,
+                  'advance_due_amount': float
+              }
+              On failure:
+              {
+                  'error': str
+              }
+    """
+    try:
+        with db.use(shards.room_location(room_id)):
+            quotes = quote_rooms([room_id], check_in_datetime, check_out_datetime, extra_beds)
+    except QuoteError as e:
+        return {'error': str(e)}
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}
+    quote = quotes.get(room_id)
+    if quote is None:
+        return {'error': f"Invalid room_id: {room_id} not found."}
+    if 'error' in quote:
+        return quote
+    result = {'room_id': room_id}
+    result.update((k, v) for k, v in quote.items() if k not in ('building_id', 'capacity'))
+    return result
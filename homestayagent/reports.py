@@ -0,0 +1,756 @@
+"""Occupancy, revenue and advance reports for managers.
+
+Month, quarter and year reports (occupancy rate, nights sold, revenue,
+ADR, RevPAR per building, room type or month) are answered from
+precomputed aggregates rather than by scanning bookings:
+
+- ``report_booking`` holds each active booking's contribution (building,
+  room type, first night, nights, revenue);
+- ``report_daily`` holds the totals of those contributions per day,
+  building and room type, so a quarter is a range sum over a few
+  thousand rows however many bookings there are.
+
+Both live in a sidecar SQLite file next to the hotel database
+(``hotel-reports.db`` for ``hotel.db``), so keeping them current never
+takes the hotel database's write lock; the hotel database is only read,
+through ``db.read_only_connection``. A refresh re-reads just the bookings
+logged in occupancy_change_log since the previous one, then subtracts
+their old contribution and adds the new one. Day totals are derived from
+where stays start and end (running sums per building and room type), so
+the work follows the number of arrival and departure days rather than
+the nights booked. A full rebuild only happens the first time, or after
+the log was pruned past the sidecar's watermark. Reports refresh before
+answering.
+
+Revenue is a booking's total_price spread evenly over its nights, and
+cancelled bookings count for nothing. Available room-nights come from
+the current catalog of active rooms. Outstanding advances are read live,
+since payments are not in the change log, through a partial index over
+the bookings that still owe part of their advance.
+
+Usage:
+    python -m homestayagent.reports period 2025-Q2 --by building
+    python -m homestayagent.reports period 2025-06 --by room_type --building 1
+    python -m homestayagent.reports advances --limit 50
+    python -m homestayagent.reports refresh [--full]
+    python -m homestayagent.reports sql        # read-only SQL console
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import tempfile
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import db, occupancy, shards
+
+# Directory of the sidecar aggregate files; by default each SQLite
+# database's own directory, and the temp directory for PostgreSQL
+REPORTS_DIR = os.getenv("HOTEL_REPORTS_DIR", "")
+# Bookings read from the hotel database per round trip
+FETCH_SIZE = 5000
+# Most bookings outstanding_advances lists
+MAX_ADVANCE_ROWS = 500
+
+GROUP_BY = ("building", "room_type", "month")
+
+SIDECAR_SCHEMA = """
+PRAGMA journal_mode = WAL;
+-- Contribution of each active booking; cancelled bookings have no row.
+-- Days are date ordinals (date.toordinal()).
+CREATE TABLE IF NOT EXISTS report_booking (
+    booking_id    INTEGER PRIMARY KEY,
+    building_id   INTEGER NOT NULL,
+    room_type_id  INTEGER NOT NULL,
+    first_day     INTEGER NOT NULL,  -- first night
+    nights        INTEGER NOT NULL,
+    revenue       REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS report_daily (
+    day           INTEGER NOT NULL,
+    building_id   INTEGER NOT NULL,
+    room_type_id  INTEGER NOT NULL,
+    nights        INTEGER NOT NULL,
+    revenue       REAL    NOT NULL,
+    arrivals      INTEGER NOT NULL,
+    PRIMARY KEY (day, building_id, room_type_id)
+) WITHOUT ROWID;
+-- change_id of occupancy_change_log the aggregates are current to
+CREATE TABLE IF NOT EXISTS report_state (
+    name   TEXT PRIMARY KEY,
+    value  INTEGER NOT NULL
+);
+"""
+_WATERMARK_QUERY = "SELECT value FROM report_state WHERE name = 'change_id'"
+
+_ACTIVE = ("status_id NOT IN (SELECT booking_status_id FROM booking_status WHERE code IN ({}))"
+           .format(", ".join("?" * len(occupancy.INACTIVE_STATUS_CODES))))
+# Active bookings of booking or booking_archive. The tables are read one
+# after the other rather than through booking_history, which SQLite
+# materialises whole.
+_BOOKING_TABLES = ("booking", "booking_archive")
+_BOOKINGS_QUERY = f"""
+    SELECT booking_id, building_id, room_id, check_in_datetime, check_out_datetime, total_price
+    FROM {{table}}
+    WHERE {_ACTIVE}
+"""
+# A booking archived between the two reads is seen in both tables
+_INSERT_BOOKING = "INSERT OR REPLACE INTO report_booking VALUES (?, ?, ?, ?, ?, ?)"
+_LOG_BOUNDS_QUERY = ("SELECT (SELECT MIN(change_id) FROM occupancy_change_log),"
+                     " (SELECT COALESCE(MAX(change_id), 0) FROM occupancy_change_log)")
+
+# Where the stays of the report_booking rows matching {where} start and
+# end, per day, building and room type: (day, nights, revenue per night,
+# arrivals), added on the first night and taken away after the last
+_EVENTS_QUERY = """
+    SELECT first_day, building_id, room_type_id, COUNT(*), SUM(revenue / nights), COUNT(*)
+    FROM report_booking b {where}
+    GROUP BY 1, 2, 3
+    UNION ALL
+    SELECT first_day + nights, building_id, room_type_id, -COUNT(*), -SUM(revenue / nights), 0
+    FROM report_booking b {where}
+    GROUP BY 1, 2, 3
+"""
+_DAILY_UPSERT = """
+    INSERT INTO report_daily (day, building_id, room_type_id, nights, revenue, arrivals)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, building_id, room_type_id) DO UPDATE SET
+        nights = nights + excluded.nights,
+        revenue = revenue + excluded.revenue,
+        arrivals = arrivals + excluded.arrivals
+"""
+_CHANGED = "WHERE b.booking_id IN (SELECT booking_id FROM temp.report_changed)"
+
+# Months are summed up from days
+_SALES_KEYS = {
+    "building": "building_id",
+    "room_type": "room_type_id",
+    "month": "day",
+}
+_SALES_QUERY = """
+    SELECT {key}, SUM(nights), SUM(revenue), SUM(arrivals)
+    FROM report_daily
+    WHERE day >= ? AND day < ? AND (? IS NULL OR building_id = ?)
+    GROUP BY 1
+"""
+_BUILDING_ROOMS_QUERY = """
+    SELECT bl.building_id, bl.name, COUNT(r.room_id)
+    FROM building bl
+    LEFT JOIN room r ON r.building_id = bl.building_id AND r.is_active = 1
+    WHERE ? IS NULL OR bl.building_id = ?
+    GROUP BY bl.building_id, bl.name
+"""
+_ROOM_TYPE_ROOMS_QUERY = """
+    SELECT rt.room_type_id, rt.name, bl.name, COUNT(r.room_id)
+    FROM room_type rt
+    JOIN building bl ON bl.building_id = rt.building_id
+    LEFT JOIN room r ON r.room_type_id = rt.room_type_id AND r.is_active = 1
+    WHERE ? IS NULL OR rt.building_id = ?
+    GROUP BY rt.room_type_id, rt.name, bl.name
+"""
+_ROOMS_QUERY = "SELECT COUNT(*) FROM room WHERE is_active = 1 AND (? IS NULL OR building_id = ?)"
+
+# Current and upcoming stays still owing part of their advance; the
+# first condition matches idx_booking_advance_outstanding, which covers
+# the other columns read here
+_OUTSTANDING = f"""
+    b.advance_due_amount > COALESCE(b.advance_paid_amount, 0)
+      AND b.check_out_datetime >= ?
+      AND b.{_ACTIVE}
+      AND (? IS NULL OR b.building_id = ?)
+"""
+_ADVANCES_SUMMARY_QUERY = f"""
+    SELECT o.building_id, bl.name, o.bookings, o.outstanding
+    FROM (SELECT b.building_id, COUNT(*) AS bookings,
+                 SUM(b.advance_due_amount - COALESCE(b.advance_paid_amount, 0)) AS outstanding
+          FROM booking b
+          WHERE {_OUTSTANDING}
+          GROUP BY b.building_id) o
+    JOIN building bl ON bl.building_id = o.building_id
+"""
+# The soonest ones are picked from the index alone, then looked up
+_ADVANCES_QUERY = f"""
+    SELECT b.booking_id, bl.name, r.room_number, b.guest_id, b.check_in_datetime,
+           b.check_out_datetime, b.total_price, b.advance_due_amount,
+           COALESCE(b.advance_paid_amount, 0)
+    FROM (SELECT b.booking_id
+          FROM booking b
+          WHERE {_OUTSTANDING}
+          ORDER BY b.check_in_datetime, b.booking_id
+          LIMIT ?) soonest
+    JOIN booking b ON b.booking_id = soonest.booking_id
+    JOIN building bl ON bl.building_id = b.building_id
+    LEFT JOIN room r ON r.room_id = b.room_id
+    ORDER BY b.check_in_datetime, b.booking_id
+"""
+
+
+def sidecar_path(db_path: Optional[str] = None) -> str:
+    """Path of the aggregate file of ``db_path`` (defaults to the configured database)."""
+    path = db.resolve(db_path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+    if db.is_url(path):
+        return os.path.join(REPORTS_DIR or tempfile.gettempdir(), f"pg-{digest}-reports.db")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if REPORTS_DIR:
+        # Shards in different directories may share a file name
+        return os.path.join(REPORTS_DIR, f"{stem}-{digest}-reports.db")
+    return os.path.join(os.path.dirname(path), f"{stem}-reports.db")
+
+
+@functools.lru_cache(maxsize=8192)
+def _ordinal(day: str) -> int:
+    return date.fromisoformat(day).toordinal()
+
+
+def _contributions(cursor: sqlite3.Cursor,
+                   room_types: Dict[int, int]) -> Iterator[Tuple[int, int, int, int, int, float]]:
+    """report_booking rows for the bookings ``cursor`` returns, read in chunks."""
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        for booking_id, building_id, room_id, check_in, check_out, total_price in rows:
+            # Nights as in occupancy_calendar.stay_days; the first ten
+            # characters of any stored datetime are its date
+            first = _ordinal(check_in[:10])
+            nights = max(1, _ordinal(check_out[:10]) - first)
+            # Room type 0 once the room is deleted
+            yield (booking_id, building_id, room_types.get(room_id, 0), first, nights,
+                   total_price or 0.0)
+
+
+def _daily_rows(events: Iterable[Tuple[int, int, int, int, float, int]],
+                sign: int) -> Iterator[Tuple[int, int, int, int, float, int]]:
+    """report_daily rows, times ``sign``, from the rows of _EVENTS_QUERY.
+
+    Running sums of the events of each building and room type in day
+    order give the nights sold and revenue of every day in between, so
+    the cost follows the number of distinct start and end days, not the
+    number of nights booked.
+    """
+    per_key: Dict[Tuple[int, int], Dict[int, List]] = {}
+    for day, building_id, room_type_id, nights, revenue, arrivals in events:
+        totals = per_key.setdefault((building_id, room_type_id), {}).setdefault(day, [0, 0.0, 0])
+        totals[0] += nights
+        totals[1] += revenue
+        totals[2] += arrivals
+    for (building_id, room_type_id), changes in per_key.items():
+        days = sorted(changes)
+        nights, revenue = 0, 0.0
+        for day, next_day in zip(days, days[1:] + days[-1:]):
+            day_nights, day_revenue, arrivals = changes[day]
+            nights += day_nights
+            revenue += day_revenue
+            if not nights:
+                continue
+            yield day, building_id, room_type_id, sign * nights, sign * revenue, sign * arrivals
+            for later in range(day + 1, next_day):
+                yield later, building_id, room_type_id, sign * nights, sign * revenue, 0
+
+
+class ReportStore:
+    """The aggregates of one hotel database, in their sidecar file.
+
+    Args:
+        db_path (str, optional): Hotel database path or URL; defaults to
+            the configured database.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db.resolve(db_path)
+        self.path = sidecar_path(self.db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=db.BUSY_TIMEOUT_MS / 1000,
+                                     check_same_thread=False)
+        self._conn.executescript(SIDECAR_SCHEMA)
+
+    def refresh(self, full: bool = False, source: Optional[sqlite3.Connection] = None) -> dict:
+        """Brings the aggregates up to date with the hotel database.
+
+        Args:
+            full (bool): Rebuild from all bookings instead of applying the
+                changes since the last refresh.
+            source: Read-only connection to the hotel database; one is
+                opened if not given.
+
+        Returns:
+            dict: {'change_id': int, 'rebuilt': bool, 'bookings_applied': int}
+        """
+        if source is None:
+            with db.read_only_connection(self.db_path) as conn:
+                return self.refresh(full, conn)
+        with self._lock:
+            conn = self._conn
+            # The log bounds are read before the bookings: a booking changed
+            # in between is read as it is now and applied again next time
+            first_id, last_id = source.execute(_LOG_BOUNDS_QUERY).fetchone()
+            row = conn.execute(_WATERMARK_QUERY).fetchone()
+            if not full and row is not None and row[0] == last_id:
+                return {'change_id': row[0], 'rebuilt': False, 'bookings_applied': 0}
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have refreshed meanwhile
+                row = conn.execute(_WATERMARK_QUERY).fetchone()
+                # A log behind the watermark belongs to a recreated database
+                rebuilt = full or row is None or row[0] > last_id or (
+                    first_id is not None and first_id > row[0] + 1)
+                if rebuilt:
+                    applied = self._rebuild(source)
+                elif row[0] < last_id:
+                    applied = self._apply(source, sorted({
+                        booking_id for (booking_id,) in source.execute(
+                            "SELECT booking_id FROM occupancy_change_log"
+                            " WHERE change_id > ? AND change_id <= ? AND booking_id IS NOT NULL",
+                            (row[0], last_id),
+                        )
+                    }))
+                else:
+                    conn.rollback()
+                    return {'change_id': row[0], 'rebuilt': False, 'bookings_applied': 0}
+                conn.execute(
+                    "INSERT INTO report_state (name, value) VALUES ('change_id', ?)"
+                    " ON CONFLICT(name) DO UPDATE SET value = excluded.value", (last_id,)
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return {'change_id': last_id, 'rebuilt': rebuilt, 'bookings_applied': applied}
+
+    def _add_daily(self, sign: int, where: str = "") -> None:
+        events = self._conn.execute(_EVENTS_QUERY.format(where=where)).fetchall()
+        self._conn.executemany(_DAILY_UPSERT, _daily_rows(events, sign))
+
+    def _rebuild(self, source: sqlite3.Connection) -> int:
+        conn = self._conn
+        conn.execute("DELETE FROM report_booking")
+        conn.execute("DELETE FROM report_daily")
+        room_types = dict(source.execute("SELECT room_id, room_type_id FROM room").fetchall())
+        for table in _BOOKING_TABLES:
+            conn.executemany(
+                _INSERT_BOOKING,
+                _contributions(source.execute(_BOOKINGS_QUERY.format(table=table),
+                                              occupancy.INACTIVE_STATUS_CODES), room_types),
+            )
+        self._add_daily(1)
+        return conn.execute("SELECT COUNT(*) FROM report_booking").fetchone()[0]
+
+    def _apply(self, source: sqlite3.Connection, booking_ids: List[int]) -> int:
+        """Replaces the contributions of ``booking_ids`` with their current ones."""
+        conn = self._conn
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS report_changed (booking_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.report_changed")
+        conn.executemany("INSERT INTO temp.report_changed VALUES (?)",
+                         ((booking_id,) for booking_id in booking_ids))
+        self._add_daily(-1, _CHANGED)
+        conn.execute("DELETE FROM report_booking WHERE booking_id IN"
+                     " (SELECT booking_id FROM temp.report_changed)")
+        room_types = dict(source.execute("SELECT room_id, room_type_id FROM room").fetchall())
+        for offset in range(0, len(booking_ids), occupancy._IN_BATCH):
+            batch = booking_ids[offset:offset + occupancy._IN_BATCH]
+            for table in _BOOKING_TABLES:
+                conn.executemany(
+                    _INSERT_BOOKING,
+                    _contributions(source.execute(
+                        _BOOKINGS_QUERY.format(table=table)
+                        + f" AND booking_id IN ({', '.join('?' * len(batch))})",
+                        (*occupancy.INACTIVE_STATUS_CODES, *batch),
+                    ), room_types),
+                )
+        self._add_daily(1, _CHANGED)
+        conn.execute("DELETE FROM report_daily WHERE nights = 0")
+        return len(booking_ids)
+
+    def sales(self, key: str, first: date, following: date,
+              building_id: Optional[int] = None) -> Dict[Any, Tuple[int, float, int]]:
+        """(nights, revenue, arrivals) per building, room type or month
+        ("YYYY-MM") of the nights from ``first`` up to ``following``."""
+        with self._lock:
+            rows = self._conn.execute(
+                _SALES_QUERY.format(key=_SALES_KEYS[key]),
+                (first.toordinal(), following.toordinal(), building_id, building_id),
+            ).fetchall()
+        if key != "month":
+            return {row[0]: row[1:] for row in rows}
+        months: Dict[Any, Tuple[int, float, int]] = {}
+        for day, *figures in rows:
+            month = date.fromordinal(day).isoformat()[:7]
+            months[month] = tuple(map(sum, zip(months.get(month, (0, 0.0, 0)), figures)))
+        return months
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_stores: Dict[str, ReportStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path: Optional[str] = None) -> ReportStore:
+    """Returns the aggregate store of ``db_path`` (defaults to the configured database)."""
+    path = db.resolve(db_path)
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = ReportStore(path)
+    return store
+
+
+def parse_period(period: str) -> Tuple[date, date]:
+    """First day of ``period`` and the day after its last.
+
+    Raises:
+        ValueError: If the period is not "YYYY-MM", "YYYY-Qn" or "YYYY".
+    """
+    text = period.strip().upper()
+    try:
+        if len(text) == 4:
+            year = int(text)
+            return date(year, 1, 1), date(year + 1, 1, 1)
+        if len(text) == 7 and text[4:6] == "-Q" and text[6] in "1234":
+            first = date(int(text[:4]), 3 * int(text[6]) - 2, 1)
+            return first, _add_months(first, 3)
+        if len(text) == 7:
+            first = date.fromisoformat(text + "-01")
+            return first, _add_months(first, 1)
+    except ValueError:
+        pass
+    raise ValueError("Invalid period. Please use YYYY-MM, YYYY-Qn (e.g. 2025-Q2) or YYYY.")
+
+
+def _add_months(first: date, months: int) -> date:
+    month = first.month - 1 + months
+    return date(first.year + month // 12, month % 12 + 1, 1)
+
+
+def _months(first: date, following: date) -> Iterator[Tuple[str, int]]:
+    """("YYYY-MM", days) for each month from ``first`` (a 1st) up to ``following``."""
+    while first < following:
+        after = _add_months(first, 1)
+        yield first.isoformat()[:7], (after - first).days
+        first = after
+
+
+# Per shard: [(key, labels, rooms)] for the catalog, and sales per key
+_Figures = Tuple[List[Tuple[Any, Dict[str, Any], int]], Dict[Any, Tuple[int, float, int]]]
+
+
+def _period_figures(first_day: str, following_day: str, group_by: str,
+                    building_id: Optional[int]) -> _Figures:
+    store = get_store()
+    with db.read_only_connection() as conn:
+        store.refresh(source=conn)
+        params = (building_id, building_id)
+        if group_by == "building":
+            catalog = [(key, {'building_id': key, 'building': name}, rooms)
+                       for key, name, rooms in conn.execute(_BUILDING_ROOMS_QUERY, params)]
+        elif group_by == "room_type":
+            catalog = [(key, {'room_type_id': key, 'room_type': name, 'building': building}, rooms)
+                       for key, name, building, rooms in conn.execute(_ROOM_TYPE_ROOMS_QUERY, params)]
+        else:
+            rooms = conn.execute(_ROOMS_QUERY, params).fetchone()[0]
+            catalog = [(month, {'month': month}, rooms) for month, _ in _months(
+                date.fromisoformat(first_day), date.fromisoformat(following_day))]
+    return catalog, store.sales(group_by, date.fromisoformat(first_day),
+                                date.fromisoformat(following_day), building_id)
+
+
+def _figures(rooms: int, room_nights: int, nights: int, revenue: float,
+             arrivals: int) -> Dict[str, Any]:
+    return {
+        'rooms': rooms,
+        'room_nights': room_nights,
+        'nights_sold': nights,
+        'arrivals': arrivals,
+        'occupancy_rate': round(nights / room_nights, 4) if room_nights else 0.0,
+        'revenue': round(revenue, 2),
+        'adr': round(revenue / nights, 2) if nights else 0.0,
+        'revpar': round(revenue / room_nights, 2) if room_nights else 0.0,
+    }
+
+
+def period_report(period: str, group_by: str = "building",
+                  building_id: Optional[int] = None) -> dict:
+    """Occupancy and revenue of a month, quarter or year.
+
+    Args:
+        period (str): "YYYY-MM", "YYYY-Qn" (e.g. "2025-Q2") or "YYYY".
+        group_by (str): "building", "room_type" or "month".
+        building_id (int, optional): Only this building.
+
+    Returns:
+        dict: On success:
+              {
+                  'period': str,
+                  'first_day': str,          # 'YYYY-MM-DD'
+                  'last_day': str,
+                  'group_by': str,
+                  'rows': [
+                      {
+                          # 'building_id', 'building'; or 'room_type_id',
+                          # 'room_type', 'building'; or 'month'
+                          'rooms': int,           # active rooms
+                          'room_nights': int,     # rooms x nights in the period
+                          'nights_sold': int,
+                          'arrivals': int,        # stays starting in the period
+                          'occupancy_rate': float,  # nights_sold / room_nights
+                          'revenue': float,       # room revenue of those nights
+                          'adr': float,           # revenue / nights_sold
+                          'revpar': float         # revenue / room_nights
+                      },
+                      ...
+                  ],
+                  'total': {...}                  # the same figures overall
+              }
+              On failure:
+              {
+                  'error': str
+              }
+    """
+    try:
+        first, following = parse_period(period)
+    except ValueError as error:
+        return {'error': str(error)}
+    if group_by not in GROUP_BY:
+        return {'error': f"group_by must be one of {', '.join(GROUP_BY)}."}
+    args = (first.isoformat(), following.isoformat(), group_by, building_id)
+    try:
+        if building_id is not None:
+            with db.use(shards.building_location(building_id)):
+                per_shard = [_period_figures(*args)]
+        else:
+            per_shard = shards.fan_out(_period_figures, *args)
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}
+
+    labels: Dict[Any, Dict[str, Any]] = {}
+    rooms: Dict[Any, int] = {}
+    sales: Dict[Any, List] = {}
+    for catalog, shard_sales in per_shard:
+        for key, key_labels, key_rooms in catalog:
+            labels.setdefault(key, key_labels)
+            rooms[key] = rooms.get(key, 0) + key_rooms
+        for key, figures in shard_sales.items():
+            totals = sales.setdefault(key, [0, 0.0, 0])
+            for index, value in enumerate(figures):
+                totals[index] += value or 0
+    # Sales of rooms or buildings since removed from the catalog
+    for key in sales.keys() - labels.keys():
+        labels[key] = {'building_id': key, 'building': None} if group_by == "building" else (
+            {'room_type_id': key, 'room_type': None, 'building': None}
+            if group_by == "room_type" else {'month': key})
+        rooms[key] = 0
+
+    period_days = (following - first).days
+    month_days = dict(_months(first, following))
+    rows = []
+    total = [0, 0, 0, 0.0, 0]
+    for key in sorted(labels, key=lambda key: (key is None, key)):
+        days = month_days.get(key, 0) if group_by == "month" else period_days
+        nights, revenue, arrivals = sales.get(key, (0, 0.0, 0))
+        figures = (rooms[key], rooms[key] * days, nights, revenue, arrivals)
+        rows.append({**labels[key], **_figures(*figures)})
+        total = [sum(pair) for pair in zip(total, figures)]
+    if group_by == "month":
+        # Every month row counts the same rooms
+        total[0] = max(rooms.values(), default=0)
+    return {
+        'period': period.strip().upper(),
+        'first_day': first.isoformat(),
+        'last_day': date.fromordinal(following.toordinal() - 1).isoformat(),
+        'group_by': group_by,
+        'rows': rows,
+        'total': _figures(*total),
+    }
+
+
+def _advances(as_of: str, building_id: Optional[int], limit: int) -> Tuple[List, List]:
+    params = (as_of, *occupancy.INACTIVE_STATUS_CODES, building_id, building_id)
+    with db.read_only_connection() as conn:
+        summary = conn.execute(_ADVANCES_SUMMARY_QUERY, params).fetchall()
+        bookings = conn.execute(_ADVANCES_QUERY, (*params, limit)).fetchall() if limit else []
+    return summary, bookings
+
+
+def outstanding_advances(building_id: Optional[int] = None, limit: int = 20) -> dict:
+    """Advances still to collect on current and upcoming stays.
+
+    Args:
+        building_id (int, optional): Only this building.
+        limit (int): Bookings to list, soonest check-in first (at most 500).
+
+    Returns:
+        dict: On success:
+              {
+                  'as_of': str,              # 'YYYY-MM-DD'; stays ending
+                                             # before it are left out
+                  'bookings': int,
+                  'outstanding': float,
+                  'buildings': [
+                      {'building_id': int, 'building': str, 'bookings': int,
+                       'outstanding': float},
+                      ...
+                  ],
+                  'soonest': [
+                      {
+                          'booking_id': int,
+                          'building': str,
+                          'room_number': str,
+                          'guest_id': int,
+                          'check_in_datetime': str,
+                          'check_out_datetime': str,
+                          'total_price': float,
+                          'advance_due_amount': float,
+                          'advance_paid_amount': float,
+                          'outstanding': float
+                      },
+                      ...
+                  ]
+              }
+              On failure:
+              {
+                  'error': str
+              }
+    """
+    if not 0 <= limit <= MAX_ADVANCE_ROWS:
+        return {'error': f"limit must be between 0 and {MAX_ADVANCE_ROWS}."}
+    as_of = date.today().isoformat()
+    try:
+        if building_id is not None:
+            with db.use(shards.building_location(building_id)):
+                per_shard = [_advances(as_of, building_id, limit)]
+        else:
+            per_shard = shards.fan_out(_advances, as_of, building_id, limit)
+    except sqlite3.Error as db_err:
+        return {'error': f"Database error: {db_err}"}
+
+    buildings = sorted(
+        ({'building_id': building, 'building': name, 'bookings': count,
+          'outstanding': round(amount, 2)}
+         for summary, _ in per_shard for building, name, count, amount in summary),
+        key=lambda row: row['building_id'],
+    )
+    soonest = sorted((row for _, bookings in per_shard for row in bookings),
+                     key=lambda row: (occupancy.normalise_datetime(row[4]), row[0]))[:limit]
+    return {
+        'as_of': as_of,
+        'bookings': sum(row['bookings'] for row in buildings),
+        'outstanding': round(sum(row['outstanding'] for row in buildings), 2),
+        'buildings': buildings,
+        'soonest': [
+            {
+                'booking_id': booking_id,
+                'building': building,
+                'room_number': room_number,
+                'guest_id': guest_id,
+                'check_in_datetime': check_in,
+                'check_out_datetime': check_out,
+                'total_price': total_price,
+                'advance_due_amount': due,
+                'advance_paid_amount': paid,
+                'outstanding': round(due - paid, 2),
+            }
+            for booking_id, building, room_number, guest_id, check_in, check_out,
+            total_price, due, paid in soonest
+        ],
+    }
+
+
+def refresh(full: bool = False) -> List[dict]:
+    """Refreshes the aggregates of every shard (or the configured database)."""
+    return shards.fan_out(lambda: {'database': db.resolve(), **get_store().refresh(full)})
+
+
+def _print_table(field_names: List[str], rows: Iterable[Iterable[Any]]) -> None:
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = field_names
+    table.align = "l"
+    for row in rows:
+        table.add_row(list(row))
+    print(table)
+
+
+def sql_console(db_path: Optional[str] = None) -> None:
+    """Runs SQL typed on stdin against a read-only connection and prints
+    each result as a table. Errors are printed and the console goes on;
+    an empty input line is skipped, end of input or "quit" ends it."""
+    prompt = "sql> " if sys.stdin.isatty() else ""
+    with db.read_only_connection(db_path) as conn:
+        while True:
+            try:
+                statement = input(prompt).strip()
+            except EOFError:
+                break
+            if statement.lower() in ("quit", "exit", ".quit"):
+                break
+            if not statement:
+                continue
+            try:
+                cursor = conn.execute(statement)
+                rows = cursor.fetchall()
+            except sqlite3.Error as error:
+                print(f"Error: {error}")
+                continue
+            if cursor.description:
+                _print_table([column[0] for column in cursor.description], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Occupancy, revenue and advance reports")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    period = commands.add_parser("period", help="Occupancy and revenue of a month, quarter or year")
+    period.add_argument("period", help="YYYY-MM, YYYY-Qn or YYYY")
+    period.add_argument("--by", choices=GROUP_BY, default="building")
+    period.add_argument("--building", type=int)
+    advances = commands.add_parser("advances", help="Advances still to collect")
+    advances.add_argument("--building", type=int)
+    advances.add_argument("--limit", type=int, default=20)
+    refresh_command = commands.add_parser("refresh", help="Bring the aggregates up to date")
+    refresh_command.add_argument("--full", action="store_true", help="Rebuild from all bookings")
+    sql = commands.add_parser("sql", help="Read-only SQL console")
+    sql.add_argument("--db", help="Database path or PostgreSQL URL (default: configured database)")
+    args = parser.parse_args()
+
+    if args.command == "sql":
+        sql_console(args.db)
+        return
+    if args.command == "refresh":
+        result: Any = refresh(args.full)
+    elif args.command == "period":
+        result = period_report(args.period, args.by, args.building)
+    else:
+        result = outstanding_advances(args.building, args.limit)
+    if args.json or args.command == "refresh" or 'error' in result:
+        print(json.dumps(result, indent=2))
+    elif args.command == "period":
+        columns = [name for name in result['rows'][0] if name not in result['total']] \
+            if result['rows'] else []
+        figures = list(result['total'])
+        _print_table(columns + figures,
+                     [[row[name] for name in columns + figures] for row in result['rows']]
+                     + [[""] * (len(columns) - 1) + ["Total"] * bool(columns)
+                        + [result['total'][name] for name in figures]])
+    else:
+        _print_table(["building", "bookings", "outstanding"],
+                     [(row['building'], row['bookings'], row['outstanding'])
+                      for row in result['buildings']]
+                     + [("Total", result['bookings'], result['outstanding'])])
+        if result['soonest']:
+            _print_table(list(result['soonest'][0]),
+                         [list(row.values()) for row in result['soonest']])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Narrows availability to a guest's budget and preferences in the database.
+
+The availability tools take an optional nightly budget, floor range, lift
+requirement and feature keywords. Those only depend on the room catalog,
+so the rooms meeting them are looked up with one indexed query (an FTS5
+index over room_type.name and room_type.features, on PostgreSQL a GIN
+text-search index) and cached per database until the catalog changes.
+The free rooms from the occupancy index are then narrowed to that set, so
+only matching rooms are formatted and returned to the model.
+"""
+import functools
+import re
+import sqlite3
+import threading
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from . import db, occupancy
+
+# (max_price, min_floor, max_floor, lift, feature keywords); hashable, so
+# it doubles as the cache key
+Preferences = Tuple[Optional[float], Optional[int], Optional[int], bool, Tuple[str, ...]]
+
+# Cached room sets per database, dropped on catalog changes
+MAX_CACHED_FILTERS = 256
+
+_ELIGIBLE_ROOMS_QUERY = """
+    SELECT r.room_id
+    FROM room r
+    JOIN room_type rt ON r.room_type_id = rt.room_type_id
+    JOIN building b ON r.building_id = b.building_id
+    WHERE r.is_active = 1{}
+"""
+_FTS_CONDITION = "rt.room_type_id IN (SELECT rowid FROM room_type_fts WHERE room_type_fts MATCH ?)"
+# Must match the expression of idx_room_type_features in pg_backend.SCHEMA
+_TSQUERY_CONDITION = (
+    "to_tsvector('simple', rt.name || ' ' || COALESCE(rt.features, '') || ' ' ||"
+    " replace(rt.name || ' ' || COALESCE(rt.features, ''), '-', ''))"
+    " @@ to_tsquery('simple', ?)"
+)
+
+_eligible: Dict[str, Dict[Preferences, FrozenSet[int]]] = {}
+_eligible_lock = threading.Lock()
+_listening: set = set()
+
+
+def preferences(max_price: Optional[float] = None, min_floor: Optional[int] = None,
+                max_floor: Optional[int] = None, lift: bool = False,
+                features: Optional[Sequence[str]] = None) -> Optional[Preferences]:
+    """Validates the tool arguments; None when no preference is given.
+
+    Raises:
+        ValueError: If max_price is not positive or the floor range is empty.
+    """
+    keywords = tuple(sorted({
+        " ".join(_words(keyword)) for keyword in (features or ()) if _words(keyword)
+    }))
+    if max_price is None and min_floor is None and max_floor is None and not lift and not keywords:
+        return None
+    if max_price is not None and max_price <= 0:
+        raise ValueError("max_price must be more than 0.")
+    if min_floor is not None and max_floor is not None and min_floor > max_floor:
+        raise ValueError("min_floor cannot be above max_floor.")
+    return (max_price, min_floor, max_floor, bool(lift), keywords)
+
+
+def describe(prefs: Optional[Preferences]) -> Dict[str, object]:
+    """The preferences that are set, for echoing back in tool results."""
+    if prefs is None:
+        return {}
+    names = ("max_price", "min_floor", "max_floor", "lift", "features")
+    return {name: value for name, value in zip(names, prefs) if value not in (None, False, ())}
+
+
+def _words(keyword: str) -> List[str]:
+    # The same word split as FTS5's unicode61 tokenizer, so "Wi-Fi" is "wi fi"
+    return re.findall(r"\w+", keyword.lower())
+
+
+def _match_expression(keywords: Tuple[str, ...], postgres: bool) -> str:
+    """Every keyword must appear, its last word as a prefix ("kitchen" finds
+    "Kitchenette")."""
+    if postgres:
+        return " & ".join(
+            "(" + " <-> ".join(keyword.split()[:-1] + [keyword.split()[-1] + ":*"]) + ")"
+            for keyword in keywords
+        )
+    return " AND ".join(f'"{keyword}"*' for keyword in keywords)
+
+
+def _on_catalog_change(path: str, changes) -> None:
+    if changes is None:
+        _eligible.pop(path, None)
+
+
+def eligible_rooms(prefs: Preferences,
+                   conn: Optional[sqlite3.Connection] = None) -> FrozenSet[int]:
+    """Active rooms of the current database meeting ``prefs``."""
+    path = db.resolve()
+    cached = _eligible.get(path, {}).get(prefs)
+    if cached is not None:
+        return cached
+    if conn is None:
+        with db.connection() as pooled:
+            return eligible_rooms(prefs, pooled)
+    if path not in _listening:
+        with _eligible_lock:
+            if path not in _listening:
+                occupancy.get_engine().add_listener(functools.partial(_on_catalog_change, path))
+                _listening.add(path)
+
+    max_price, min_floor, max_floor, lift, keywords = prefs
+    conditions, params = [], []
+    if max_price is not None:
+        conditions.append("rt.price <= ?")
+        params.append(max_price)
+    if min_floor is not None:
+        conditions.append("r.floor >= ?")
+        params.append(min_floor)
+    if max_floor is not None:
+        conditions.append("r.floor <= ?")
+        params.append(max_floor)
+    if lift:
+        conditions.append("b.has_lift = 1")
+    if keywords:
+        postgres = db.is_url(path)
+        conditions.append(_TSQUERY_CONDITION if postgres else _FTS_CONDITION)
+        params.append(_match_expression(keywords, postgres))
+    rooms = frozenset(row[0] for row in conn.execute(
+        _ELIGIBLE_ROOMS_QUERY.format("".join("\n      AND " + c for c in conditions)), params
+    ))
+
+    with _eligible_lock:
+        cache = _eligible.setdefault(path, {})
+        if len(cache) >= MAX_CACHED_FILTERS:
+            cache.clear()
+        cache[prefs] = rooms
+    return rooms
+
+
+def filter_rooms(rooms: List[Tuple], prefs: Optional[Preferences]) -> List[Tuple]:
+    """Keeps the occupancy catalog rows meeting ``prefs``, in order."""
+    if prefs is None:
+        return rooms
+    eligible = eligible_rooms(prefs)
+    return [row for row in rooms if row[0] in eligible]
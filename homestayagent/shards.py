@@ -0,0 +1,311 @@
+"""Per-building sharding of the hotel data.
+
+``HOTEL_SHARDS`` maps buildings to databases, one shard per property or
+group of properties:
+
+    HOTEL_SHARDS="1,2=/data/hills.db;3,4=/data/beach.db"
+
+(a location may also be a postgresql:// URL). Each shard is a complete
+hotel database holding only its buildings' room catalog, bookings and
+holds, so it has its own pool, writer, occupancy index and caches, and a
+booking at one property never waits on another's. Guests stay in the
+default database (``db.DB_PATH``), which serves as the guest directory.
+
+The tools route through this module: availability searches fan out to
+every shard on a thread pool and merge the per-shard results in catalog
+order (cheapest first); bookings, quotes and holds go to the shard that
+owns the room; status changes and hold releases go to the shard holding
+the id. Booking and hold ids stay unique across shards because ``split``
+starts the sequences of shard n at ``n * ID_STRIDE``.
+
+Without ``HOTEL_SHARDS`` every helper here is a pass-through to the
+default database.
+
+Create shard files from an existing database with:
+    python -m homestayagent.shards split homestayagent/hotel.db \\
+        --shards "1,2=/data/hills.db;3,4=/data/beach.db"
+"""
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import db
+
+SHARD_SPEC = os.getenv("HOTEL_SHARDS", "")
+# Threads used to query shards in parallel; 0 queries them one after
+# another in the calling thread, which is cheaper on a single core
+FANOUT_THREADS = int(os.getenv("HOTEL_SHARD_THREADS", "8"))
+# A room id missing from the room index re-reads it at most this often,
+# so unknown ids do not query every shard on each call
+ROOM_RELOAD_INTERVAL_S = float(os.getenv("HOTEL_SHARD_ROOM_RELOAD_S", "1"))
+# Booking and hold ids of shard n (1-based, in spec order) start at n * ID_STRIDE
+ID_STRIDE = 100_000_000
+
+_BOOKING_QUERY = ("SELECT 1 FROM booking WHERE booking_id = ?"
+                  " UNION ALL SELECT 1 FROM booking_archive WHERE booking_id = ?")
+_HOLD_QUERY = "SELECT 1 FROM room_hold WHERE hold_id = ?"
+
+
+def room_order(row: Tuple) -> Tuple:
+    """Sort key of a catalog row, matching occupancy.CATALOG_QUERY's ORDER BY."""
+    return row[4], -row[3], row[0]
+
+
+def _call_in(location: str, func: Callable[..., Any], args: Tuple) -> Any:
+    with db.use(location):
+        return func(*args)
+
+
+class ShardMap:
+    """Which database holds which building, and which holds which room.
+
+    The room index is read from the shards themselves on first use and
+    re-read when a room is not found (at most once per
+    ``ROOM_RELOAD_INTERVAL_S``), so rooms added to a shard later are
+    routed without a restart.
+
+    Args:
+        buildings (dict): building_id -> database path or URL.
+        threads (int): Extra threads querying shards at the same time;
+            0 queries them in turn.
+    """
+
+    def __init__(self, buildings: Dict[int, str], threads: int = FANOUT_THREADS):
+        self.buildings = {building_id: db.resolve(location)
+                          for building_id, location in buildings.items()}
+        self.locations = list(dict.fromkeys(self.buildings.values()))
+        self.threads = max(0, threads)
+        self._rooms: Dict[int, str] = {}
+        self._rooms_loaded_at: Optional[float] = None
+        self._rooms_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "ShardMap":
+        """Builds a map from "1,2=/a.db;3=/b.db".
+
+        Raises:
+            ValueError: If the spec is empty or malformed.
+        """
+        buildings: Dict[int, str] = {}
+        for entry in filter(None, (part.strip() for part in spec.split(";"))):
+            building_ids, sep, location = entry.partition("=")
+            if not sep or not location.strip():
+                raise ValueError(f"Invalid shard {entry!r}; expected 'building_id,...=database'")
+            for building_id in building_ids.split(","):
+                buildings[int(building_id)] = location.strip()
+        if not buildings:
+            raise ValueError("No shards given")
+        return cls(buildings)
+
+    def map(self, func: Callable[..., Any], *args: Any) -> List[Any]:
+        """Calls ``func(*args)`` on every shard, in parallel unless ``threads`` is 0.
+
+        Each call runs with its shard as the default database (see
+        ``db.use``). Results are in shard order; an exception raised on
+        any shard is re-raised.
+        """
+        if len(self.locations) == 1 or not self.threads:
+            return [_call_in(location, func, args) for location in self.locations]
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=min(self.threads, len(self.locations) - 1),
+                        thread_name_prefix="hotel-shard",
+                    )
+        # The calling thread takes the first shard itself instead of idling
+        futures = [self._executor.submit(_call_in, location, func, args)
+                   for location in self.locations[1:]]
+        return [_call_in(self.locations[0], func, args)] + [future.result() for future in futures]
+
+    def for_building(self, building_id: int) -> Optional[str]:
+        return self.buildings.get(building_id)
+
+    def for_room(self, room_id: int) -> Optional[str]:
+        location = self._rooms.get(room_id)
+        if location is None:
+            self._load_rooms()
+            location = self._rooms.get(room_id)
+        return location
+
+    def _load_rooms(self) -> None:
+        def room_ids() -> List[int]:
+            with db.connection() as conn:
+                return [row[0] for row in conn.execute("SELECT room_id FROM room")]
+
+        # One reload at a time; callers missing the same room meanwhile
+        # use its result
+        with self._rooms_lock:
+            if (self._rooms_loaded_at is not None
+                    and time.monotonic() - self._rooms_loaded_at < ROOM_RELOAD_INTERVAL_S):
+                return
+            rooms: Dict[int, str] = {}
+            for location, ids in zip(self.locations, self.map(room_ids)):
+                rooms.update(dict.fromkeys(ids, location))
+            self._rooms = rooms
+            self._rooms_loaded_at = time.monotonic()
+
+    def find(self, query: str, params: Tuple) -> Optional[str]:
+        """The first shard where ``query`` returns a row."""
+        def probe() -> bool:
+            with db.connection() as conn:
+                return conn.execute(query, params).fetchone() is not None
+
+        for location, found in zip(self.locations, self.map(probe)):
+            if found:
+                return location
+        return None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+_shard_map: Optional[ShardMap] = None
+_shard_map_lock = threading.Lock()
+
+
+def get_shard_map() -> Optional[ShardMap]:
+    """The shard map from ``HOTEL_SHARDS``, or None when not sharding."""
+    global _shard_map
+    if not SHARD_SPEC:
+        return None
+    if _shard_map is None:
+        with _shard_map_lock:
+            if _shard_map is None:
+                _shard_map = ShardMap.parse(SHARD_SPEC)
+    return _shard_map
+
+
+def _or_first(shard_map: ShardMap, location: Optional[str]) -> str:
+    # Unknown keys go to the first shard, which answers with the usual
+    # "not found" error instead of falling back to the directory database
+    return location or shard_map.locations[0]
+
+
+def room_location(room_id: int) -> Optional[str]:
+    """Database owning ``room_id``, for ``db.use``; None when not sharding."""
+    shard_map = get_shard_map()
+    return None if shard_map is None else _or_first(shard_map, shard_map.for_room(room_id))
+
+
+def building_location(building_id: int) -> Optional[str]:
+    """Database owning ``building_id``, for ``db.use``; None when not sharding."""
+    shard_map = get_shard_map()
+    return None if shard_map is None else _or_first(shard_map, shard_map.for_building(building_id))
+
+
+def booking_location(booking_id: int) -> Optional[str]:
+    """Database holding ``booking_id`` (hot or archived); None when not sharding."""
+    shard_map = get_shard_map()
+    if shard_map is None:
+        return None
+    return _or_first(shard_map, shard_map.find(_BOOKING_QUERY, (booking_id, booking_id)))
+
+
+def hold_location(hold_id: int) -> Optional[str]:
+    """Database holding ``hold_id``; None when not sharding."""
+    shard_map = get_shard_map()
+    return None if shard_map is None else _or_first(shard_map, shard_map.find(_HOLD_QUERY, (hold_id,)))
+
+
+def fan_out(func: Callable[..., Any], *args: Any) -> List[Any]:
+    """``func(*args)`` on every shard in parallel, or once on the default
+    database when not sharding; returns the list of results."""
+    shard_map = get_shard_map()
+    if shard_map is None:
+        return [func(*args)]
+    return shard_map.map(func, *args)
+
+
+def merge_rooms(per_shard: Iterable[List[Tuple]]) -> List[Tuple]:
+    """Merges per-shard room lists, each cheapest first, into one in catalog order."""
+    per_shard = list(per_shard)
+    if len(per_shard) == 1:
+        return per_shard[0]
+    return list(heapq.merge(*per_shard, key=room_order))
+
+
+def split(source_path: str, shard_map: ShardMap) -> Dict[str, Dict[str, Any]]:
+    """Creates one SQLite shard file per location from a whole hotel database.
+
+    Each shard gets a copy of ``source_path`` reduced to its buildings:
+    their room types, rooms, bookings (hot and archived) and holds. The
+    guest table is emptied (guests stay in the directory database), and
+    the occupancy log and calendar are cleared, to be rebuilt on first
+    use. Booking and hold sequences of shard n start at ``n * ID_STRIDE``.
+
+    Raises:
+        ValueError: If a location is a URL; PostgreSQL shards are set up
+            with ``pg_backend init``.
+        FileExistsError: If a shard file already exists.
+    """
+    for location in shard_map.locations:
+        if db.is_url(location):
+            raise ValueError(f"split only writes SQLite shards, not {location}")
+        if os.path.exists(location):
+            raise FileExistsError(location)
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    report: Dict[str, Dict[str, Any]] = {}
+    try:
+        for index, location in enumerate(shard_map.locations, start=1):
+            building_ids = sorted(building_id for building_id, owner in shard_map.buildings.items()
+                                  if owner == location)
+            keep = ", ".join(str(building_id) for building_id in building_ids)
+            conn = sqlite3.connect(location)
+            try:
+                source.backup(conn)
+                conn.executescript(db.SCHEMA)
+                with conn:
+                    conn.execute(
+                        "DELETE FROM room_hold WHERE room_id NOT IN"
+                        f" (SELECT room_id FROM room WHERE building_id IN ({keep}))"
+                    )
+                    for table in ("booking", "booking_archive", "room", "room_type", "building"):
+                        conn.execute(f"DELETE FROM {table} WHERE building_id NOT IN ({keep})")
+                    for table in ("guest", "occupancy_change_log", "room_day_occupancy",
+                                  "occupancy_watermark"):
+                        conn.execute(f"DELETE FROM {table}")
+                    for table in ("booking", "room_hold"):
+                        start = index * ID_STRIDE
+                        if not conn.execute(
+                            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                            (start, table),
+                        ).rowcount:
+                            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                                         (table, start))
+                conn.execute("VACUUM")
+                rooms, bookings = conn.execute(
+                    "SELECT (SELECT COUNT(*) FROM room), (SELECT COUNT(*) FROM booking)"
+                ).fetchone()
+            finally:
+                conn.close()
+            report[location] = {"buildings": building_ids, "rooms": rooms, "bookings": bookings,
+                                "first_new_booking_id": index * ID_STRIDE + 1}
+    finally:
+        source.close()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Split a hotel database into per-building shards")
+    parser.add_argument("command", choices=["split"])
+    parser.add_argument("source", help="SQLite hotel database to split")
+    parser.add_argument("--shards", default=SHARD_SPEC,
+                        help='Shard spec, e.g. "1,2=/data/hills.db;3,4=/data/beach.db"'
+                             " (default: HOTEL_SHARDS)")
+    args = parser.parse_args()
+    print(json.dumps(split(args.source, ShardMap.parse(args.shards)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import db, metrics
+
+logger = logging.getLogger(__name__)
+
+# Route booking, hold and guest writes through a single writer thread per
+# database unless HOTEL_WRITE_QUEUE=0, in which case every caller runs
+# its own transaction as before
+ENABLED = os.getenv("HOTEL_WRITE_QUEUE", "1") != "0"
+# Most writes committed in one transaction
+BATCH_MAX = int(os.getenv("HOTEL_WRITE_BATCH_MAX", "64"))
+# How long the writer waits for more writes to fill a batch. 0 takes only
+# what is already queued, which batches under load without delaying a
+# lone write.
+BATCH_WAIT_MS = float(os.getenv("HOTEL_WRITE_BATCH_WAIT_MS", "0"))
+
+# A write op runs inside the writer's transaction and returns its result
+# (a tool result dict; one with an 'error' key is rolled back) and an
+# optional callback run with the connection after the commit.
+AfterCommit = Optional[Callable[[sqlite3.Connection], None]]
+WriteOp = Callable[..., Tuple[dict, AfterCommit]]
+# (op, args, future, submitted_at)
+_Item = Tuple[WriteOp, Tuple, Future, float]
+
+
+def execute_batch(db_path: Optional[str], batch: List[_Item]) -> None:
+    """Runs ``batch`` in one ``BEGIN IMMEDIATE`` transaction and resolves its futures.
+
+    Each op runs under its own savepoint, so an op that fails or returns
+    an error is undone without affecting the rest of the batch. Later ops
+    see the writes of earlier ones (e.g. a second booking of the same room
+    finds the first). Futures are resolved only after the commit, so a
+    caller never sees a result that could still be rolled back. An
+    after-commit callback that raises is logged and counted in
+    ``write_after_commit_errors_total``; it does not change the result.
+    """
+    pool = db.get_pool(db_path)
+    try:
+        conn = pool.acquire()
+    except sqlite3.Error as db_err:
+        for _, _, future, _ in batch:
+            future.set_result({'error': f"Database error: {db_err}"})
+        return
+
+    done: List[Tuple[WriteOp, Future, dict, AfterCommit]] = []
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        started = time.perf_counter()
+        for op, args, future, submitted_at in batch:
+            if metrics.ENABLED:
+                metrics.registry.observe("write_queue_seconds", started - submitted_at)
+            conn.execute("SAVEPOINT write_op")
+            try:
+                result, after = op(conn, *args)
+            except Exception as e:
+                result, after = {'error': f"An unexpected error occurred: {e}"}, None
+            if isinstance(result, dict) and 'error' in result:
+                conn.execute("ROLLBACK TO write_op")
+                after = None
+            conn.execute("RELEASE write_op")
+            done.append((op, future, result, after))
+        conn.commit()
+    except sqlite3.Error as db_err:
+        if conn.in_transaction:
+            conn.rollback()
+        for _, _, future, _ in batch:
+            future.set_result({'error': f"Database error: {db_err}"})
+        pool.release(conn)
+        return
+
+    if metrics.ENABLED:
+        metrics.registry.observe("write_batch_size", len(batch))
+    try:
+        for op, future, result, after in done:
+            if after is not None:
+                try:
+                    after(conn)
+                except Exception:
+                    # The write itself is committed, so its result stands,
+                    # but the index, cache or registry it refreshes stays
+                    # stale until their next sync
+                    name = getattr(op, "__name__", repr(op))
+                    logger.exception("After-commit callback of %s failed", name)
+                    if metrics.ENABLED:
+                        metrics.registry.inc("write_after_commit_errors_total", op=name)
+            future.set_result(result)
+    finally:
+        pool.release(conn)
+
+
+class WriteQueue:
+    """Single writer for one database: queued writes committed in batches.
+
+    SQLite admits one writer at a time, so threads that each open a write
+    transaction only queue on the database lock, and under bursts some of
+    them time out with ``database is locked``. Here callers enqueue a
+    write op and wait on a future, while one thread drains the queue and
+    commits up to ``batch_max`` ops per transaction (see
+    ``execute_batch``). The lock is taken once per batch and there is
+    one commit per batch instead of one per write.
+
+    Other processes still coordinate through the database lock as usual.
+
+    Args:
+        db_path (str, optional): Database to write; defaults to the configured database.
+        batch_max (int): Most ops per transaction.
+        batch_wait_ms (float): How long to wait for more ops to fill a batch.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, batch_max: int = BATCH_MAX,
+                 batch_wait_ms: float = BATCH_WAIT_MS):
+        self.db_path = db_path
+        self.batch_max = max(1, batch_max)
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue: "queue.SimpleQueue[Optional[_Item]]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.batches = 0
+        self.writes = 0
+        self.max_batch = 0
+
+    def submit(self, op: WriteOp, *args: Any) -> "Future[dict]":
+        """Queues ``op(conn, *args)``; the future resolves once it is committed or rolled back."""
+        future: "Future[dict]" = Future()
+        if self._closed:
+            future.set_result({'error': "Database error: write queue is closed"})
+            return future
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="hotel-writer", daemon=True
+                    )
+                    self._thread.start()
+        self._queue.put((op, args, future, time.perf_counter()))
+        return future
+
+    def _next_batch(self) -> Optional[List[_Item]]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max:
+            try:
+                remaining = deadline - time.monotonic()
+                item = (self._queue.get(timeout=remaining) if remaining > 0
+                        else self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        # After-commit callbacks look up the occupancy index and caches of
+        # the default database, which must be this queue's
+        with db.use(self.db_path):
+            self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            execute_batch(self.db_path, batch)
+            self.batches += 1
+            self.writes += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Commits what is queued, then stops the writer thread."""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "max_batch": self.max_batch,
+            "mean_batch": round(self.writes / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+_queues: Dict[str, WriteQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(db_path: Optional[str] = None) -> WriteQueue:
+    """Returns the process-wide write queue for ``db_path`` (defaults to the configured database)."""
+    path = db.resolve(db_path)
+    write_queue = _queues.get(path)
+    if write_queue is None:
+        with _queues_lock:
+            write_queue = _queues.get(path)
+            if write_queue is None:
+                write_queue = _queues[path] = WriteQueue(path)
+    return write_queue
+
+
+def submit(op: WriteOp, *args: Any) -> "Future[dict]":
+    """Runs a write op through the write queue, or right away if it is disabled.
+
+    Returns:
+        Future: resolves to the op's result once the write is committed
+        (or rolled back, for an error result).
+    """
+    if ENABLED:
+        return get_write_queue().submit(op, *args)
+    future: "Future[dict]" = Future()
+    execute_batch(None, [(op, args, future, time.perf_counter())])
+    return future
+
+
+def run(op: WriteOp, *args: Any) -> dict:
+    """Runs a write op and waits for its result; see ``submit``."""
+    return submit(op, *args).result()
+
+
+def close_all() -> None:
+    """Drains and stops every write queue; registered to run at interpreter exit."""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for write_queue in queues:
+        write_queue.close()
+
+
+# Runs before db.close_all (atexit is last in, first out), so queued
+# writes still have their pool
+atexit.register(close_all)
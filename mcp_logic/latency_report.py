@@ -0,0 +1,146 @@
+"""Latency report for the MCP tools under concurrent simulated clients.
+
+Each simulated client runs one booking conversation against the FastMCP
+server in-process (register guest, search availability, book the cheapest
+room) and every tool call is timed. By default the run works on a scratch
+copy of hotel.db so the shipped database is left untouched.
+
+Usage:
+    python -m mcp_logic.latency_report --clients 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DB = os.path.join(os.path.dirname(SCRIPT_DIR), 'homestayagent', 'hotel.db')
+# Stays are spread over the 300 days after this date
+BASE_DATE = date(2028, 1, 1)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` for ``q`` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarise(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """Per-tool count and p50/p90/p99/max latency in milliseconds."""
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p90_ms": round(percentile(values, 90) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "max_ms": round(max(values) * 1000, 3),
+        }
+        for name, values in sorted(samples.items())
+    }
+
+
+def _structured(result):
+    """Extracts the dict a tool returned from FastMCP's call_tool result."""
+    if isinstance(result, tuple):
+        return result[1].get("result", result[1])
+    if isinstance(result, dict):
+        return result
+    return json.loads(result[0].text)
+
+
+async def simulate_client(server, client_id: int, samples: Dict[str, List[float]],
+                          rng: random.Random) -> None:
+    async def call(name: str, arguments: dict) -> dict:
+        started = time.perf_counter()
+        result = await server.call_tool(name, arguments)
+        samples[name].append(time.perf_counter() - started)
+        return _structured(result)
+
+    guest = await call("get_guest_or_register", {
+        "name": f"Load Client {client_id}",
+        "phone": f"+91-load-{client_id:07d}",
+        "city": "Tirupati",
+    })
+    guest_id = guest["guest_details"]["guest_id"]
+
+    arrival = BASE_DATE + timedelta(days=rng.randrange(0, 300))
+    check_in = f"{arrival:%Y-%m-%d} 14:00:00"
+    check_out = f"{arrival + timedelta(days=2):%Y-%m-%d} 11:00:00"
+    people = rng.randint(1, 4)
+    availability = await call("fetch_room_availability", {
+        "num_people": people,
+        "check_in_datetime": check_in,
+        "check_out_datetime": check_out,
+    })
+    rooms = availability.get("available_rooms")
+    if not isinstance(rooms, list) or not rooms:
+        return
+
+    await call("create_hotel_booking", {
+        "guest_id": guest_id, "room_id": rooms[0]["Room ID"], "num_persons": people,
+        "check_in_datetime": check_in, "check_out_datetime": check_out,
+    })
+
+
+async def run(clients: int, concurrency: int, seed: int) -> Dict[str, Dict[str, float]]:
+    # Imported here so HOTEL_DB_PATH is honoured when set by main()
+    from mcp_logic.mcp_server import mcp
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    rng = random.Random(seed)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(client_id: int) -> None:
+        async with gate:
+            await simulate_client(mcp, client_id, samples, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    report = summarise(samples)
+    report["_run"] = {
+        "clients": clients,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "tool_calls_per_s": round(sum(len(v) for v in samples.values()) / elapsed, 1),
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", help="Database to run against (default: scratch copy of hotel.db)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["HOTEL_DB_PATH"] = os.path.abspath(args.db)
+    else:
+        scratch = os.path.join(tempfile.mkdtemp(prefix="hotel-latency-"), "hotel.db")
+        shutil.copyfile(SOURCE_DB, scratch)
+        os.environ["HOTEL_DB_PATH"] = scratch
+
+    report = asyncio.run(run(args.clients, args.concurrency, args.seed))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as fh:
+            fh.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,27 @@
-from mcp.server.fastmcp import FastMCP
-from homestayagent.availability_fetcher_tool import availability_fetcher
-from homestayagent.booking_tool import booking
-from homestayagent.get_user import add_or_get_guest
+import os
+from contextlib import aclosing
+from typing import Dict, List, Optional, Union
+from mcp.server.fastmcp import Context, FastMCP
+from homestayagent.async_tools import (
+    add_or_get_guest_async,
+    availability_fetcher_async,
+    availability_search_stream_async,
+    booking_async,
+    get_quote_async,
+    hold_room_async,
+    occupancy_heatmap_async,
+    outstanding_advances_async,
+    period_report_async,
+    release_hold_async,
+)
 from homestayagent.prompts import coordinator_instructions
-# Initialize the FastMCP server
-mcp = FastMCP("HomeStayAgent")
+from homestayagent import availability_cache, db, metrics, shards
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+# Initialize the FastMCP server; HOTEL_MCP_HOST/HOTEL_MCP_PORT set the
+# address of the SSE transport, e.g. to run several servers side by side
+mcp = FastMCP("HomeStayAgent", host=os.getenv("HOTEL_MCP_HOST", "127.0.0.1"),
+              port=int(os.getenv("HOTEL_MCP_PORT", "8000")))
 
 # Expose the System Prompt
 @mcp.prompt()
@@ -12,40 +29,198 @@ def homestay_system_prompt() -> str:
     """The system instructions for the Homestay Coordinator."""
     return coordinator_instructions
 
-# Expose the Tools
+async def _stream_partial(ctx: Context, tool: str, data: dict, progress: int, total: int) -> None:
+    """Sends one partial result to the client while the tool is still running.
+
+    The data goes out as a log notification tied to the request, plus a
+    progress notification when the client asked for progress. In-process
+    calls (no client session, or no ctx at all) skip it.
+    """
+    if ctx is None:
+        return
+    try:
+        request = ctx.request_context
+    except ValueError:
+        return
+    await request.session.send_log_message(
+        level="info", data=data, logger=tool, related_request_id=request.request_id,
+    )
+    await ctx.report_progress(progress, total)
+
+# Expose the Tools. They are async so the SSE event loop never blocks on
+# sqlite; the blocking work runs on the shared tool executor.
 @mcp.tool()
-def get_guest_or_register(name: str, phone: str, city: str) -> dict:
+async def get_guest_or_register(name: str, phone: str, city: str) -> dict:
     """
     Adds a new guest to the database or updates an existing guest's details 
     based on the unique phone number.
     """
-    return add_or_get_guest(name, phone, city)
+    return await add_or_get_guest_async(name, phone, city)
 
 @mcp.tool()
-def fetch_room_availability(num_people: int, check_in_datetime: str, check_out_datetime: str) -> dict:
+async def fetch_room_availability(num_people: int, check_in_datetime: str, check_out_datetime: str,
+                                  response_format: str = "full", top_k: int = 0, page: int = 1,
+                                  guest_id: Optional[int] = None,
+                                  max_price: Optional[float] = None,
+                                  min_floor: Optional[int] = None,
+                                  max_floor: Optional[int] = None,
+                                  lift: bool = False,
+                                  features: Optional[List[str]] = None) -> dict:
     """
     Query the hotel database for rooms matching the requested capacity and date range.
+    response_format="compact" returns one row per room type under a single header;
+    top_k and page paginate the result. Rooms held for other guests than guest_id
+    are not listed. max_price (per night), min_floor/max_floor, lift and feature
+    keywords (e.g. ["wi-fi", "kitchen"]) narrow the result to the guest's preferences.
     """
-    return availability_fetcher(num_people, check_in_datetime, check_out_datetime)
+    return await availability_fetcher_async(num_people, check_in_datetime, check_out_datetime,
+                                            response_format, top_k, page, guest_id, max_price,
+                                            min_floor, max_floor, lift, features)
 
 @mcp.tool()
-def create_hotel_booking(guest_id: int, room_id: int, num_persons: int,
-                 check_in_datetime: str, check_out_datetime: str, days_charged: int,
-                 extra_beds: int, extra_bed_price: float, subtotal_amount: float,
-                 taxes_and_fees: float, total_price: float, advance_due_amount: float) -> dict:
+async def search_room_availability(num_people: int,
+                                   windows: Optional[List[Dict[str, str]]] = None,
+                                   earliest_check_in_date: Optional[str] = None,
+                                   latest_check_out_date: Optional[str] = None,
+                                   stay_nights: int = 0,
+                                   check_in_time: str = "14:00",
+                                   check_out_time: str = "11:00",
+                                   max_rooms_per_window: int = 5,
+                                   response_format: str = "full",
+                                   guest_id: Optional[int] = None,
+                                   max_price: Optional[float] = None,
+                                   min_floor: Optional[int] = None,
+                                   max_floor: Optional[int] = None,
+                                   lift: bool = False,
+                                   features: Optional[List[str]] = None,
+                                   ctx: Context = None) -> dict:
     """
-    Creates a booking record in the database and generates a reference code.
+    Checks availability for several stay windows (explicit, or every check-in date
+    in a flexible range for a given stay length) in one call. Each window's result
+    is also streamed to the client (as a log notification) as soon as it is ready.
+    Budget and preference filters work as for fetch_room_availability.
     """
-    return booking(guest_id, room_id, num_persons, check_in_datetime, check_out_datetime, 
-                   days_charged, extra_beds, extra_bed_price, subtotal_amount, 
-                   taxes_and_fees, total_price, advance_due_amount)
+    result = None
+    async with aclosing(availability_search_stream_async(
+            num_people, windows, earliest_check_in_date, latest_check_out_date, stay_nights,
+            check_in_time, check_out_time, max_rooms_per_window, response_format,
+            guest_id, max_price=max_price, min_floor=min_floor, max_floor=max_floor,
+            lift=lift, features=features)) as items:
+        async for item in items:
+            if "error" in item:
+                return item
+            if result is None:
+                result = item
+                result["windows"] = []
+                continue
+            result["windows"].append(item)
+            await _stream_partial(ctx, "search_room_availability", item, len(result["windows"]),
+                                  result["given_input_specifications"]["window_count"])
+    return result
 
-if __name__ == "__main__":
-    # Run the server using standard input/output (required for MCP)
-    mcp.run(transport="sse")
+@mcp.tool()
+async def get_stay_quote(room_id: int, check_in_datetime: str, check_out_datetime: str,
+                         extra_beds: int = 0) -> dict:
+    """
+    Computes the exact price breakdown of a stay in one room, as booking will charge it.
+    """
+    return await get_quote_async(room_id, check_in_datetime, check_out_datetime, extra_beds)
 
+@mcp.tool()
+async def get_occupancy_heatmap(month: str, building_id: Optional[int] = None,
+                                room_type_id: Optional[int] = None) -> dict:
+    """
+    Returns a month of day-by-day occupancy per room (one '1'/'0' character per day)
+    and the number of free rooms per day, optionally for one building or room type.
+    """
+    return await occupancy_heatmap_async(month, building_id, room_type_id)
 
+@mcp.tool()
+async def get_period_report(period: str, group_by: str = "building",
+                            building_id: Optional[int] = None) -> dict:
+    """
+    Read-only manager report for a month ("YYYY-MM"), quarter ("YYYY-Qn") or year:
+    occupancy rate, nights sold, arrivals, revenue, ADR and RevPAR per building,
+    room type or month (group_by), with totals.
+    """
+    return await period_report_async(period, group_by, building_id)
 
+@mcp.tool()
+async def get_outstanding_advances(building_id: Optional[int] = None, limit: int = 20) -> dict:
+    """
+    Read-only manager report of advances still to collect on current and upcoming
+    stays: totals per building and the bookings with the soonest check-in.
+    """
+    return await outstanding_advances_async(building_id, limit)
 
+@mcp.tool()
+async def hold_room(guest_id: int, room_id: int, check_in_datetime: str,
+                    check_out_datetime: str, minutes: float = 10) -> dict:
+    """
+    Holds a room for a guest for a few minutes (default 10, at most 30) so other
+    guests cannot take it while they decide. Holding again extends the hold.
+    """
+    return await hold_room_async(guest_id, room_id, check_in_datetime, check_out_datetime, minutes)
 
+@mcp.tool()
+async def release_room_hold(guest_id: int, hold_id: int) -> dict:
+    """
+    Releases a room hold early, e.g. when the guest picks another room.
+    Only the guest the room is held for can release it.
+    """
+    return await release_hold_async(guest_id, hold_id)
 
+@mcp.tool()
+async def create_hotel_booking(guest_id: int, room_id: int, num_persons: int,
+                               check_in_datetime: str, check_out_datetime: str,
+                               extra_beds: int = 0) -> dict:
+    """
+    Creates a booking record in the database and generates a reference code.
+    The price breakdown is computed server-side from the room rates.
+    """
+    return await booking_async(guest_id, room_id, num_persons, check_in_datetime,
+                               check_out_datetime, extra_beds)
+
+@mcp.tool()
+def availability_cache_stats() -> dict:
+    """
+    Returns hit/miss/eviction/invalidation counters of the availability cache.
+    With per-building shards the counters are totals, and "shards" lists
+    each shard's own.
+    """
+    per_shard = shards.fan_out(lambda: availability_cache.get_cache().stats())
+    if len(per_shard) == 1:
+        return per_shard[0]
+    totals = {key: sum(stats[key] for stats in per_shard)
+              for key in ("entries", "hits", "misses", "evictions", "invalidations")}
+    lookups = totals["hits"] + totals["misses"]
+    totals["hit_ratio"] = round(totals["hits"] / lookups, 4) if lookups else 0.0
+    totals["shards"] = per_shard
+    return totals
+
+@mcp.tool()
+def get_metrics(output_format: str = "json") -> Union[dict, str]:
+    """
+    Returns tool, SQL and LLM latency histograms, rows returned and payload sizes
+    collected by this server. output_format="prometheus" returns the Prometheus text format.
+    """
+    if output_format == "prometheus":
+        return metrics.to_prometheus()
+    return metrics.snapshot()
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus scrape endpoint, served next to the SSE transport."""
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+def _open_pool() -> None:
+    with db.connection():
+        pass
+
+if __name__ == "__main__":
+    # Open the shared connection pools (and switch the dbs to WAL) before
+    # clients connect; all tool calls reuse their connections
+    _open_pool()
+    shards.fan_out(_open_pool)
+    # Run the server using standard input/output (required for MCP)
+    mcp.run(transport="sse")